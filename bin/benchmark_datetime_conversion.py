@@ -0,0 +1,55 @@
+#!/bin/env python3
+"""
+Micro-benchmark for the date/datetime conversion used by CSV/TSV exports:
+the per-value `_convert_datetime` against the memoizing column converter.
+
+    python bin/benchmark_datetime_conversion.py --values 1000000 --distinct 5000
+"""
+import argparse
+import datetime
+import timeit
+
+from redash.serializers.query_result import (
+    _convert_datetime,
+    _convert_format,
+    _datetime_column_converter,
+)
+
+
+def generate_values(count, distinct):
+    start = datetime.datetime(2020, 1, 1, 12, 30)
+    return [
+        (start + datetime.timedelta(minutes=i % distinct)).isoformat() + ".000Z"
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--values", type=int, default=1000000)
+    parser.add_argument("--distinct", type=int, default=5000)
+    parser.add_argument("--format", default="DD/MM/YY HH:mm")
+    args = parser.parse_args()
+
+    fmt = _convert_format(args.format)
+    values = generate_values(args.values, args.distinct)
+
+    def per_value():
+        return [_convert_datetime(value, fmt) for value in values]
+
+    def column():
+        return _datetime_column_converter(fmt)(values)
+
+    assert per_value() == column()
+
+    for name, func in (("per value (isoparse)", per_value), ("column", column)):
+        elapsed = min(timeit.repeat(func, number=1, repeat=3))
+        print(
+            "{:<22} {:>8.3f}s {:>12.0f} values/s".format(
+                name, elapsed, len(values) / elapsed
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
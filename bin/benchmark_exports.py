@@ -0,0 +1,122 @@
+#!/bin/env python3
+"""
+Benchmarks query result exports (CSV and XLSX) on large results, reporting
+throughput and the peak RSS of the process running the export.
+
+Each export runs in its own process so peak RSS isn't skewed by other runs:
+
+    python bin/benchmark_exports.py                   # all formats, 1M rows
+    python bin/benchmark_exports.py --rows 100000 csv
+"""
+import argparse
+import datetime
+import resource
+import subprocess
+import sys
+import time
+
+FORMATS = ("csv", "xlsx")
+
+
+class GeneratedQueryResult(object):
+    """Stands in for a QueryResult, generating its rows on the fly so the
+    benchmark measures the export itself and not holding the result."""
+
+    columns = [
+        {"name": "id", "friendly_name": "id", "type": "integer"},
+        {"name": "name", "friendly_name": "name", "type": "string"},
+        {"name": "amount", "friendly_name": "amount", "type": "float"},
+        {"name": "active", "friendly_name": "active", "type": "boolean"},
+        {"name": "created_at", "friendly_name": "created_at", "type": "datetime"},
+        {"name": "day", "friendly_name": "day", "type": "date"},
+        {"name": "tags", "friendly_name": "tags", "type": None},
+    ]
+
+    def __init__(self, row_count):
+        self.row_count = row_count
+
+    def iter_rows(self, as_arrays=False):
+        start = datetime.datetime(2020, 1, 1)
+        for i in range(self.row_count):
+            created_at = start + datetime.timedelta(seconds=i * 37)
+            row = [
+                i,
+                "name {}".format(i % 1000),
+                i * 1.5,
+                i % 2 == 0,
+                created_at.isoformat() + ".123Z",
+                created_at.date().isoformat(),
+                ["a", "b"] if i % 10 == 0 else None,
+            ]
+            if as_arrays:
+                yield row
+            else:
+                yield dict(zip((c["name"] for c in self.columns), row))
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_export(file_format, row_count):
+    from flask import g
+    from redash import create_app, models
+    from redash.serializers import iter_query_result_dsv, iter_query_result_xlsx
+
+    exporters = {
+        "csv": lambda result: iter_query_result_dsv(result, ","),
+        "xlsx": iter_query_result_xlsx,
+    }
+
+    app = create_app()
+    with app.test_request_context("/"):
+        g.org = models.Organization(settings={})
+        query_result = GeneratedQueryResult(row_count)
+
+        rss_before = peak_rss_mb()
+        started_at = time.time()
+        size = 0
+        for chunk in exporters[file_format](query_result):
+            size += len(chunk)
+        elapsed = time.time() - started_at
+
+    print(
+        "{:<5} rows={:<9} time={:>7.2f}s rows/s={:>9.0f} output={:>7.1f}MB "
+        "peak_rss={:>7.1f}MB (before export: {:.1f}MB)".format(
+            file_format,
+            row_count,
+            elapsed,
+            row_count / elapsed,
+            size / 1024.0 / 1024.0,
+            peak_rss_mb(),
+            rss_before,
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("formats", nargs="*", help="one or more of: csv, xlsx")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--in-process", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    formats = args.formats or FORMATS
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        parser.error("unknown format(s): {}".format(", ".join(sorted(unknown))))
+
+    if args.in_process:
+        for file_format in formats:
+            run_export(file_format, args.rows)
+        return
+
+    for file_format in formats:
+        subprocess.check_call(
+            [sys.executable, __file__, "--in-process", "--rows", str(args.rows), file_format]
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/bin/env python3
+"""
+Benchmarks `Query.outdated_queries` (the work `refresh_queries` does every
+refresh) with 1k, 10k and 100k scheduled queries, of which a fixed number is
+due on every run.
+
+The first run backfills the next run index and evaluates every schedule once,
+like every run did before the index existed. Later runs should only load the
+due queries, so their time shouldn't grow with the number of schedules.
+
+Run it against a scratch database and Redis: the queries are created in a
+transaction that is rolled back, but the scheduler's Redis keys are reset.
+
+    python bin/benchmark_scheduler.py
+    python bin/benchmark_scheduler.py --due 500 --runs 5 10000
+"""
+import argparse
+import statistics
+import time
+
+from redash import create_app, models, redis_connection
+from redash.utils.configuration import ConfigurationContainer
+
+SIZES = (1000, 10000, 100000)
+
+
+def create_scheduled_queries(count, due):
+    org = models.Organization(name="Scheduler Benchmark", slug="scheduler-benchmark")
+    user = models.User(org=org, name="Scheduler Benchmark", email="sb@example.com")
+    data_source = models.DataSource(
+        org=org,
+        name="Scheduler Benchmark",
+        type="pg",
+        options=ConfigurationContainer({}),
+    )
+    models.db.session.add_all([org, user, data_source])
+    models.db.session.flush()
+
+    schedule = {"interval": "3600", "time": None, "until": None, "day_of_week": None}
+    models.db.session.execute(
+        models.Query.__table__.insert(),
+        [
+            {
+                "org_id": org.id,
+                "data_source_id": data_source.id,
+                "user_id": user.id,
+                "name": "Query {}".format(i),
+                "query": "SELECT {}".format(i),
+                "query_hash": "{:032x}".format(i),
+                "schedule": schedule,
+                "is_draft": False,
+            }
+            for i in range(count)
+        ],
+    )
+    query_ids = [
+        query_id
+        for query_id, in models.db.session.query(models.Query.id)
+        .filter(models.Query.org_id == org.id)
+        .order_by(models.Query.id)
+    ]
+
+    # the first `due` queries last ran 2 hours ago, all others 5 minutes ago
+    now = time.time()
+    executions = {
+        query_id: now - (7200 if i < due else 300)
+        for i, query_id in enumerate(query_ids)
+    }
+    redis_connection.hmset(models.ScheduledQueriesExecutions.KEY_NAME, executions)
+    return query_ids
+
+
+def reset_index():
+    redis_connection.delete(
+        models.ScheduledQueriesIndex.KEY_NAME,
+        models.ScheduledQueriesIndex.BACKFILLED_KEY_NAME,
+    )
+
+
+def run_benchmark(count, due, runs):
+    reset_index()
+    query_ids = create_scheduled_queries(count, due)
+
+    try:
+        started_at = time.time()
+        outdated = models.Query.outdated_queries()
+        first_run = time.time() - started_at
+        assert len(outdated) == due, (len(outdated), due)
+
+        timings = []
+        for _ in range(runs):
+            # keep the identity map from hiding the cost of loading queries
+            models.db.session.expunge_all()
+            started_at = time.time()
+            outdated = models.Query.outdated_queries()
+            timings.append(time.time() - started_at)
+            assert len(outdated) == due, (len(outdated), due)
+    finally:
+        models.db.session.rollback()
+        redis_connection.hdel(models.ScheduledQueriesExecutions.KEY_NAME, *query_ids)
+        reset_index()
+
+    print(
+        "schedules={:<7} due={:<5} first run (backfill)={:>8.3f}s "
+        "next runs: median={:>7.3f}s max={:>7.3f}s".format(
+            count, due, first_run, statistics.median(timings), max(timings)
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("sizes", nargs="*", type=int, help="number of schedules")
+    parser.add_argument("--due", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        for count in args.sizes or SIZES:
+            run_benchmark(count, min(args.due, count), args.runs)
+
+
+if __name__ == "__main__":
+    main()
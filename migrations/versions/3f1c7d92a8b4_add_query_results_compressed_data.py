@@ -0,0 +1,34 @@
+"""add query_results.compressed_data
+
+Revision ID: 3f1c7d92a8b4
+Revises: 6adb92e75691
+Create Date: 2020-03-16 14:02:37.540921
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3f1c7d92a8b4"
+down_revision = "6adb92e75691"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "query_results", sa.Column("compressed_data", sa.LargeBinary(), nullable=True)
+    )
+    op.alter_column("query_results", "data", existing_type=sa.Text(), nullable=True)
+
+
+def downgrade():
+    # Compressed results can't be restored in SQL; they're dropped.
+    op.execute(
+        "UPDATE queries SET latest_query_data_id = NULL WHERE latest_query_data_id IN "
+        "(SELECT id FROM query_results WHERE data IS NULL)"
+    )
+    op.execute("DELETE FROM query_results WHERE data IS NULL")
+    op.alter_column("query_results", "data", existing_type=sa.Text(), nullable=False)
+    op.drop_column("query_results", "compressed_data")
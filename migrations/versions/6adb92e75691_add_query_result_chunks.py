@@ -0,0 +1,46 @@
+"""add query_result_chunks
+
+Revision ID: 6adb92e75691
+Revises: e5c7a4e2df4d
+Create Date: 2020-03-02 10:14:51.208131
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "6adb92e75691"
+down_revision = "e5c7a4e2df4d"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "query_result_chunks",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("query_result_id", sa.Integer(), nullable=False),
+        sa.Column("chunk_index", sa.Integer(), nullable=False),
+        sa.Column("row_offset", sa.Integer(), nullable=False),
+        sa.Column("row_count", sa.Integer(), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["query_result_id"], ["query_results.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "query_result_chunks_query_result_id_chunk_index",
+        "query_result_chunks",
+        ["query_result_id", "chunk_index"],
+        unique=True,
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "query_result_chunks_query_result_id_chunk_index",
+        table_name="query_result_chunks",
+    )
+    op.drop_table("query_result_chunks")
@@ -0,0 +1,117 @@
+"""partition events by month and add daily_event_counts
+
+Revision ID: 7d3f5b9e2c61
+Revises: 9b2e4d6f8a1c
+Create Date: 2020-04-14 09:21:37.602145
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "7d3f5b9e2c61"
+down_revision = "9b2e4d6f8a1c"
+branch_labels = None
+depends_on = None
+
+
+PARTITION_TRIGGER = """
+CREATE OR REPLACE FUNCTION events_insert_partition() RETURNS trigger AS $$
+DECLARE
+    partition text;
+BEGIN
+    partition := 'events_' || to_char(NEW.created_at AT TIME ZONE 'UTC', 'YYYY_MM');
+    IF partition IS NULL OR to_regclass(partition::cstring) IS NULL THEN
+        RETURN NEW;
+    END IF;
+
+    EXECUTE 'INSERT INTO ' || quote_ident(partition) || ' VALUES ($1.*)' USING NEW;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER events_insert_partition
+    BEFORE INSERT ON events
+    FOR EACH ROW EXECUTE PROCEDURE events_insert_partition();
+"""
+
+CREATE_PARTITION = """
+CREATE TABLE IF NOT EXISTS {name} (
+    PRIMARY KEY (id),
+    CHECK (created_at >= '{start} 00:00:00+00' AND created_at < '{end} 00:00:00+00')
+) INHERITS (events);
+CREATE INDEX IF NOT EXISTS {name}_org_id_created_at ON {name} (org_id, created_at);
+"""
+
+LIST_PARTITIONS = """
+SELECT c.relname FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = 'events'::regclass
+"""
+
+BACKFILL_COUNTS = """
+INSERT INTO daily_event_counts (org_id, metric, object_id, day, count)
+SELECT org_id, '{metric}', object_id, (created_at AT TIME ZONE 'UTC')::date, count(*)
+FROM events
+WHERE action = '{action}' AND object_type = '{object_type}' AND object_id IS NOT NULL
+GROUP BY org_id, object_id, (created_at AT TIME ZONE 'UTC')::date
+"""
+
+
+def next_month(month):
+    return (month.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def upgrade():
+    op.create_table(
+        "daily_event_counts",
+        sa.Column("org_id", sa.Integer(), nullable=False),
+        sa.Column("metric", sa.String(length=50), nullable=False),
+        sa.Column("object_id", sa.String(length=255), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["org_id"], ["organizations.id"]),
+        sa.PrimaryKeyConstraint("org_id", "metric", "object_id", "day"),
+    )
+
+    # counted from the events stored so far; executions per application
+    # weren't recorded before
+    op.execute(
+        BACKFILL_COUNTS.format(
+            metric="dashboard_views", action="view", object_type="dashboard"
+        )
+    )
+    op.execute(
+        BACKFILL_COUNTS.format(
+            metric="data_source_executions",
+            action="execute_query",
+            object_type="data_source",
+        )
+    )
+
+    # events stored so far stay in `events` itself, until they're past retention
+    month = datetime.datetime.utcnow().date().replace(day=1)
+    for _ in range(3):
+        op.execute(
+            CREATE_PARTITION.format(
+                name="events_{:%Y_%m}".format(month), start=month, end=next_month(month)
+            )
+        )
+        month = next_month(month)
+
+    op.execute(PARTITION_TRIGGER)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS events_insert_partition ON events")
+    op.execute("DROP FUNCTION IF EXISTS events_insert_partition()")
+
+    connection = op.get_bind()
+    for name, in connection.execute(LIST_PARTITIONS).fetchall():
+        op.execute("INSERT INTO ONLY events SELECT * FROM {}".format(name))
+        op.execute("DROP TABLE {}".format(name))
+
+    op.drop_table("daily_event_counts")
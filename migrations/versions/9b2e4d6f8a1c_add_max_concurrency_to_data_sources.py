@@ -0,0 +1,26 @@
+"""add max_concurrency to data_sources
+
+Revision ID: 9b2e4d6f8a1c
+Revises: c4a8f1e5b2d7
+Create Date: 2020-03-30 11:02:45.218734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "9b2e4d6f8a1c"
+down_revision = "c4a8f1e5b2d7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "data_sources", sa.Column("max_concurrency", sa.Integer(), nullable=True)
+    )
+
+
+def downgrade():
+    op.drop_column("data_sources", "max_concurrency")
@@ -0,0 +1,27 @@
+"""add query_results.row_format
+
+Revision ID: a5e2c8d4f7b3
+Revises: 7d3f5b9e2c61
+Create Date: 2020-04-20 11:08:52.316740
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a5e2c8d4f7b3"
+down_revision = "7d3f5b9e2c61"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing results keep NULL, they're told apart by parsing them.
+    op.add_column(
+        "query_results", sa.Column("row_format", sa.String(16), nullable=True)
+    )
+
+
+def downgrade():
+    op.drop_column("query_results", "row_format")
@@ -0,0 +1,28 @@
+"""add index on queries.latest_query_data_id
+
+Revision ID: c4a8f1e5b2d7
+Revises: 3f1c7d92a8b4
+Create Date: 2020-03-23 09:41:12.847302
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "c4a8f1e5b2d7"
+down_revision = "3f1c7d92a8b4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        op.f("ix_queries_latest_query_data_id"),
+        "queries",
+        ["latest_query_data_id"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_queries_latest_query_data_id"), table_name="queries")
@@ -0,0 +1,29 @@
+"""add flushed_event_batches
+
+Revision ID: e8b1d6c3a9f4
+Revises: a5e2c8d4f7b3
+Create Date: 2020-04-21 16:42:05.871209
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e8b1d6c3a9f4"
+down_revision = "a5e2c8d4f7b3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "flushed_event_batches",
+        sa.Column("id", sa.String(length=64), nullable=False),
+        sa.Column("flushed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade():
+    op.drop_table("flushed_event_batches")
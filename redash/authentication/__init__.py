@@ -11,7 +11,7 @@ from redash import models, settings
 from redash.authentication import jwt_auth
 from redash.authentication.org_resolving import current_org
 from redash.settings.organization import settings as org_settings
-from redash.tasks import record_event
+from redash.tasks import buffer_event
 from sqlalchemy.orm.exc import NoResultFound
 from werkzeug.exceptions import Unauthorized
 
@@ -214,13 +214,19 @@ def get_user_from_secret_key(secret_key, signature, request):
     user = None
     org = current_org._get_current_object()
     try:
-        application = models.Application.get_by_secret_key(secret_key)
+        application = models.Application.get_cached_by_secret_key(secret_key)
     except models.NoResultFound:
         raise Unauthorized("Unknown application")
     else:
         if application.is_active:
             if check_embed_signature(request, application.secret_token, timestamp, signature):
-                user = models.ApiUser(application.id, org, [], name="Application: {}".format(application.name))
+                user = models.ApiUser(
+                    application.id,
+                    org,
+                    [],
+                    name="Application: {}".format(application.name),
+                    application_id=application.id,
+                )
             else:
                 raise Unauthorized("Invalid serect token")
         else:
@@ -231,8 +237,7 @@ def get_user_from_access_token(access_token):
     user = None
     org = current_org._get_current_object()
     try:
-        token = models.AccessToken(access_token)
-        if token.is_valid:
+        if models.embed_auth_cache.is_valid_access_token(access_token):
             user = models.ApiUser(access_token, org, [], name="AccessToken: {}".format(access_token), embed=True)
         else:
             raise Unauthorized("Invalid access token, Please refresh this page again.")
@@ -307,7 +312,7 @@ def log_user_logged_in(app, user):
         "ip": request.remote_addr,
     }
 
-    record_event.delay(event)
+    buffer_event(event)
 
 
 @login_manager.unauthorized_handler
@@ -1,4 +1,4 @@
-from click import argument
+from click import argument, option
 from flask.cli import AppGroup
 from sqlalchemy.orm.exc import NoResultFound
 
@@ -62,3 +62,44 @@ def remove_tag(query_id, tag):
     models.db.session.commit()
 
     print("Tag removed.")
+
+
+@manager.command()
+@option(
+    "--time-budget",
+    default=0,
+    help="Stop after this many seconds (the next run continues from there). "
+    "Defaults to no limit.",
+)
+@option(
+    "--batch-size",
+    default=None,
+    type=int,
+    help="Number of ids to clean up per statement (defaults to "
+    "REDASH_QUERY_RESULTS_CLEANUP_BATCH_SIZE).",
+)
+@option(
+    "--restart/--resume",
+    default=False,
+    help="Start from the beginning of the table instead of where the last run stopped.",
+)
+def cleanup_results(time_budget, batch_size=None, restart=False):
+    """Delete unused query results, walking the whole table."""
+    from redash import redis_connection
+    from redash.tasks.queries.maintenance import (
+        CLEANUP_CURSOR_KEY,
+        cleanup_query_results,
+    )
+
+    if restart:
+        redis_connection.delete(CLEANUP_CURSOR_KEY)
+
+    deleted_count, deleted_bytes = cleanup_query_results(
+        time_budget=time_budget, batch_size=batch_size
+    )
+
+    print(
+        "Deleted {} unused query results ({:.1f} MB).".format(
+            deleted_count, deleted_bytes / 1024.0 / 1024.0
+        )
+    )
@@ -12,9 +12,11 @@ from sqlalchemy.orm import configure_mappers
 from supervisor_checks import check_runner
 from supervisor_checks.check_modules import base
 
-from redash import rq_redis_connection
+from redash import rq_redis_connection, settings
+from redash.query_runner.pool import connection_pools
 from redash.tasks import (
     Worker,
+    WarmWorker,
     rq_scheduler,
     schedule_periodic_jobs,
     periodic_job_definitions,
@@ -45,8 +47,21 @@ def worker(queues):
         queues = chain(*[queue.split(",") for queue in queues])
 
     with Connection(rq_redis_connection):
-        w = Worker(queues, log_job_description=False, job_monitoring_interval=5)
-        w.work()
+        if settings.RQ_WARM_WORKERS:
+            connection_pools.enable()
+            w = WarmWorker(
+                queues,
+                log_job_description=False,
+                job_monitoring_interval=5,
+                max_jobs=settings.RQ_WARM_WORKER_MAX_JOBS or None,
+            )
+            try:
+                w.work()
+            finally:
+                connection_pools.close()
+        else:
+            w = Worker(queues, log_job_description=False, job_monitoring_interval=5)
+            w.work()
 
 
 class WorkerHealthcheck(base.BaseCheck):
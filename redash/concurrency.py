@@ -0,0 +1,121 @@
+import time
+
+from redash import redis_connection, settings
+
+
+# Takes an execution slot for a job, unless its data source or organization
+# already runs as many jobs as it's allowed to. Slots are scored by the time
+# they expire at, so the slots of jobs whose worker died are reclaimed.
+ACQUIRE_SLOT_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[2])
+
+if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    local limit = tonumber(ARGV[4])
+    if limit > 0 and redis.call('ZCARD', KEYS[1]) >= limit then
+        return 0
+    end
+
+    local org_limit = tonumber(ARGV[5])
+    if org_limit > 0 and redis.call('ZCARD', KEYS[2]) >= org_limit then
+        return 0
+    end
+end
+
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+return 1
+"""
+
+# a slot outlives its job's time limit by this many seconds before it's reclaimed
+SLOT_GRACE_PERIOD = 60
+
+
+class QueryExecutionSlots(object):
+    """
+    Counts the query executions running and waiting for every data source, and
+    limits how many run at once for a data source (`DataSource.max_concurrency`,
+    or settings.QUERY_EXECUTION_MAX_CONCURRENCY) and for an organization
+    (settings.QUERY_EXECUTION_ORG_MAX_CONCURRENCY). 0 means no limit.
+    """
+
+    KEY_PREFIX = "query_concurrency:"
+
+    def __init__(self):
+        self._acquire = redis_connection.register_script(ACQUIRE_SLOT_SCRIPT)
+
+    def running_key(self, data_source_id):
+        return "{}running:data_source:{}".format(self.KEY_PREFIX, data_source_id)
+
+    def waiting_key(self, data_source_id):
+        return "{}waiting:data_source:{}".format(self.KEY_PREFIX, data_source_id)
+
+    def org_running_key(self, org_id):
+        return "{}running:org:{}".format(self.KEY_PREFIX, org_id)
+
+    def enqueued(self, job_id, data_source_id):
+        # jobs waiting longer than they're kept were lost (like when their queue
+        # was emptied), so they're trimmed here and not counted
+        now = time.time()
+        key = self.waiting_key(data_source_id)
+        pipe = redis_connection.pipeline()
+        pipe.zremrangebyscore(key, "-inf", now - settings.JOB_EXPIRY_TIME)
+        pipe.zadd(key, {job_id: now})
+        pipe.expire(key, settings.JOB_EXPIRY_TIME)
+        pipe.execute()
+
+    def cancelled(self, job_id, data_source_id):
+        redis_connection.zrem(self.waiting_key(data_source_id), job_id)
+
+    def acquire(self, job_id, data_source_id, org_id, max_concurrency, timeout):
+        if max_concurrency is None:
+            max_concurrency = settings.QUERY_EXECUTION_MAX_CONCURRENCY
+
+        if not timeout or timeout < 0:
+            timeout = settings.JOB_EXPIRY_TIME
+
+        now = time.time()
+        acquired = self._acquire(
+            keys=[
+                self.running_key(data_source_id),
+                self.org_running_key(org_id),
+                self.waiting_key(data_source_id),
+            ],
+            args=[
+                job_id,
+                now,
+                now + timeout + SLOT_GRACE_PERIOD,
+                max_concurrency,
+                settings.QUERY_EXECUTION_ORG_MAX_CONCURRENCY,
+            ],
+        )
+        return bool(acquired)
+
+    def release(self, job_id, data_source_id, org_id):
+        pipe = redis_connection.pipeline()
+        pipe.zrem(self.running_key(data_source_id), job_id)
+        pipe.zrem(self.org_running_key(org_id), job_id)
+        pipe.execute()
+
+    def counts(self, data_source_ids):
+        now = time.time()
+        pipe = redis_connection.pipeline(transaction=False)
+        for data_source_id in data_source_ids:
+            pipe.zcount(self.running_key(data_source_id), now, "+inf")
+            pipe.zcount(
+                self.waiting_key(data_source_id),
+                now - settings.JOB_EXPIRY_TIME,
+                "+inf",
+            )
+        results = pipe.execute()
+
+        return {
+            data_source_id: {"running": running, "waiting": waiting}
+            for data_source_id, running, waiting in zip(
+                data_source_ids, results[::2], results[1::2]
+            )
+        }
+
+
+query_execution_slots = QueryExecutionSlots()
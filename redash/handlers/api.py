@@ -18,6 +18,8 @@ from redash.handlers.dashboards import (
     DashboardForkResource,
     DashboardTagsResource,
     PublicDashboardResource,
+    DashboardResultsResource,
+    PublicDashboardResultsResource,
     EmbedDashboardResource,
     EmbedDashboardListResource,
 )
@@ -39,7 +41,7 @@ from redash.handlers.destinations import (
     DestinationResource,
     DestinationTypeListResource,
 )
-from redash.handlers.events import EventsResource
+from redash.handlers.events import EventCountsResource, EventsResource
 from redash.handlers.favorites import DashboardFavoriteResource, QueryFavoriteResource
 from redash.handlers.groups import (
     GroupDataSourceListResource,
@@ -157,6 +159,16 @@ api.add_org_resource(
     "/api/dashboards/public/<token>",
     endpoint="public_dashboard",
 )
+api.add_org_resource(
+    DashboardResultsResource,
+    "/api/dashboards/<dashboard_id>/results",
+    endpoint="dashboard_results",
+)
+api.add_org_resource(
+    PublicDashboardResultsResource,
+    "/api/dashboards/public/<token>/results",
+    endpoint="public_dashboard_results",
+)
 api.add_org_resource(
     DashboardShareResource,
     "/api/dashboards/<dashboard_id>/share",
@@ -217,6 +229,9 @@ api.add_org_resource(
 )
 
 api.add_org_resource(EventsResource, "/api/events", endpoint="events")
+api.add_org_resource(
+    EventCountsResource, "/api/events/daily_counts", endpoint="event_daily_counts"
+)
 
 api.add_org_resource(
     QueryFavoriteListResource, "/api/queries/favorites", endpoint="query_favorites"
@@ -8,7 +8,7 @@ from flask_restful import Resource, abort
 from redash import settings
 from redash.authentication import current_org
 from redash.models import db
-from redash.tasks import record_event as record_event_task
+from redash.tasks import buffer_event
 from redash.utils import json_dumps
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy import cast
@@ -52,6 +52,8 @@ class BaseResource(Resource):
 def record_event(org, user, options):
     if user.is_api_user():
         options.update({"api_key": user.name, "org_id": org.id})
+        if user.application_id is not None:
+            options["application_id"] = user.application_id
     else:
         options.update({"user_id": user.id, "user_name": user.name, "org_id": org.id})
 
@@ -60,7 +62,7 @@ def record_event(org, user, options):
     if "timestamp" not in options:
         options["timestamp"] = int(time.time())
 
-    record_event_task.delay(options)
+    buffer_event(options)
 
 
 def require_fields(req, fields):
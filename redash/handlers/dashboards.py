@@ -1,4 +1,4 @@
-from flask import request, url_for
+from flask import make_response, request, url_for
 from funcy import project, partial
 
 from flask_restful import abort
@@ -17,11 +17,15 @@ from redash.permissions import (
     require_permission,
     require_admin,
 )
+from redash.handlers.query_results import run_dashboard_queries, wants_array_rows
 from redash.security import csp_allows_embeding
 from redash.serializers import (
     DashboardSerializer,
-    public_dashboard,
+    public_dashboard_payload,
+    serialize_query_result,
+    serialize_widget_results_to_json,
 )
+from redash.utils import collect_parameters_from_request
 from sqlalchemy.orm.exc import StaleDataError
 
 
@@ -38,6 +42,40 @@ order_results = partial(
 )
 
 
+def widget_results_response(dashboard, user, shared=False):
+    params = request.get_json(force=True, silent=True) or {}
+
+    max_age = params.get("max_age", -1)
+    # max_age might have the value of None, in which case calling int(None) will fail
+    if max_age is None:
+        max_age = -1
+
+    results = run_dashboard_queries(
+        dashboard,
+        user,
+        params.get("parameters", {}),
+        params.get("widget_parameters", {}),
+        int(max_age),
+        shared,
+    )
+    data = serialize_widget_results_to_json(
+        results, user.is_api_user(), wants_array_rows()
+    )
+    return make_response(data, 200, {"Content-Type": "application/json"})
+
+
+def public_dashboard_response(dashboard):
+    etag, payload = public_dashboard_payload(dashboard)
+
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+    else:
+        response = make_response(payload, 200, {"Content-Type": "application/json"})
+
+    response.set_etag(etag)
+    return response
+
+
 class DashboardListResource(BaseResource):
     @require_permission("list_dashboards")
     def get(self):
@@ -149,6 +187,7 @@ class DashboardResource(BaseResource):
         :>json object widget.visualization: Widget contents, if this is a visualization widget
         :>json string widget.created_at: ISO format timestamp for widget creation
         :>json string widget.updated_at: ISO format timestamp for last widget modification
+        :>json object widget_results: With `?with_results`, the latest result of every widget (see :ref:`dashboard results <dashboard-results-label>`)
         """
         if request.args.get("legacy") is not None:
             fn = models.Dashboard.get_by_slug_and_org
@@ -160,6 +199,19 @@ class DashboardResource(BaseResource):
             dashboard, with_widgets=True, user=self.current_user
         ).serialize()
 
+        if request.args.get("with_results") is not None:
+            results = run_dashboard_queries(
+                dashboard,
+                self.current_user,
+                collect_parameters_from_request(request.args),
+            )
+            response["widget_results"] = {
+                widget_id: result
+                if isinstance(result, dict)
+                else {"query_result": serialize_query_result(result, False)}
+                for widget_id, result in results.items()
+            }
+
         api_key = models.ApiKey.get_by_object(dashboard)
         if api_key:
             response["public_url"] = url_for(
@@ -268,6 +320,68 @@ class PublicDashboardResource(BaseResource):
 
         :param token: An API key for a public dashboard.
         :>json array widgets: An array of arrays of :ref:`public widgets <public-widget-label>`, corresponding to the rows and columns the widgets are displayed in
+        :status 304: The dashboard didn't change since the `If-None-Match` ETag
+        """
+        if self.current_org.get_setting("disable_public_urls"):
+            abort(400, message="Public URLs are disabled.")
+
+        if not isinstance(self.current_user, models.ApiUser):
+            api_key = get_object_or_404(models.ApiKey.get_by_api_key, token)
+            dashboard = api_key.object
+        else:
+            dashboard = self.current_user.object
+
+        return public_dashboard_response(dashboard)
+
+
+class DashboardResultsResource(BaseResource):
+    @require_permission("view_query")
+    def post(self, dashboard_id):
+        """
+        Retrieves the latest results of all the widgets of a dashboard at once,
+        executing the queries which have none.
+
+        .. _dashboard-results-label:
+
+        :param dashboard_id: The ID of the dashboard.
+        :<json object parameters: Parameter values, applied to every widget whose query has them
+        :<json object widget_parameters: Parameter values per widget ID, overriding `parameters`
+        :<json number max_age: As when executing a single query; defaults to -1 (any cached result)
+        :qparam string row_format: Set to `array` to receive rows as arrays of values in column order.
+
+        :>json object widgets: Maps widget IDs to an object with either a `query_result` or a `job`
+        """
+        user = self.current_user
+        if user.is_embed and self.current_org.get_setting("disable_embed_urls"):
+            abort(400, message="Embed URLs are disabled.")
+
+        dashboard = get_object_or_404(
+            models.Dashboard.get_by_id_and_org, dashboard_id, self.current_org
+        )
+
+        # API keys only give access to the dashboard they were created for
+        shared = user.is_embed
+        if user.is_api_user() and not user.is_embed:
+            if user.object != dashboard:
+                abort(403)
+            shared = True
+
+        self.record_event(
+            {"action": "load_results", "object_id": dashboard.id, "object_type": "dashboard"}
+        )
+
+        return widget_results_response(dashboard, user, shared)
+
+
+class PublicDashboardResultsResource(BaseResource):
+    decorators = BaseResource.decorators + [csp_allows_embeding]
+
+    def post(self, token):
+        """
+        Retrieves the latest results of all the widgets of a public dashboard,
+        like :ref:`dashboard results <dashboard-results-label>`.
+
+        :param token: An API key for a public dashboard.
         """
         if self.current_org.get_setting("disable_public_urls"):
             abort(400, message="Public URLs are disabled.")
@@ -278,7 +392,8 @@ class PublicDashboardResource(BaseResource):
         else:
             dashboard = self.current_user.object
 
-        return public_dashboard(dashboard)
+        return widget_results_response(dashboard, self.current_user, shared=True)
+
 
 class EmbedDashboardResource(BaseResource):
 
@@ -288,6 +403,7 @@ class EmbedDashboardResource(BaseResource):
 
         :qparam number id: Id of dashboard to retrieve
         :>json array widgets: An array of arrays of :ref:`embed widgets <public-widget-label>`, corresponding to the rows and columns the widgets are displayed in
+        :status 304: The dashboard didn't change since the `If-None-Match` ETag
         """
         if self.current_org.get_setting("disable_embed_urls"):
             abort(400, message="Embed URLs are disabled.")
@@ -298,8 +414,8 @@ class EmbedDashboardResource(BaseResource):
             fn = models.Dashboard.get_by_id_and_org
 
         dashboard = get_object_or_404(fn, dashboard_id, self.current_org)
-    
-        return public_dashboard(dashboard)
+
+        return public_dashboard_response(dashboard)
 
 
 class EmbedDashboardListResource(BaseResource):
@@ -6,7 +6,7 @@ from flask_restful import abort
 from funcy import project
 from sqlalchemy.exc import IntegrityError
 
-from redash import models
+from redash import models, settings
 from redash.handlers.base import BaseResource, get_object_or_404, require_fields
 from redash.permissions import (
     require_access,
@@ -25,6 +25,21 @@ from redash.tasks.general import test_connection, get_schema
 from redash.serializers import serialize_job
 
 
+def parse_max_concurrency(req):
+    max_concurrency = req.get("max_concurrency")
+    if max_concurrency is None:
+        return None
+
+    if (
+        not isinstance(max_concurrency, int)
+        or isinstance(max_concurrency, bool)
+        or max_concurrency < 0
+    ):
+        abort(400, message="max_concurrency must be a non-negative integer.")
+
+    return max_concurrency
+
+
 class DataSourceTypeListResource(BaseResource):
     @require_admin
     def get(self):
@@ -72,6 +87,8 @@ class DataSourceResource(BaseResource):
 
         data_source.type = req["type"]
         data_source.name = req["name"]
+        if "max_concurrency" in req:
+            data_source.max_concurrency = parse_max_concurrency(req)
         models.db.session.add(data_source)
 
         try:
@@ -162,7 +179,11 @@ class DataSourceListResource(BaseResource):
 
         try:
             datasource = models.DataSource.create_with_group(
-                org=self.current_org, name=req["name"], type=req["type"], options=config
+                org=self.current_org,
+                name=req["name"],
+                type=req["type"],
+                options=config,
+                max_concurrency=parse_max_concurrency(req),
             )
 
             models.db.session.commit()
@@ -195,8 +216,38 @@ class DataSourceSchemaResource(BaseResource):
         )
         require_access(data_source, self.current_user, view_only)
         refresh = request.args.get("refresh") is not None
+        paginated = any(arg in request.args for arg in ("page", "page_size", "q"))
+
+        if not refresh and paginated:
+            page = request.args.get("page", 1, type=int)
+            page_size = request.args.get(
+                "page_size", settings.SCHEMA_PAGE_SIZE, type=int
+            )
+
+            if page < 1:
+                abort(400, message="Page must be positive integer.")
+
+            if page_size > settings.SCHEMA_MAX_PAGE_SIZE or page_size < 1:
+                abort(
+                    400,
+                    message="Page size is out of range (1-{}).".format(
+                        settings.SCHEMA_MAX_PAGE_SIZE
+                    ),
+                )
+
+            cached_page = data_source.get_cached_schema_page(
+                page, page_size, request.args.get("q")
+            )
 
-        if not refresh:
+            if cached_page is not None:
+                tables, count = cached_page
+                return {
+                    "count": count,
+                    "page": page,
+                    "page_size": page_size,
+                    "results": tables,
+                }
+        elif not refresh:
             cached_schema = data_source.get_cached_schema()
 
             if cached_schema is not None:
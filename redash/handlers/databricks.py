@@ -1,19 +1,13 @@
 from flask_restful import abort
 from flask import request
-from redash import models, redis_connection
+from redash import models
 from redash.handlers.base import BaseResource, get_object_or_404
 from redash.permissions import (
     require_access,
     view_only,
 )
-from redash.tasks.databricks import (
-    get_databricks_databases,
-    get_databricks_tables,
-    get_database_tables_with_columns,
-    get_databricks_table_columns,
-)
+from redash.tasks.databricks import metadata_cache
 from redash.serializers import serialize_job
-from redash.utils import json_loads, json_dumps
 
 
 def _get_databricks_data_source(data_source_id, user, org):
@@ -28,24 +22,6 @@ def _get_databricks_data_source(data_source_id, user, org):
     return data_source
 
 
-def _databases_key(data_source_id):
-    return "databricks:databases:{}".format(data_source_id)
-
-
-def _tables_key(data_source_id, database_name):
-    return "databricks:database_tables:{}:{}".format(data_source_id, database_name)
-
-
-def _get_databases_from_cache(data_source_id):
-    cache = redis_connection.get(_databases_key(data_source_id))
-    return json_loads(cache) if cache else None
-
-
-def _get_tables_from_cache(data_source_id, database_name):
-    cache = redis_connection.get(_tables_key(data_source_id, database_name))
-    return json_loads(cache) if cache else None
-
-
 class DatabricksDatabaseListResource(BaseResource):
     def get(self, data_source_id):
         data_source = _get_databricks_data_source(
@@ -54,14 +30,14 @@ class DatabricksDatabaseListResource(BaseResource):
 
         refresh = request.args.get("refresh") is not None
         if not refresh:
-            cached_databases = _get_databases_from_cache(data_source_id)
+            cached_databases, fresh = metadata_cache.get_databases(data_source.id)
 
             if cached_databases is not None:
+                if not fresh:
+                    metadata_cache.refresh_databases(data_source.id)
                 return cached_databases
 
-        job = get_databricks_databases.delay(
-            data_source.id, redis_key=_databases_key(data_source_id)
-        )
+        job = metadata_cache.refresh_databases(data_source.id)
         return serialize_job(job)
 
 
@@ -70,20 +46,23 @@ class DatabricksSchemaResource(BaseResource):
         data_source = _get_databricks_data_source(
             data_source_id, user=self.current_user, org=self.current_org
         )
+        metadata_cache.record_use(data_source.id, database_name)
 
         refresh = request.args.get("refresh") is not None
         if not refresh:
-            cached_tables = _get_tables_from_cache(data_source_id, database_name)
+            cached_tables, has_columns, fresh = metadata_cache.get_tables(
+                data_source.id, database_name
+            )
 
             if cached_tables is not None:
-                return {"schema": cached_tables, "has_columns": True}
+                if not (has_columns and fresh):
+                    metadata_cache.refresh_tables(data_source.id, database_name)
+                return {"schema": cached_tables, "has_columns": has_columns}
 
-            job = get_databricks_tables.delay(data_source.id, database_name)
+            job = metadata_cache.refresh_table_names(data_source.id, database_name)
             return serialize_job(job)
 
-        job = get_database_tables_with_columns.delay(
-            data_source.id, database_name, redis_key=_tables_key(data_source_id, database_name)
-        )
+        job = metadata_cache.refresh_tables(data_source.id, database_name, force=True)
         return serialize_job(job)
 
 
@@ -93,5 +72,17 @@ class DatabricksTableColumnListResource(BaseResource):
             data_source_id, user=self.current_user, org=self.current_org
         )
 
-        job = get_databricks_table_columns.delay(data_source.id, database_name, table_name)
+        cached_columns, fresh = metadata_cache.get_table_columns(
+            data_source.id, database_name, table_name
+        )
+        if cached_columns is not None:
+            if not fresh:
+                metadata_cache.refresh_table_columns(
+                    data_source.id, database_name, table_name
+                )
+            return cached_columns
+
+        job = metadata_cache.refresh_table_columns(
+            data_source.id, database_name, table_name
+        )
         return serialize_job(job)
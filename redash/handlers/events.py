@@ -1,10 +1,15 @@
+import datetime
+
 from flask import request
+from flask_restful import abort
 import geolite2
 import maxminddb
 from user_agents import parse as parse_ua
 
+from redash import models
 from redash.handlers.base import BaseResource, paginate
 from redash.permissions import require_admin
+from redash.utils import utcnow
 
 
 def get_location(ip):
@@ -69,3 +74,52 @@ class EventsResource(BaseResource):
         page = request.args.get("page", 1, type=int)
         page_size = request.args.get("page_size", 25, type=int)
         return paginate(self.current_org.events, page, page_size, serialize_event)
+
+
+class EventCountsResource(BaseResource):
+    @require_admin
+    def get(self):
+        """
+        Returns the daily counts of a metric: `dashboard_views`,
+        `data_source_executions` or `application_executions`.
+
+        :qparam string metric: The metric
+        :qparam string from: First day (YYYY-MM-DD), 30 days before `to` by default
+        :qparam string to: Last day (YYYY-MM-DD), today by default
+        :qparam object_id: Only count these dashboards, data sources or applications
+        """
+        metric = request.args.get("metric")
+        if metric not in models.DailyEventCount.METRICS:
+            abort(
+                400,
+                message="Metric must be one of: {}.".format(
+                    ", ".join(models.DailyEventCount.METRICS)
+                ),
+            )
+
+        try:
+            end = datetime.datetime.strptime(
+                request.args.get("to", utcnow().strftime("%Y-%m-%d")), "%Y-%m-%d"
+            ).date()
+            start = datetime.datetime.strptime(
+                request.args.get(
+                    "from", (end - datetime.timedelta(days=30)).strftime("%Y-%m-%d")
+                ),
+                "%Y-%m-%d",
+            ).date()
+        except ValueError:
+            abort(400, message="Dates must be formatted as YYYY-MM-DD.")
+
+        counts = models.DailyEventCount.counts(
+            self.current_org,
+            metric,
+            start,
+            end,
+            object_ids=request.args.getlist("object_id"),
+        )
+        return {
+            "metric": metric,
+            "from": start,
+            "to": end,
+            "counts": [count.to_dict() for count in counts],
+        }
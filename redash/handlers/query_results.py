@@ -1,15 +1,19 @@
+import datetime
 import logging
 import time
 
 import unicodedata
-from flask import make_response, request
+from flask import Response, make_response, request, stream_with_context
 from flask_login import current_user
 from flask_restful import abort
+from funcy import project
+from sqlalchemy.orm import joinedload
 from werkzeug.urls import url_quote
 from redash import models, settings
 from redash.handlers.base import BaseResource, get_object_or_404, record_event
 from redash.permissions import (
     has_access,
+    has_access_to_groups,
     not_view_only,
     require_access,
     require_permission,
@@ -20,7 +24,7 @@ from redash.tasks import Job
 from redash.tasks.queries import enqueue_query
 from redash.utils import (
     collect_parameters_from_request,
-    json_dumps,
+    gen_query_hash,
     utcnow,
     to_filename,
 )
@@ -31,9 +35,9 @@ from redash.models.parameterized_query import (
     dropdown_values,
 )
 from redash.serializers import (
-    serialize_query_result,
-    serialize_query_result_to_dsv,
-    serialize_query_result_to_xlsx,
+    serialize_query_result_to_json,
+    iter_query_result_dsv,
+    iter_query_result_xlsx,
     serialize_job,
 )
 
@@ -60,16 +64,50 @@ error_messages = {
 }
 
 
+def wants_array_rows():
+    # Clients that understand the compact result format (rows as arrays of
+    # values in column order) ask for it with `?row_format=array`.
+    return request.args.get("row_format") == "array"
+
+
+def query_result_etag(query_result, is_api_user, as_arrays):
+    # stored results never change, so the id (and the representation) is enough
+    return "{}-{}-{}".format(
+        query_result.id,
+        "public" if is_api_user else "full",
+        "array" if as_arrays else "object",
+    )
+
+
+def make_query_result_response(query_result, is_api_user):
+    as_arrays = wants_array_rows()
+    etag = query_result_etag(query_result, is_api_user, as_arrays)
+
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+    else:
+        response = make_response(
+            serialize_query_result_to_json(query_result, is_api_user, as_arrays),
+            200,
+            {"Content-Type": "application/json"},
+        )
+
+    response.set_etag(etag)
+    return response
+
+
+def paused_message(data_source):
+    if data_source.pause_reason:
+        return "{} is paused ({}). Please try later.".format(
+            data_source.name, data_source.pause_reason
+        )
+
+    return "{} is paused. Please try later.".format(data_source.name)
+
+
 def run_query(query, parameters, data_source, query_id, should_apply_auto_limit, max_age=0):
     if data_source.paused:
-        if data_source.pause_reason:
-            message = "{} is paused ({}). Please try later.".format(
-                data_source.name, data_source.pause_reason
-            )
-        else:
-            message = "{} is paused. Please try later.".format(data_source.name)
-
-        return error_response(message)
+        return error_response(paused_message(data_source))
 
     try:
         query.apply(parameters)
@@ -103,11 +141,7 @@ def run_query(query, parameters, data_source, query_id, should_apply_auto_limit,
     )
 
     if query_result:
-        return {
-            "query_result": serialize_query_result(
-                query_result, current_user.is_api_user()
-            )
-        }
+        return make_query_result_response(query_result, current_user.is_api_user())
     else:
         job = enqueue_query(
             query_text,
@@ -124,6 +158,171 @@ def run_query(query, parameters, data_source, query_id, should_apply_auto_limit,
         return serialize_job(job)
 
 
+def check_sql_injection(parameters, parameter_values):
+    special_chars = [";", "'"]
+    for parameter in parameters:
+        type_ = parameter.get("type")
+        name = parameter.get("name")
+        if type_ == "text" and name:
+            value = parameter_values.get(name)
+            if not value:
+                continue
+            include_chars = [char for char in special_chars if char in value]
+            if include_chars:
+                return True
+    return False
+
+
+def is_fresh(query_result, max_age):
+    return max_age == -1 or query_result.retrieved_at + datetime.timedelta(
+        seconds=max_age
+    ) >= utcnow()
+
+
+def run_dashboard_queries(
+    dashboard, user, parameters, widget_parameters=None, max_age=-1, shared=False
+):
+    """
+    Returns the latest result of the query behind every visualization widget of
+    `dashboard`, keyed by widget id, and executes the queries which have none
+    (in which case the value is the serialized job, or an error).
+
+    `parameters` apply to every widget whose query has them, and
+    `widget_parameters` ({widget id: parameters}) override them per widget.
+    Results are looked up in bulk: the latest results of queries without
+    parameters by `latest_query_data_id`, the rest by query hash. With `shared`
+    (public dashboards and embeds) view only access is enough for safe queries.
+    """
+    widget_parameters = widget_parameters or {}
+    widgets = models.Widget.query.filter(
+        models.Widget.dashboard_id == dashboard.id
+    ).options(
+        joinedload(models.Widget.visualization)
+        .joinedload(models.Visualization.query_rel)
+        .joinedload(models.Query.data_source)
+    )
+
+    results = {}
+    pending = {}
+    data_source_groups = {}
+
+    for widget in widgets:
+        if widget.visualization is None:
+            continue
+
+        query = widget.visualization.query_rel
+        data_source = query.data_source
+        if data_source is None:
+            results[widget.id] = error_response(
+                "Query {} is detached from any data source.".format(query.id)
+            )[0]
+            continue
+
+        names = set(p["name"] for p in query.parameters)
+        values = {p["name"]: p["value"] for p in query.parameters if "value" in p}
+        values.update(project(parameters, names))
+        values.update(project(widget_parameters.get(str(widget.id), {}), names))
+
+        need_view_only = query.parameterized.is_safe
+        if user.is_embed:
+            need_view_only = not check_sql_injection(query.parameters, values)
+
+        if shared or user.is_embed:
+            allowed = need_view_only
+        else:
+            if data_source.id not in data_source_groups:
+                data_source_groups[data_source.id] = data_source.groups
+            allowed = has_access_to_groups(
+                data_source_groups[data_source.id], user, need_view_only
+            )
+
+        if not allowed:
+            if query.parameterized.is_safe:
+                message = error_messages["no_permission"]
+            elif user.is_api_user():
+                message = error_messages["unsafe_when_shared"]
+            else:
+                message = error_messages["unsafe_on_view_only"]
+            results[widget.id] = message[0]
+            continue
+
+        if data_source.paused:
+            results[widget.id] = error_response(paused_message(data_source))[0]
+            continue
+
+        try:
+            parameterized = query.parameterized.apply(values)
+        except InvalidParameterError as e:
+            results[widget.id] = error_response(str(e))[0]
+            continue
+
+        if parameterized.missing_params:
+            results[widget.id] = error_response(
+                "Missing parameter value for: {}".format(
+                    ", ".join(parameterized.missing_params)
+                )
+            )[0]
+            continue
+
+        query_text = data_source.query_runner.apply_auto_limit(
+            parameterized.text, query.options.get("apply_auto_limit", False)
+        )
+        pending[widget.id] = (query, query_text)
+
+    by_latest_id = {}
+    by_hash = {}
+    if max_age != 0:
+        latest_ids = set(
+            query.latest_query_data_id
+            for query, _ in pending.values()
+            if not query.parameters and query.latest_query_data_id
+        )
+        if latest_ids:
+            by_latest_id = {
+                r.id: r
+                for r in models.QueryResult.query.filter(
+                    models.QueryResult.id.in_(latest_ids)
+                )
+            }
+
+        by_hash = models.QueryResult.get_latest_by_hashes(
+            [
+                (query.data_source_id, gen_query_hash(query_text))
+                for query, query_text in pending.values()
+                if query.parameters or not query.latest_query_data_id
+            ],
+            max_age,
+        )
+
+    for widget_id, (query, query_text) in pending.items():
+        if query.parameters or not query.latest_query_data_id:
+            query_result = by_hash.get(
+                (query.data_source_id, gen_query_hash(query_text))
+            )
+        else:
+            query_result = by_latest_id.get(query.latest_query_data_id)
+            if query_result is not None and not is_fresh(query_result, max_age):
+                query_result = None
+
+        if query_result is not None:
+            results[widget_id] = query_result
+            continue
+
+        job = enqueue_query(
+            query_text,
+            query.data_source,
+            user.id,
+            user.is_api_user(),
+            metadata={
+                "Username": repr(user) if user.is_api_user() else user.email,
+                "Query ID": query.id,
+            },
+        )
+        results[widget_id] = serialize_job(job)
+
+    return results
+
+
 def get_download_filename(query_result, query, filetype):
     retrieved_at = query_result.retrieved_at.strftime("%Y_%m_%d")
     if query:
@@ -166,6 +365,7 @@ class QueryResultListResource(BaseResource):
                                 always execute.
         :qparam number data_source_id: ID of data source to query
         :qparam object parameters: A set of parameter values to apply to the query.
+        :qparam string row_format: Set to `array` to receive rows as arrays of values in column order.
         """
         params = request.get_json(force=True)
 
@@ -273,6 +473,7 @@ class QueryResultResource(BaseResource):
                                 return them, otherwise execute the query; if omitted or -1, returns
                                 any cached result, or executes if not available. Set to zero to
                                 always execute.
+        :qparam string row_format: Set to `array` to receive rows as arrays of values in column order.
         """
         params = request.get_json(force=True, silent=True) or {}
         parameter_values = params.get("parameters", {})
@@ -289,20 +490,6 @@ class QueryResultResource(BaseResource):
 
         allow_executing_with_view_only_permissions = query.parameterized.is_safe
 
-        def check_sql_injection(parameters, parameter_values):
-            special_chars = [";", "'"]
-            for parameter in parameters:
-                type_ = parameter.get("type")
-                name = parameter.get("name")
-                if type_ == "text" and name:
-                    value = parameter_values.get(name)
-                    if not value:
-                        continue
-                    include_chars = [char for char in special_chars if char in value]
-                    if include_chars:
-                        return True
-            return False
-
         if self.current_user.is_embed:
             allow_executing_with_view_only_permissions = not check_sql_injection(query.parameters, parameter_values)
 
@@ -336,6 +523,7 @@ class QueryResultResource(BaseResource):
         :param number query_id: The ID of the query whose results should be fetched
         :param number query_result_id: the ID of the query result to fetch
         :param string filetype: Format to return. One of 'json', 'xlsx', or 'csv'. Defaults to 'json'.
+        :qparam string row_format: Set to `array` to receive rows as arrays of values in column order (json only).
 
         :<json number id: Query result ID
         :<json string query: Query that produced this result
@@ -440,26 +628,30 @@ class QueryResultResource(BaseResource):
 
     @staticmethod
     def make_json_response(query_result):
-        data = json_dumps({"query_result": query_result.to_dict()})
-        headers = {"Content-Type": "application/json"}
-        return make_response(data, 200, headers)
+        return make_query_result_response(query_result, is_api_user=False)
 
     @staticmethod
     def make_csv_response(query_result):
         headers = {"Content-Type": "text/csv; charset=UTF-8"}
-        return make_response(serialize_query_result_to_dsv(query_result, ","), 200, headers)
+        return Response(
+            stream_with_context(iter_query_result_dsv(query_result, ",")), 200, headers
+        )
 
     @staticmethod
     def make_tsv_response(query_result):
         headers = {"Content-Type": "text/tab-separated-values; charset=UTF-8"}
-        return make_response(serialize_query_result_to_dsv(query_result, "\t"), 200, headers)
+        return Response(
+            stream_with_context(iter_query_result_dsv(query_result, "\t")), 200, headers
+        )
 
     @staticmethod
     def make_excel_response(query_result):
         headers = {
             "Content-Type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         }
-        return make_response(serialize_query_result_to_xlsx(query_result), 200, headers)
+        return Response(
+            stream_with_context(iter_query_result_xlsx(query_result)), 200, headers
+        )
 
 
 class JobResource(BaseResource):
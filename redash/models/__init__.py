@@ -1,23 +1,28 @@
 import datetime
+from collections import Counter
 import calendar
 import logging
 import time
 import numbers
+import zlib
 import pytz
 
-from sqlalchemy import distinct, or_, and_, UniqueConstraint, cast
+from sqlalchemy import distinct, or_, and_, UniqueConstraint, cast, inspect, tuple_
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.event import listens_for
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import backref, contains_eager, joinedload, subqueryload, load_only
+from sqlalchemy.orm import backref, contains_eager, joinedload, subqueryload, load_only, object_session, defer
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.orm.exc import NoResultFound  # noqa: F401
 from sqlalchemy import func
 from sqlalchemy_utils import generic_relationship
 from sqlalchemy_utils.types import TSVectorType
 from sqlalchemy_utils.models import generic_repr
 from sqlalchemy_utils.types.encrypted.encrypted_type import FernetEngine
+from funcy import project
+from werkzeug.utils import import_string
 
-from redash import redis_connection, utils, settings
+from redash import redis_connection, statsd_client, utils, settings
 from redash.destinations import (
     get_configuration_schema_for_destination_type,
     get_destination,
@@ -39,13 +44,18 @@ from redash.utils import (
     base_url,
     sentry,
     gen_query_hash)
+from redash.utils import compression
 from redash.utils.configuration import ConfigurationContainer
 from redash.models.parameterized_query import ParameterizedQuery
 
 from .base import db, gfk_type, Column, GFKBase, SearchBaseQuery, key_type, primary_key
+from . import event_partitions
 from .changes import ChangeTrackingMixin, Change  # noqa
 from .mixins import BelongsToOrgMixin, TimestampMixin
 from .organizations import Organization
+from .embed_auth_cache import CachedApplication, embed_auth_cache
+from .public_dashboard_cache import public_dashboard_cache
+from .query_result_cache import query_result_cache
 from .types import (
     EncryptedConfiguration,
     Configuration,
@@ -66,8 +76,15 @@ class ScheduledQueriesExecutions(object):
     def __init__(self):
         self.executions = {}
 
-    def refresh(self):
-        self.executions = redis_connection.hgetall(self.KEY_NAME)
+    def refresh(self, query_ids=None):
+        if query_ids is None:
+            self.executions = redis_connection.hgetall(self.KEY_NAME)
+        else:
+            query_ids = [str(query_id) for query_id in query_ids]
+            values = (
+                redis_connection.hmget(self.KEY_NAME, query_ids) if query_ids else []
+            )
+            self.executions = dict(zip(query_ids, values))
 
     def update(self, query_id):
         redis_connection.hmset(self.KEY_NAME, {query_id: time.time()})
@@ -83,6 +100,115 @@ class ScheduledQueriesExecutions(object):
 scheduled_queries_executions = ScheduledQueriesExecutions()
 
 
+# Sets the score of every given member, unless it changed since it was read
+# (a newer mark or reschedule wins). A score of "" removes the member.
+RESCHEDULE_SCRIPT = """
+local updated = 0
+for i = 1, #ARGV, 3 do
+    local current = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if current and tonumber(current) == tonumber(ARGV[i + 1]) then
+        if ARGV[i + 2] == '' then
+            redis.call('ZREM', KEYS[1], ARGV[i])
+        else
+            redis.call('ZADD', KEYS[1], ARGV[i + 2], ARGV[i])
+        end
+        updated = updated + 1
+    end
+end
+return updated
+"""
+
+
+class ScheduledQueriesIndex(object):
+    """
+    Keeps the next time every scheduled query might need to run in a sorted
+    set, so `Query.outdated_queries` only looks at the queries that are due.
+
+    The scores are a lower bound: a query whose schedule, failure count or
+    latest result changes is marked to be re-evaluated on the next refresh,
+    which then stores its actual next run time.
+    """
+
+    KEY_NAME = "sq:next_run_at"
+    BACKFILLED_KEY_NAME = "sq:next_run_at:backfilled"
+
+    def __init__(self):
+        self._reschedule = redis_connection.register_script(RESCHEDULE_SCRIPT)
+
+    def needs_backfill(self):
+        return not redis_connection.exists(self.BACKFILLED_KEY_NAME)
+
+    def backfilled(self):
+        # only once the index holds every scheduled query, so a refresh that
+        # dies while backfilling leaves the backfill to the next one
+        redis_connection.set(self.BACKFILLED_KEY_NAME, 1)
+
+    def mark(self, query_ids):
+        if query_ids:
+            now = time.time()
+            redis_connection.zadd(
+                self.KEY_NAME, {query_id: now for query_id in query_ids}
+            )
+
+    def due(self, now):
+        return [
+            (int(query_id), score)
+            for query_id, score in redis_connection.zrangebyscore(
+                self.KEY_NAME, "-inf", now.timestamp(), withscores=True
+            )
+        ]
+
+    def reschedule(self, next_runs):
+        """
+        Takes a list of (query id, score it was read with, next run time) and
+        stores the new run times. A next run time of None removes the query
+        from the index.
+        """
+        args = []
+        for query_id, score, next_run_at in next_runs:
+            args.extend(
+                [query_id, score, next_run_at.timestamp() if next_run_at else ""]
+            )
+
+        if args:
+            self._reschedule(keys=[self.KEY_NAME], args=args)
+
+    def executed(self, query, executed_at):
+        next_run_at = next_schedule_time(
+            executed_at,
+            query.schedule["interval"],
+            query.schedule["time"],
+            query.schedule["day_of_week"],
+            query.schedule_failures,
+        )
+        if next_run_at is None:
+            redis_connection.zrem(self.KEY_NAME, query.id)
+        else:
+            redis_connection.zadd(self.KEY_NAME, {query.id: next_run_at.timestamp()})
+
+
+scheduled_queries_index = ScheduledQueriesIndex()
+
+
+# Tables altered shortly before a schema refresh, by the data source's clock, are
+# fetched again by the next incremental refresh.
+SCHEMA_CHANGES_OVERLAP = 300
+
+
+def _search_pattern(search):
+    """A Redis glob pattern matching the strings containing `search`, in any case."""
+    pattern = ""
+    for char in search:
+        if char.lower() != char.upper():
+            pattern += "[{}{}]".format(char.lower(), char.upper())
+        elif char in "*?[]\\":
+            pattern += "\\" + char
+        else:
+            pattern += char
+
+    return "*{}*".format(pattern)
+
+
 @generic_repr("id", "name", "type", "org_id", "created_at")
 class DataSource(BelongsToOrgMixin, db.Model):
     id = primary_key("DataSource")
@@ -101,6 +227,8 @@ class DataSource(BelongsToOrgMixin, db.Model):
     )
     queue_name = Column(db.String(255), default="queries")
     scheduled_queue_name = Column(db.String(255), default="scheduled_queries")
+    # how many queries may run on this data source at once, see redash.concurrency
+    max_concurrency = Column(db.Integer, nullable=True)
     created_at = Column(db.DateTime(True), default=db.func.now())
 
     data_source_groups = db.relationship(
@@ -132,6 +260,7 @@ class DataSource(BelongsToOrgMixin, db.Model):
             d["options"] = self.options.to_dict(mask_secrets=True)
             d["queue_name"] = self.queue_name
             d["scheduled_queue_name"] = self.scheduled_queue_name
+            d["max_concurrency"] = self.max_concurrency
             d["groups"] = self.groups
 
         if with_permissions_for is not None:
@@ -181,34 +310,129 @@ class DataSource(BelongsToOrgMixin, db.Model):
         res = db.session.delete(self)
         db.session.commit()
 
+        redis_connection.delete(
+            self._legacy_schema_key,
+            self._schema_names_key,
+            self._schema_refreshed_at_key,
+        )
         redis_connection.delete(self._schema_key)
 
         return res
 
     def get_cached_schema(self):
-        cache = redis_connection.get(self._schema_key)
-        return json_loads(cache) if cache else None
+        pipe = redis_connection.pipeline()
+        pipe.exists(self._schema_refreshed_at_key)
+        pipe.hgetall(self._schema_key)
+        cached, tables = pipe.execute()
+
+        if not cached:
+            return None
+
+        return [json_loads(tables[name]) for name in sorted(tables)]
+
+    def get_cached_schema_page(self, page, page_size, search=None):
+        """
+        Returns a page of the cached schema's tables, sorted by name and optionally
+        only those whose name contains `search` (ignoring case), and the number of
+        tables. Returns None when the schema isn't cached.
+        """
+        if not redis_connection.exists(self._schema_refreshed_at_key):
+            return None
+
+        start = (page - 1) * page_size
+        if search:
+            names = sorted(
+                name
+                for name, _ in redis_connection.zscan_iter(
+                    self._schema_names_key, match=_search_pattern(search), count=1000
+                )
+            )
+            count = len(names)
+            names = names[start : start + page_size]
+        else:
+            pipe = redis_connection.pipeline()
+            pipe.zcard(self._schema_names_key)
+            pipe.zrange(self._schema_names_key, start, start + page_size - 1)
+            count, names = pipe.execute()
+
+        tables = redis_connection.hmget(self._schema_key, names) if names else []
+        return [json_loads(table) for table in tables if table is not None], count
 
     def get_schema(self, refresh=False):
-        out_schema = None
         if not refresh:
             out_schema = self.get_cached_schema()
+            if out_schema is not None:
+                return out_schema
+
+        query_runner = self.query_runner
+        refreshed_at = redis_connection.hgetall(self._schema_refreshed_at_key)
+        now = time.time()
+
+        if (
+            refresh
+            and query_runner.supports_incremental_schema
+            and "full" in refreshed_at
+            and now - float(refreshed_at["full"])
+            < settings.SCHEMAS_FULL_REFRESH_INTERVAL
+        ):
+            since = datetime.datetime.utcfromtimestamp(
+                float(refreshed_at["incremental"]) - SCHEMA_CHANGES_OVERLAP
+            )
+            changed, table_names = query_runner.get_schema_changes(since)
+            self._store_schema(
+                self._sort_tables(changed), table_names, {"incremental": now}
+            )
+            return self.get_cached_schema()
+
+        schema = query_runner.get_schema(get_stats=refresh)
+        out_schema = self._sort_tables(schema)
+        self._store_schema(
+            out_schema,
+            set(table["name"] for table in out_schema),
+            {"incremental": now, "full": now},
+        )
 
-        if out_schema is None:
-            query_runner = self.query_runner
-            schema = query_runner.get_schema(get_stats=refresh)
+        return out_schema
 
-            try:
-                out_schema = self._sort_schema(schema)
-            except Exception:
-                logging.exception(
-                    "Error sorting schema columns for data_source {}".format(self.id)
-                )
-                out_schema = schema
-            finally:
-                redis_connection.set(self._schema_key, json_dumps(out_schema))
+    def _sort_tables(self, schema):
+        try:
+            return self._sort_schema(schema)
+        except Exception:
+            logging.exception(
+                "Error sorting schema columns for data_source {}".format(self.id)
+            )
+            return schema
+
+    def _store_schema(self, tables, table_names, refreshed_at):
+        """
+        Stores the given tables and removes the cached tables missing from
+        `table_names`. Only the tables that changed are written.
+        """
+        serialized = {table["name"]: json_dumps(table) for table in tables}
+        cached_names = set(redis_connection.zrange(self._schema_names_key, 0, -1))
+        if serialized:
+            cached = redis_connection.hmget(self._schema_key, list(serialized))
+            cached = dict(zip(serialized, cached))
+        else:
+            cached = {}
 
-        return out_schema
+        changed = {
+            name: table
+            for name, table in serialized.items()
+            if cached.get(name) != table
+        }
+        removed = cached_names - set(table_names) - set(serialized)
+
+        pipe = redis_connection.pipeline()
+        if changed:
+            pipe.hmset(self._schema_key, changed)
+            pipe.zadd(self._schema_names_key, dict.fromkeys(changed, 0))
+        if removed:
+            pipe.hdel(self._schema_key, *removed)
+            pipe.zrem(self._schema_names_key, *removed)
+        pipe.hmset(self._schema_refreshed_at_key, refreshed_at)
+        pipe.delete(self._legacy_schema_key)
+        pipe.execute()
 
     def _sort_schema(self, schema):
         return [
@@ -218,6 +442,22 @@ class DataSource(BelongsToOrgMixin, db.Model):
 
     @property
     def _schema_key(self):
+        # a hash of every table's JSON, by the table's name
+        return "data_source:schema:{}:tables".format(self.id)
+
+    @property
+    def _schema_names_key(self):
+        # the tables' names, in a sorted set with equal scores to page through them
+        return "data_source:schema:{}:names".format(self.id)
+
+    @property
+    def _schema_refreshed_at_key(self):
+        # when the schema was last refreshed, fully and incrementally
+        return "data_source:schema:{}:refreshed_at".format(self.id)
+
+    @property
+    def _legacy_schema_key(self):
+        # the whole schema as a single JSON document, as it used to be cached
         return "data_source:schema:{}".format(self.id)
 
     @property
@@ -264,6 +504,8 @@ class DataSource(BelongsToOrgMixin, db.Model):
     @property
     def query_runner(self):
         query_runner = get_query_runner(self.type, self.options)
+        if query_runner is not None:
+            query_runner.data_source_id = self.id
 
         if self.uses_ssh_tunnel:
             query_runner = with_ssh_tunnel(query_runner, self.options.get("ssh_tunnel"))
@@ -274,11 +516,12 @@ class DataSource(BelongsToOrgMixin, db.Model):
     def get_by_name(cls, name):
         return cls.query.filter(cls.name == name).one()
 
-    # XXX examine call sites to see if a regular SQLA collection would work better
     @property
     def groups(self):
-        groups = DataSourceGroup.query.filter(DataSourceGroup.data_source == self)
-        return dict([(group.group_id, group.view_only) for group in groups])
+        # from the collection, so it can be eager loaded along with the data source
+        return dict(
+            [(group.group_id, group.view_only) for group in self.data_source_groups]
+        )
 
 
 @generic_repr("id", "data_source_id", "group_id", "view_only")
@@ -294,29 +537,427 @@ class DataSourceGroup(db.Model):
     __tablename__ = "data_source_groups"
 
 
+@generic_repr("id", "query_result_id", "chunk_index", "row_offset", "row_count")
+class QueryResultChunk(db.Model):
+    id = primary_key("QueryResultChunk")
+    query_result_id = Column(
+        key_type("QueryResult"),
+        db.ForeignKey("query_results.id", ondelete="CASCADE"),
+    )
+    chunk_index = Column(db.Integer)
+    row_offset = Column(db.Integer)
+    row_count = Column(db.Integer)
+    # zlib compressed JSON: one list of values per column, in column order.
+    data = Column(db.LargeBinary)
+
+    __tablename__ = "query_result_chunks"
+    __table_args__ = (
+        db.Index(
+            "query_result_chunks_query_result_id_chunk_index",
+            "query_result_id",
+            "chunk_index",
+            unique=True,
+        ),
+    )
+
+
+def encode_result_chunk(rows, json_encoder=None):
+    # Rows are sequences of values in column order; stored transposed.
+    values = [list(column_values) for column_values in zip(*rows)]
+    kwargs = {"cls": json_encoder} if json_encoder else {}
+    return zlib.compress(json_dumps(values, **kwargs).encode("utf-8"))
+
+
+def decode_result_chunk(data):
+    return json_loads(zlib.decompress(data).decode("utf-8"))
+
+
+def is_chunked_result(stored):
+    return (
+        isinstance(stored, dict) and "row_count" in stored and "rows" not in stored
+    )
+
+
+def split_row_batches(row_batches, size):
+    pending = []
+    for batch in row_batches:
+        pending.extend(batch)
+        while len(pending) >= size:
+            yield pending[:size]
+            pending = pending[size:]
+
+    if pending:
+        yield pending
+
+
+# How the rows of a stored result are laid out (QueryResult.row_format): the
+# JSON as given (objects), arrays in column order (see `store_rows`), or chunks
+# (see `ChunkedPersistence`).
+ROW_FORMAT_OBJECTS = "objects"
+ROW_FORMAT_ARRAY = "array"
+ROW_FORMAT_CHUNKED = "chunked"
+
+
+def is_array_rows_result(stored):
+    return isinstance(stored, dict) and stored.get("row_format") == ROW_FORMAT_ARRAY
+
+
+def is_tabular_result(data):
+    return (
+        isinstance(data, dict)
+        and isinstance(data.get("columns"), list)
+        and isinstance(data.get("rows"), list)
+    )
+
+
 DESERIALIZED_DATA_ATTR = "_deserialized_data"
+STORED_DATA_ATTR = "_stored_data"
+DECOMPRESSED_DATA_ATTR = "_decompressed_data"
 
 
 class DBPersistence(object):
+    """
+    Keeps the whole result as a JSON document in the `data` column.
+
+    Rows are stored as objects, or as arrays in column order when the result
+    is marked with `"row_format": "array"` (see `store_rows`). Results written
+    by `ChunkedPersistence` (a header with the columns and the row count, rows
+    in `query_result_chunks`) are read transparently, so the persistence can
+    be switched back and forth without migrating data. So are results written
+    by `CompressedPersistence`.
+    """
+
+    # whether results are stored compressed (see `compress_query_results`)
+    compresses_data = False
+
+    # one of the ROW_FORMAT_* values, None for results stored before it was kept
+    row_format = None
+
+    @property
+    def _text(self):
+        """The stored JSON text of the result."""
+        if self._data is not None:
+            return self._data
+
+        compressed_data = getattr(self, "_compressed_data", None)
+        if compressed_data is None:
+            return None
+
+        if not hasattr(self, DECOMPRESSED_DATA_ATTR):
+            started_at = time.time()
+            text = compression.decompress(compressed_data)
+            record_compression_stats("decompress", time.time() - started_at)
+            setattr(self, DECOMPRESSED_DATA_ATTR, text)
+
+        return self._decompressed_data
+
+    @_text.setter
+    def _text(self, text):
+        if getattr(self, "_compressed_data", None) is not None:
+            self._compressed_data = None
+        if hasattr(self, DECOMPRESSED_DATA_ATTR):
+            delattr(self, DECOMPRESSED_DATA_ATTR)
+        self._data = text
+
+    @property
+    def _stored(self):
+        if not hasattr(self, STORED_DATA_ATTR):
+            setattr(self, STORED_DATA_ATTR, json_loads(self._text))
+
+        return self._stored_data
+
+    @property
+    def is_chunked(self):
+        return self._text is not None and is_chunked_result(self._stored)
+
+    @property
+    def has_array_rows(self):
+        return self._text is not None and is_array_rows_result(self._stored)
+
     @property
     def data(self):
-        if self._data is None:
+        if self._text is None:
             return None
 
         if not hasattr(self, DESERIALIZED_DATA_ATTR):
-            setattr(self, DESERIALIZED_DATA_ATTR, json_loads(self._data))
+            if self.is_chunked or self.has_array_rows:
+                data = {"columns": self.columns, "rows": list(self.iter_rows())}
+            else:
+                data = self._stored
+            setattr(self, DESERIALIZED_DATA_ATTR, data)
 
         return self._deserialized_data
 
     @data.setter
     def data(self, data):
-        if hasattr(self, DESERIALIZED_DATA_ATTR):
-            delattr(self, DESERIALIZED_DATA_ATTR)
-        self._data = data
+        for attr in (DESERIALIZED_DATA_ATTR, STORED_DATA_ATTR):
+            if hasattr(self, attr):
+                delattr(self, attr)
+        self._text = data
+        self.row_format = None if data is None else ROW_FORMAT_OBJECTS
+
+    @property
+    def _stored_result(self):
+        if self._text is None or not isinstance(self._stored, dict):
+            return {}
+
+        return self._stored
+
+    @property
+    def columns(self):
+        return self._stored_result.get("columns") or []
+
+    @property
+    def row_count(self):
+        if self.is_chunked:
+            return self._stored["row_count"]
+
+        return len(self._stored_result.get("rows") or [])
+
+    def iter_rows(self, columns=None, offset=0, limit=None, as_arrays=False):
+        """
+        Iterates over the result rows, optionally only over the given column
+        names and the `limit` rows starting at `offset`. Rows are dicts, or
+        lists of values in column order when `as_arrays` is set.
+        """
+        end = None if limit is None else offset + limit
+        selected = [
+            (index, column["name"])
+            for index, column in enumerate(self.columns)
+            if columns is None or column["name"] in columns
+        ]
+
+        if self.is_chunked:
+            return self._iter_chunked_rows(selected, offset, end, as_arrays)
+
+        rows = (self._stored_result.get("rows") or [])[offset:end]
+
+        if self.has_array_rows:
+            if as_arrays:
+                if columns is None:
+                    return iter(rows)
+                return ([row[index] for index, _ in selected] for row in rows)
+            return ({name: row[index] for index, name in selected} for row in rows)
+
+        if as_arrays:
+            return ([row.get(name) for _, name in selected] for row in rows)
+        if columns is None:
+            return iter(rows)
+        return (project(row, columns) for row in rows)
+
+    def _iter_chunked_rows(self, selected, offset, end, as_arrays):
+        for chunk in self._chunks_in_range(offset, end):
+            values = decode_result_chunk(chunk.data)
+            start = max(offset - chunk.row_offset, 0)
+            stop = chunk.row_count
+            if end is not None:
+                stop = min(end - chunk.row_offset, stop)
+
+            for i in range(start, stop):
+                if as_arrays:
+                    yield [values[index][i] for index, _ in selected]
+                else:
+                    yield {name: values[index][i] for index, name in selected}
+
+    def _chunks_in_range(self, offset, end):
+        if object_session(self) is None:
+            return [
+                chunk
+                for chunk in sorted(self.chunks, key=lambda c: c.chunk_index)
+                if chunk.row_offset + chunk.row_count > offset
+                and (end is None or chunk.row_offset < end)
+            ]
+
+        chunks = self.chunks
+        if offset:
+            chunks = chunks.filter(
+                QueryResultChunk.row_offset + QueryResultChunk.row_count > offset
+            )
+        if end is not None:
+            chunks = chunks.filter(QueryResultChunk.row_offset < end)
+
+        return chunks
+
+    def store_rows(self, columns, row_batches, json_encoder=None):
+        """
+        Stores a tabular result given as its columns and an iterable of row
+        batches (each row a sequence of values in column order). Rows are kept
+        as arrays, so column names aren't repeated in every row.
+        """
+        kwargs = {"cls": json_encoder} if json_encoder else {}
+        serialized_batches = [
+            json_dumps(batch, **kwargs)[1:-1] for batch in row_batches if batch
+        ]
+
+        self.data = '{{"columns": {}, "rows": [{}], "row_format": "{}"}}'.format(
+            json_dumps(columns, **kwargs),
+            ", ".join(serialized_batches),
+            ROW_FORMAT_ARRAY,
+        )
+        self.row_format = ROW_FORMAT_ARRAY
+
+    def get_raw_data(self, as_arrays=False):
+        """
+        Returns the stored JSON text when it is what `get_data(as_arrays=...)`
+        would return for the whole result, so it can be served without being
+        parsed and dumped again. Returns None otherwise, including for results
+        whose row format wasn't recorded.
+        """
+        row_format = ROW_FORMAT_ARRAY if as_arrays else ROW_FORMAT_OBJECTS
+        if self._text is None or self.row_format != row_format:
+            return None
+
+        return self._text
+
+    def get_data(self, columns=None, offset=0, limit=None, as_arrays=False):
+        """
+        Returns the result data, limited to the given columns and row range.
+        With `as_arrays` rows are returned as lists of values in column order
+        and the result is marked with `"row_format": "array"`.
+        """
+        if self._text is None:
+            return None
+
+        whole_result = columns is None and offset == 0 and limit is None
+
+        if not as_arrays and whole_result:
+            return self.data
+
+        if as_arrays and whole_result and self.has_array_rows:
+            return self._stored
+
+        result_columns = self.columns
+        if columns is not None:
+            result_columns = [c for c in result_columns if c["name"] in columns]
+
+        data = {
+            "columns": result_columns,
+            "rows": list(self.iter_rows(columns, offset, limit, as_arrays)),
+        }
+        if as_arrays:
+            data["row_format"] = ROW_FORMAT_ARRAY
+
+        return data
+
+
+class ChunkedPersistence(DBPersistence):
+    """
+    Stores tabular results as compressed, column-major chunks of
+    `QUERY_RESULTS_CHUNK_SIZE` rows in `query_result_chunks`, so a column or a
+    range of rows can be read without loading and parsing the whole result.
+    """
+
+    @DBPersistence.data.setter
+    def data(self, data):
+        parsed = json_loads(data) if data else None
+
+        if not is_tabular_result(parsed):
+            DBPersistence.data.fset(self, data)
+            self._clear_chunks()
+            return
+
+        if is_array_rows_result(parsed):
+            self.store_rows(parsed["columns"], [parsed["rows"]])
+            return
+
+        column_names = [column["name"] for column in parsed["columns"]]
+        rows = ([row.get(name) for name in column_names] for row in parsed["rows"])
+        self.store_rows(parsed["columns"], [rows])
+        setattr(self, DESERIALIZED_DATA_ATTR, parsed)
+
+    def store_rows(self, columns, row_batches, json_encoder=None):
+        DBPersistence.data.fset(self, None)
+        self._clear_chunks()
+
+        row_count = 0
+        chunks = split_row_batches(row_batches, settings.QUERY_RESULTS_CHUNK_SIZE)
+        for index, rows in enumerate(chunks):
+            self.chunks.append(
+                QueryResultChunk(
+                    chunk_index=index,
+                    row_offset=row_count,
+                    row_count=len(rows),
+                    data=encode_result_chunk(rows, json_encoder),
+                )
+            )
+            row_count += len(rows)
+
+        self._text = json_dumps({"columns": columns, "row_count": row_count})
+        self.row_format = ROW_FORMAT_CHUNKED
+
+    def _clear_chunks(self):
+        if self.id is None:
+            self.chunks = []
+        else:
+            QueryResultChunk.query.filter(
+                QueryResultChunk.query_result_id == self.id
+            ).delete(synchronize_session=False)
+
+
+COMPRESSION_STATS_KEY = "query_results:compression"
+
+
+def record_compression_stats(operation, duration, raw_size=0, compressed_size=0):
+    """
+    Times compressions and decompressions of stored results. Compressions are
+    also counted in Redis, with their total duration and the sizes before and
+    after, for the report in `redash.monitor`. Decompressions (which happen on
+    every read) only go to statsd.
+    """
+    statsd_client.timing("query_results.{}".format(operation), duration * 1000)
+    if operation != "compress":
+        return
+
+    pipe = redis_connection.pipeline()
+    pipe.hincrby(COMPRESSION_STATS_KEY, "{}_count".format(operation), 1)
+    pipe.hincrbyfloat(COMPRESSION_STATS_KEY, "{}_seconds".format(operation), duration)
+    if raw_size:
+        pipe.hincrby(COMPRESSION_STATS_KEY, "raw_bytes", raw_size)
+        pipe.hincrby(COMPRESSION_STATS_KEY, "compressed_bytes", compressed_size)
+    pipe.execute()
+
+
+class CompressedPersistence(DBPersistence):
+    """
+    Stores the result JSON compressed in the `compressed_data` column, with zstd
+    (when the `zstandard` package is installed) or gzip, as configured with
+    QUERY_RESULTS_COMPRESSION. Results stored uncompressed in `data` are read as
+    is until the `compress_query_results` job compresses them.
+    """
+
+    compresses_data = True
+
+    @DBPersistence._text.setter
+    def _text(self, text):
+        if text is None:
+            DBPersistence._text.fset(self, None)
+            return
+
+        started_at = time.time()
+        compressed_data = compression.compress(
+            text,
+            compression.resolve_codec(settings.QUERY_RESULTS_COMPRESSION),
+            settings.QUERY_RESULTS_COMPRESSION_LEVEL,
+        )
+        record_compression_stats(
+            "compress", time.time() - started_at, len(text), len(compressed_data)
+        )
+
+        self._data = None
+        self._compressed_data = compressed_data
+        # keep the text around, the result is usually read right after storing
+        setattr(self, DECOMPRESSED_DATA_ATTR, text)
+
 
+def _load_query_result_persistence(persistence):
+    if isinstance(persistence, str):
+        return import_string(persistence)
 
-QueryResultPersistence = (
-    settings.dynamic_settings.QueryResultPersistence or DBPersistence
+    return persistence or DBPersistence
+
+
+QueryResultPersistence = _load_query_result_persistence(
+    settings.dynamic_settings.QueryResultPersistence
 )
 
 @generic_repr("id", "org_id", "data_source_id", "query_hash", "runtime", "retrieved_at")
@@ -328,21 +969,31 @@ class QueryResult(db.Model, QueryResultPersistence, BelongsToOrgMixin):
     data_source = db.relationship(DataSource, backref=backref("query_results"))
     query_hash = Column(db.String(32), index=True)
     query_text = Column("query", db.Text)
-    _data = Column("data", db.Text)
+    _data = Column("data", db.Text, nullable=True)
+    # written by CompressedPersistence instead of `data`
+    _compressed_data = Column("compressed_data", db.LargeBinary, nullable=True)
+    row_format = Column(db.String(16), nullable=True)
     runtime = Column(postgresql.DOUBLE_PRECISION)
     retrieved_at = Column(db.DateTime(True))
+    chunks = db.relationship(
+        QueryResultChunk,
+        lazy="dynamic",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        order_by=QueryResultChunk.chunk_index,
+    )
 
     __tablename__ = "query_results"
 
     def __str__(self):
         return "%d | %s | %s" % (self.id, self.query_hash, self.retrieved_at)
 
-    def to_dict(self):
+    def to_dict(self, columns=None, offset=0, limit=None, as_arrays=False):
         return {
             "id": self.id,
             "query_hash": self.query_hash,
             "query": self.query_text,
-            "data": self.data,
+            "data": self.get_data(columns, offset, limit, as_arrays),
             "data_source_id": self.data_source_id,
             "runtime": self.runtime,
             "retrieved_at": self.retrieved_at,
@@ -357,10 +1008,44 @@ class QueryResult(db.Model, QueryResultPersistence, BelongsToOrgMixin):
             ).outerjoin(Query)
         ).options(load_only("id"))
 
+    @classmethod
+    def delete_unused(cls, start_id, end_id, days=7):
+        """
+        Deletes the results with ids in [start_id, end_id) which are older than
+        `days` and which no query links to, in one statement. Returns how many
+        were deleted and their stored size in bytes.
+        """
+        age_threshold = utils.utcnow() - datetime.timedelta(days=days)
+        deleted_count, deleted_bytes = db.session.execute(
+            """
+            WITH deleted AS (
+                DELETE FROM query_results
+                WHERE id >= :start_id AND id < :end_id
+                AND retrieved_at < :age_threshold
+                AND NOT EXISTS (
+                    SELECT 1 FROM queries
+                    WHERE queries.latest_query_data_id = query_results.id
+                )
+                RETURNING coalesce(pg_column_size(data), 0)
+                    + coalesce(pg_column_size(compressed_data), 0) AS size
+            )
+            SELECT count(*), coalesce(sum(size), 0) FROM deleted
+            """,
+            {"start_id": start_id, "end_id": end_id, "age_threshold": age_threshold},
+        ).first()
+
+        return deleted_count, int(deleted_bytes)
+
     @classmethod
     def get_latest(cls, data_source, query, max_age=0):
         query_hash = gen_query_hash(query)
 
+        cached = query_result_cache.get(data_source.id, query_hash)
+        if cached is not None and cached.is_fresh(max_age):
+            query_result = cls._get_cached(cached)
+            if query_result is not None:
+                return query_result
+
         if max_age == -1:
             query = cls.query.filter(
                 cls.query_hash == query_hash, cls.data_source == data_source
@@ -376,25 +1061,93 @@ class QueryResult(db.Model, QueryResultPersistence, BelongsToOrgMixin):
                 ),
             )
 
-        return query.order_by(cls.retrieved_at.desc()).first()
+        query_result = query.order_by(cls.retrieved_at.desc()).first()
+        if query_result is not None and (
+            cached is None or cached.id != query_result.id
+        ):
+            query_result_cache.set(
+                data_source.id,
+                query_hash,
+                query_result.id,
+                query_result.retrieved_at,
+                query_result._text,
+            )
+
+        return query_result
+
+    @classmethod
+    def get_latest_by_hashes(cls, keys, max_age=0):
+        """
+        Looks up the latest result of many (data source id, query hash) pairs
+        in one query, as `get_latest` would for each of them. Returns a dict
+        keyed by the pairs which have a result.
+        """
+        keys = set(keys)
+        if not keys:
+            return {}
+
+        query = cls.query.filter(tuple_(cls.data_source_id, cls.query_hash).in_(keys))
+        if max_age != -1:
+            query = query.filter(
+                db.func.timezone("utc", cls.retrieved_at)
+                + datetime.timedelta(seconds=max_age)
+                >= db.func.timezone("utc", db.func.now())
+            )
+
+        query = query.distinct(cls.data_source_id, cls.query_hash).order_by(
+            cls.data_source_id, cls.query_hash, cls.retrieved_at.desc()
+        )
+        return {(r.data_source_id, r.query_hash): r for r in query}
+
+    @classmethod
+    def _get_cached(cls, cached):
+        if cached.data is None:
+            return cls.query.get(cached.id)
+
+        # the stored data came along with the cache entry, so don't load it
+        query_result = (
+            cls.query.options(defer(cls._data), defer(cls._compressed_data))
+            .filter(cls.id == cached.id)
+            .first()
+        )
+        if query_result is not None and "_data" in inspect(query_result).unloaded:
+            set_committed_value(query_result, "_data", cached.data)
+
+        return query_result
 
     @classmethod
     def store_result(
-        cls, org, data_source, query_hash, query, data, run_time, retrieved_at
+        cls,
+        org,
+        data_source,
+        query_hash,
+        query,
+        data,
+        run_time,
+        retrieved_at,
+        query_result=None,
     ):
-        query_result = cls(
-            org_id=org,
-            query_hash=query_hash,
-            query_text=query,
-            runtime=run_time,
-            data_source=data_source,
-            retrieved_at=retrieved_at,
-            data=data,
-        )
+        # `query_result` is an unsaved result which already holds the data
+        # (written with `store_rows` while the query was streaming).
+        if query_result is None:
+            query_result = cls(data=data)
+
+        query_result.org_id = org
+        query_result.query_hash = query_hash
+        query_result.query_text = query
+        query_result.runtime = run_time
+        query_result.data_source = data_source
+        query_result.retrieved_at = retrieved_at
 
         db.session.add(query_result)
         logging.info("Inserted query (%s) data; id=%s", query_hash, query_result.id)
 
+        # the new result is cached once it's committed
+        query_result_cache.invalidate(data_source.id, query_hash)
+        db.session.info.setdefault(PENDING_CACHED_RESULTS, []).append(
+            (query_result, data_source.id, query_hash, retrieved_at, query_result._text)
+        )
+
         return query_result
 
     @property
@@ -402,8 +1155,27 @@ class QueryResult(db.Model, QueryResultPersistence, BelongsToOrgMixin):
         return self.data_source.groups
 
 
-def should_schedule_next(
-    previous_iteration, now, interval, time=None, day_of_week=None, failures=0
+PENDING_CACHED_RESULTS = "pending_cached_query_results"
+
+
+@listens_for(db.session, "after_commit")
+def cache_committed_query_results(session):
+    pending = session.info.pop(PENDING_CACHED_RESULTS, [])
+    for query_result, data_source_id, query_hash, retrieved_at, data in pending:
+        identity = inspect(query_result).identity
+        if identity is not None:
+            query_result_cache.set(
+                data_source_id, query_hash, identity[0], retrieved_at, data
+            )
+
+
+@listens_for(db.session, "after_rollback")
+def discard_pending_cached_query_results(session):
+    session.info.pop(PENDING_CACHED_RESULTS, None)
+
+
+def next_schedule_time(
+    previous_iteration, interval, time=None, day_of_week=None, failures=0
 ):
     # if time exists then interval > 23 hours (82800s)
     # if day_of_week exists then interval > 6 days (518400s)
@@ -445,8 +1217,17 @@ def should_schedule_next(
         try:
             next_iteration += datetime.timedelta(minutes=2 ** failures)
         except OverflowError:
-            return False
-    return now > next_iteration
+            return None
+    return next_iteration
+
+
+def should_schedule_next(
+    previous_iteration, now, interval, time=None, day_of_week=None, failures=0
+):
+    next_iteration = next_schedule_time(
+        previous_iteration, interval, time, day_of_week, failures
+    )
+    return next_iteration is not None and now > next_iteration
 
 
 @gfk_type
@@ -473,7 +1254,10 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
     data_source_id = Column(key_type("DataSource"), db.ForeignKey("data_sources.id"), nullable=True)
     data_source = db.relationship(DataSource, backref="queries")
     latest_query_data_id = Column(
-        key_type("QueryResult"), db.ForeignKey("query_results.id"), nullable=True
+        key_type("QueryResult"),
+        db.ForeignKey("query_results.id"),
+        nullable=True,
+        index=True,
     )
     latest_query_data = db.relationship(QueryResult)
     name = Column(db.String(255))
@@ -632,19 +1416,51 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
         ]
 
     @classmethod
-    def outdated_queries(cls):
+    def outdated_queries(cls, shard=None):
+        """
+        Returns the scheduled queries that are due. `shard` is an optional
+        (index, count) pair limiting them to the queries with
+        `id % count == index`.
+        """
+        # pending schedule changes mark their queries in the index on flush
+        db.session.flush()
+
+        if scheduled_queries_index.needs_backfill():
+            scheduled_queries_index.mark(
+                [
+                    query_id
+                    for query_id, in db.session.query(Query.id).filter(
+                        Query.schedule.isnot(None)
+                    )
+                ]
+            )
+            scheduled_queries_index.backfilled()
+
+        now = utils.utcnow()
+        due = dict(scheduled_queries_index.due(now))
+        if shard is not None:
+            index, count = shard
+            due = {
+                query_id: score
+                for query_id, score in due.items()
+                if query_id % count == index
+            }
+        if not due:
+            return []
+
         queries = (
             Query.query.options(
                 joinedload(Query.latest_query_data).load_only("retrieved_at")
             )
-            .filter(Query.schedule.isnot(None))
+            .filter(Query.id.in_(due.keys()), Query.schedule.isnot(None))
             .order_by(Query.id)
             .all()
         )
 
-        now = utils.utcnow()
         outdated_queries = {}
-        scheduled_queries_executions.refresh()
+        scheduled_queries_executions.refresh(due.keys())
+        # queries that were deleted or unscheduled drop out of the index
+        next_runs = {query_id: None for query_id in due}
 
         for query in queries:
             try:
@@ -663,16 +1479,20 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
                     query.latest_query_data and query.latest_query_data.retrieved_at
                 )
 
-                if should_schedule_next(
+                next_iteration = next_schedule_time(
                     retrieved_at or now,
-                    now,
                     query.schedule["interval"],
                     query.schedule["time"],
                     query.schedule["day_of_week"],
                     query.schedule_failures,
-                ):
+                )
+                if next_iteration is not None and now > next_iteration:
                     key = "{}:{}".format(query.query_hash, query.data_source_id)
                     outdated_queries[key] = query
+                    # stays due until an execution reschedules it
+                    del next_runs[query.id]
+                else:
+                    next_runs[query.id] = next_iteration
             except Exception as e:
                 query.schedule["disabled"] = True
                 db.session.commit()
@@ -686,6 +1506,13 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
                     type(e)(message).with_traceback(e.__traceback__)
                 )
 
+        scheduled_queries_index.reschedule(
+            [
+                (query_id, due[query_id], next_run_at)
+                for query_id, next_run_at in next_runs.items()
+            ]
+        )
+
         return list(outdated_queries.values())
 
     @classmethod
@@ -877,6 +1704,51 @@ def receive_before_insert_update(mapper, connection, target):
     target.update_query_hash()
 
 
+SCHEDULING_ATTRIBUTES = (
+    "schedule_failures",
+    "latest_query_data",
+    "latest_query_data_id",
+)
+PENDING_SCHEDULED_QUERIES = "pending_scheduled_queries"
+
+
+def _mark_scheduled_query(target):
+    # marked right away so this transaction sees it, and again once committed
+    # in case a refresh evaluated the query before the change was visible
+    scheduled_queries_index.mark([target.id])
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(PENDING_SCHEDULED_QUERIES, set()).add(target.id)
+
+
+@listens_for(Query, "after_insert")
+def mark_inserted_scheduled_query(mapper, connection, target):
+    if target.schedule is not None:
+        _mark_scheduled_query(target)
+
+
+@listens_for(Query, "after_update")
+def mark_rescheduled_query(mapper, connection, target):
+    attrs = inspect(target).attrs
+    if attrs.schedule.history.has_changes() or (
+        target.schedule is not None
+        and any(attrs[attr].history.has_changes() for attr in SCHEDULING_ATTRIBUTES)
+    ):
+        _mark_scheduled_query(target)
+
+
+@listens_for(db.session, "after_commit")
+def mark_committed_scheduled_queries(session):
+    scheduled_queries_index.mark(
+        list(session.info.pop(PENDING_SCHEDULED_QUERIES, ()))
+    )
+
+
+@listens_for(db.session, "after_rollback")
+def discard_pending_scheduled_queries(session):
+    session.info.pop(PENDING_SCHEDULED_QUERIES, None)
+
+
 @listens_for(Query.user_id, "set")
 def query_last_modified_by(target, val, oldval, initiator):
     target.last_modified_by_id = val
@@ -1287,6 +2159,71 @@ class Widget(TimestampMixin, BelongsToOrgMixin, db.Model):
         return super(Widget, cls).get_by_id_and_org(object_id, org, Dashboard)
 
 
+PENDING_PUBLIC_DASHBOARD_INVALIDATIONS = "pending_public_dashboard_invalidations"
+# the query fields public dashboards show
+PUBLIC_QUERY_FIELDS = ("name", "description", "options")
+
+
+@listens_for(db.session, "before_flush")
+def collect_changed_public_dashboards(session, flush_context, instances):
+    dashboard_ids = set()
+    visualization_ids = set()
+    query_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Dashboard):
+            dashboard_ids.add(obj.id)
+        elif isinstance(obj, Widget):
+            dashboard_ids.add(
+                obj.dashboard.id if obj.dashboard is not None else obj.dashboard_id
+            )
+        elif isinstance(obj, Visualization):
+            visualization_ids.add(obj.id)
+        elif isinstance(obj, Query) and (
+            obj in session.deleted
+            or any(
+                inspect(obj).attrs[field].history.has_changes()
+                for field in PUBLIC_QUERY_FIELDS
+            )
+        ):
+            query_ids.add(obj.id)
+
+    visualization_ids.discard(None)
+    query_ids.discard(None)
+    if visualization_ids or query_ids:
+        widgets = Widget.__table__.join(Visualization.__table__)
+        dashboard_ids.update(
+            dashboard_id
+            for dashboard_id, in session.execute(
+                db.select([Widget.dashboard_id])
+                .select_from(widgets)
+                .where(
+                    or_(
+                        Visualization.id.in_(visualization_ids or [None]),
+                        Visualization.query_id.in_(query_ids or [None]),
+                    )
+                )
+            )
+        )
+
+    dashboard_ids.discard(None)
+    if dashboard_ids:
+        session.info.setdefault(PENDING_PUBLIC_DASHBOARD_INVALIDATIONS, set()).update(
+            dashboard_ids
+        )
+
+
+@listens_for(db.session, "after_commit")
+def invalidate_changed_public_dashboards(session):
+    dashboard_ids = session.info.pop(PENDING_PUBLIC_DASHBOARD_INVALIDATIONS, None)
+    if dashboard_ids:
+        public_dashboard_cache.invalidate(dashboard_ids)
+
+
+@listens_for(db.session, "after_rollback")
+def discard_public_dashboard_invalidations(session):
+    session.info.pop(PENDING_PUBLIC_DASHBOARD_INVALIDATIONS, None)
+
+
 @generic_repr(
     "id", "object_type", "object_id", "action", "user_id", "org_id", "created_at"
 )
@@ -1305,6 +2242,8 @@ class Event(db.Model):
     created_at = Column(db.DateTime(True), default=db.func.now())
 
     __tablename__ = "events"
+    # inserted rows are moved to their partition by a trigger, which returns no rows
+    __table_args__ = {"implicit_returning": False}
 
     def __str__(self):
         return "%s,%s,%s,%s" % (
@@ -1326,7 +2265,8 @@ class Event(db.Model):
         }
 
     @classmethod
-    def record(cls, event):
+    def _values(cls, event):
+        event = dict(event)
         org_id = event.pop("org_id")
         user_id = event.pop("user_id", None)
         action = event.pop("action")
@@ -1335,7 +2275,7 @@ class Event(db.Model):
 
         created_at = datetime.datetime.utcfromtimestamp(event.pop("timestamp"))
 
-        event = cls(
+        return dict(
             org_id=org_id,
             user_id=user_id,
             action=action,
@@ -1344,9 +2284,156 @@ class Event(db.Model):
             additional_properties=event,
             created_at=created_at,
         )
+
+    @classmethod
+    def record(cls, event):
+        values = cls._values(event)
+        event = cls(**values)
         db.session.add(event)
+        DailyEventCount.increment([values])
         return event
 
+    @classmethod
+    def record_batch(cls, events):
+        """
+        Stores the given events with a single INSERT, and returns them as
+        (transient) Event objects.
+        """
+        values = [cls._values(event) for event in events]
+        if values:
+            db.session.execute(cls.__table__.insert().values(values))
+            DailyEventCount.increment(values)
+
+        return [cls(**event_values) for event_values in values]
+
+
+@listens_for(Event.__table__, "after_create")
+def install_event_partition_trigger(target, connection, **kwargs):
+    connection.execute(event_partitions.PARTITION_TRIGGER)
+
+
+@listens_for(Event.__table__, "before_drop")
+def drop_event_partitions(target, connection, **kwargs):
+    for name, in connection.execute(event_partitions.LIST_PARTITIONS):
+        connection.execute("DROP TABLE IF EXISTS {}".format(name))
+
+
+class FlushedEventBatch(db.Model):
+    """
+    The batches of buffered events that were stored (see
+    redash.tasks.events.flush_events), committed along with their events, so a
+    batch whose flush died before it was removed from Redis isn't stored (and
+    counted) again. Events of a batch stored one by one are recorded as
+    "<batch id>:<index>".
+    """
+
+    id = Column(db.String(64), primary_key=True)
+    flushed_at = Column(db.DateTime(True), default=db.func.now())
+
+    __tablename__ = "flushed_event_batches"
+
+    @classmethod
+    def flushed(cls, batch_id):
+        """Returns the ids recorded for the batch and its events."""
+        query = db.session.query(cls.id).filter(
+            or_(cls.id == batch_id, cls.id.startswith("{}:".format(batch_id)))
+        )
+        return set(id for id, in query)
+
+    @classmethod
+    def delete_older_than(cls, before):
+        return cls.query.filter(cls.flushed_at < before).delete(
+            synchronize_session=False
+        )
+
+
+class DailyEventCount(db.Model):
+    """
+    The number of events of every day (in UTC) by metric and object: the views of
+    every dashboard, and the query executions of every data source and application.
+    Counts are incremented with every batch of stored events, so usage reports
+    don't scan `events`.
+    """
+
+    org_id = Column(
+        key_type("Organization"), db.ForeignKey("organizations.id"), primary_key=True
+    )
+    metric = Column(db.String(50), primary_key=True)
+    object_id = Column(db.String(255), primary_key=True)
+    day = Column(db.Date, primary_key=True)
+    count = Column(db.Integer, nullable=False, default=0)
+
+    __tablename__ = "daily_event_counts"
+
+    DASHBOARD_VIEWS = "dashboard_views"
+    DATA_SOURCE_EXECUTIONS = "data_source_executions"
+    APPLICATION_EXECUTIONS = "application_executions"
+    METRICS = (DASHBOARD_VIEWS, DATA_SOURCE_EXECUTIONS, APPLICATION_EXECUTIONS)
+
+    @classmethod
+    def _metrics(cls, event):
+        if event["action"] == "view" and event["object_type"] == "dashboard":
+            yield cls.DASHBOARD_VIEWS, event["object_id"]
+
+        if event["action"] == "execute_query" and event["object_type"] == "data_source":
+            yield cls.DATA_SOURCE_EXECUTIONS, event["object_id"]
+            application_id = event["additional_properties"].get("application_id")
+            yield cls.APPLICATION_EXECUTIONS, application_id
+
+    @classmethod
+    def increment(cls, events):
+        """Counts the given events, as the column values of Event."""
+        counts = Counter()
+        for event in events:
+            if event["org_id"] is None:
+                continue
+
+            for metric, object_id in cls._metrics(event):
+                if object_id is not None:
+                    day = event["created_at"].date()
+                    counts[(event["org_id"], metric, str(object_id), day)] += 1
+
+        if not counts:
+            return
+
+        # sorted, so concurrent increments lock the rows in the same order
+        statement = postgresql.insert(cls.__table__).values(
+            [
+                dict(
+                    org_id=org_id,
+                    metric=metric,
+                    object_id=object_id,
+                    day=day,
+                    count=count,
+                )
+                for (org_id, metric, object_id, day), count in sorted(counts.items())
+            ]
+        )
+        db.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=["org_id", "metric", "object_id", "day"],
+                set_={"count": cls.__table__.c["count"] + statement.excluded["count"]},
+            )
+        )
+
+    @classmethod
+    def counts(cls, org, metric, start, end, object_ids=None):
+        query = cls.query.filter(
+            cls.org_id == org.id,
+            cls.metric == metric,
+            cls.day >= start,
+            cls.day <= end,
+        )
+        if object_ids:
+            query = query.filter(
+                cls.object_id.in_([str(object_id) for object_id in object_ids])
+            )
+
+        return query.order_by(cls.day, cls.object_id)
+
+    def to_dict(self):
+        return {"day": self.day, "object_id": self.object_id, "count": self.count}
+
 
 @generic_repr("id", "created_by_id", "org_id", "active")
 class ApiKey(TimestampMixin, GFKBase, db.Model):
@@ -1440,6 +2527,19 @@ class Application(TimestampMixin, BelongsToOrgMixin, db.Model):
     def get_by_secret_key(cls, secret_key):
         return cls.query.filter(cls.secret_key == secret_key).one()
 
+    @classmethod
+    def get_cached_by_secret_key(cls, secret_key):
+        """
+        Returns the application of a secret key as a CachedApplication, from the
+        per-process cache when it's there (see EmbedAuthCache).
+        """
+        application = embed_auth_cache.get_application(secret_key)
+        if application is None:
+            application = CachedApplication(cls.get_by_secret_key(secret_key))
+            embed_auth_cache.set_application(application)
+
+        return application
+
     def to_dict(self, hide_token=True):
         def hide_secret_token(token):
             return token[:4] + "*" * (len(token) - 8) + token[-4:]
@@ -1476,6 +2576,38 @@ class Application(TimestampMixin, BelongsToOrgMixin, db.Model):
             .limit(limit)
         )
 
+
+PENDING_APPLICATION_REVOCATIONS = "pending_application_revocations"
+
+
+@listens_for(db.session, "before_flush")
+def collect_changed_applications(session, flush_context, instances):
+    secret_keys = set()
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Application):
+            history = inspect(obj).attrs.secret_key.history
+            secret_keys.update(history.deleted or [])
+            secret_keys.add(obj.secret_key)
+
+    secret_keys.discard(None)
+    if secret_keys:
+        session.info.setdefault(PENDING_APPLICATION_REVOCATIONS, set()).update(
+            secret_keys
+        )
+
+
+@listens_for(db.session, "after_commit")
+def revoke_changed_applications(session):
+    secret_keys = session.info.pop(PENDING_APPLICATION_REVOCATIONS, None)
+    if secret_keys:
+        embed_auth_cache.revoke_applications(secret_keys)
+
+
+@listens_for(db.session, "after_rollback")
+def discard_application_revocations(session):
+    session.info.pop(PENDING_APPLICATION_REVOCATIONS, None)
+
+
 @generic_repr("id", "application_id", "dashoard_id", "created_by_id")
 class ApplicationDashboard(db.Model):
     # XXX drop id, use application/dashboard as PK
@@ -20,6 +20,17 @@ class AccessToken:
         return access_token
 
 
+    @property
+    def expires_in(self):
+        """Seconds until the token expires, or None if it isn't valid."""
+        key = "{}{}".format(self.__access_token_prefix__, self.access_token)
+        ttl = redis_connection.pttl(key)
+        if ttl == -2:
+            return None
+        if ttl == -1:
+            return float("inf")
+        return ttl / 1000.0
+
     @property
     def is_valid(self):
         key = "{}{}".format(self.__access_token_prefix__, self.access_token)
@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from redash import redis_connection, settings, statsd_client
+from redash.utils import json_dumps, json_loads
+
+from .access_token import AccessToken
+
+logger = logging.getLogger(__name__)
+
+REVOCATIONS_CHANNEL = "redash:embed:revocations"
+
+
+class LocalTTLCache(object):
+    """A thread safe LRU of up to `max_size` entries, each expiring after its TTL."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class CachedApplication(object):
+    """What authenticating an embed request needs of an Application."""
+
+    def __init__(self, application):
+        self.id = application.id
+        self.org_id = application.org_id
+        self.name = application.name
+        self.secret_key = application.secret_key
+        self.secret_token = application.secret_token
+        self.active = application.active
+
+    @property
+    def is_active(self):
+        return self.active == True
+
+
+class EmbedAuthCache(object):
+    """
+    Keeps validated embed access tokens and the applications of secret keys in a
+    per-process LRU for up to EMBED_AUTH_CACHE_TTL seconds, so authenticating an
+    embed request doesn't cost a Redis or database round trip every time.
+
+    Access tokens are never kept past their own expiration. Changed or deleted
+    applications are revoked from the caches of all processes through Redis
+    pub/sub (see `revoke_applications`), and applications are only cached while
+    this process is subscribed to the revocations.
+    """
+
+    def __init__(self):
+        self.access_tokens = LocalTTLCache(settings.EMBED_AUTH_CACHE_MAX_SIZE)
+        self.applications = LocalTTLCache(settings.EMBED_AUTH_CACHE_MAX_SIZE)
+        self._subscriber = None
+        self._subscriber_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return settings.EMBED_AUTH_CACHE_ENABLED
+
+    def is_valid_access_token(self, access_token):
+        if not self.enabled:
+            return AccessToken(access_token).is_valid
+
+        if self.access_tokens.get(access_token):
+            statsd_client.incr("embed_auth_cache.access_token.hit")
+            return True
+
+        statsd_client.incr("embed_auth_cache.access_token.miss")
+        expires_in = AccessToken(access_token).expires_in
+        if expires_in is None:
+            return False
+
+        self.access_tokens.set(
+            access_token, True, min(settings.EMBED_AUTH_CACHE_TTL, expires_in)
+        )
+        return True
+
+    def get_application(self, secret_key):
+        if not self.enabled:
+            return None
+
+        application = self.applications.get(secret_key)
+        statsd_client.incr(
+            "embed_auth_cache.application.{}".format(
+                "miss" if application is None else "hit"
+            )
+        )
+        return application
+
+    def set_application(self, application):
+        if self.enabled and self._subscribe():
+            self.applications.set(
+                application.secret_key, application, settings.EMBED_AUTH_CACHE_TTL
+            )
+
+    def revoke_applications(self, secret_keys):
+        for secret_key in secret_keys:
+            self.applications.delete(secret_key)
+
+        redis_connection.publish(
+            REVOCATIONS_CHANNEL, json_dumps({"secret_keys": list(secret_keys)})
+        )
+
+    def _handle_revocation(self, message):
+        for secret_key in json_loads(message["data"])["secret_keys"]:
+            self.applications.delete(secret_key)
+
+    def _subscribe(self):
+        """Makes sure this process listens to revocations, returns whether it does."""
+        with self._lock:
+            if (
+                self._subscriber is not None
+                and self._subscriber.is_alive()
+                and self._subscriber_pid == os.getpid()
+            ):
+                return True
+
+            # revocations might have been missed until now
+            self.applications.clear()
+            try:
+                pubsub = redis_connection.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{REVOCATIONS_CHANNEL: self._handle_revocation})
+                self._subscriber = pubsub.run_in_thread(sleep_time=1, daemon=True)
+                self._subscriber_pid = os.getpid()
+                return True
+            except Exception:
+                logger.exception("Failed subscribing to application revocations.")
+                self._subscriber = None
+                return False
+
+
+embed_auth_cache = EmbedAuthCache()
@@ -0,0 +1,114 @@
+"""
+`events` is partitioned by month with table inheritance: the events of every month
+are stored in a child table named events_YYYY_MM, so old events are removed by
+dropping whole partitions. Events whose partition doesn't exist (and those stored
+before partitioning) are kept in `events` itself.
+"""
+import datetime
+
+from sqlalchemy import text
+
+from .base import db
+
+# Routes the events inserted into `events` to the partition of their month.
+PARTITION_TRIGGER = """
+CREATE OR REPLACE FUNCTION events_insert_partition() RETURNS trigger AS $$
+DECLARE
+    partition text;
+BEGIN
+    partition := 'events_' || to_char(NEW.created_at AT TIME ZONE 'UTC', 'YYYY_MM');
+    IF partition IS NULL OR to_regclass(partition::cstring) IS NULL THEN
+        RETURN NEW;
+    END IF;
+
+    EXECUTE 'INSERT INTO ' || quote_ident(partition) || ' VALUES ($1.*)' USING NEW;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS events_insert_partition ON events;
+CREATE TRIGGER events_insert_partition
+    BEFORE INSERT ON events
+    FOR EACH ROW EXECUTE PROCEDURE events_insert_partition();
+"""
+
+LIST_PARTITIONS = """
+SELECT c.relname FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = 'events'::regclass
+"""
+
+CREATE_PARTITION = """
+CREATE TABLE IF NOT EXISTS {name} (
+    PRIMARY KEY (id),
+    CHECK (created_at >= '{start} 00:00:00+00' AND created_at < '{end} 00:00:00+00')
+) INHERITS (events);
+CREATE INDEX IF NOT EXISTS {name}_org_id_created_at ON {name} (org_id, created_at);
+"""
+
+
+def month_start(day):
+    return datetime.date(day.year, day.month, 1)
+
+
+def next_month(month):
+    return (month.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def partition_name(month):
+    return "events_{:%Y_%m}".format(month)
+
+
+def event_partitions():
+    """Returns the first day of the month of every partition, by its name."""
+    partitions = {}
+    for name, in db.session.execute(LIST_PARTITIONS):
+        try:
+            partitions[name] = datetime.datetime.strptime(name, "events_%Y_%m").date()
+        except ValueError:
+            continue
+
+    return partitions
+
+
+def create_event_partitions(today, months_ahead):
+    """Creates the partitions of this month and of the next `months_ahead` months."""
+    existing = event_partitions()
+    created = []
+    month = month_start(today)
+    for _ in range(months_ahead + 1):
+        name = partition_name(month)
+        if name not in existing:
+            db.session.execute(
+                CREATE_PARTITION.format(name=name, start=month, end=next_month(month))
+            )
+            created.append(name)
+        month = next_month(month)
+
+    return created
+
+
+def drop_event_partitions(before):
+    """Drops the partitions whose events are all older than `before` (a date)."""
+    dropped = []
+    for name, month in sorted(event_partitions().items()):
+        if next_month(month) <= before:
+            db.session.execute("DROP TABLE IF EXISTS {}".format(name))
+            dropped.append(name)
+
+    return dropped
+
+
+def delete_unpartitioned_events(before, limit):
+    """Deletes up to `limit` events older than `before` from `events` itself."""
+    result = db.session.execute(
+        text(
+            """
+            DELETE FROM ONLY events WHERE id IN (
+                SELECT id FROM ONLY events WHERE created_at < :before LIMIT :limit
+            )
+            """
+        ),
+        {"before": before, "limit": limit},
+    )
+    return result.rowcount
@@ -0,0 +1,81 @@
+from redash import redis_connection, settings, statsd_client
+
+
+# Stores a payload unless the dashboard changed (its generation was incremented)
+# since the payload was built.
+SET_PAYLOAD_SCRIPT = """
+local generation = redis.call('HGET', KEYS[1], 'generation') or '0'
+if generation ~= ARGV[1] then
+    return 0
+end
+
+redis.call('HMSET', KEYS[1], 'built_generation', ARGV[1])
+redis.call('HMSET', KEYS[1], 'etag', ARGV[2], 'payload', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+
+class PublicDashboardCache(object):
+    """
+    Keeps the serialized payload of public and embed dashboards in Redis, along
+    with its ETag.
+
+    Every change of a dashboard, its widgets or their visualizations and queries
+    increments the dashboard's generation (see `invalidate`, called once the
+    change is committed), which discards the payload. A payload is only stored
+    if its generation is still current, so one built while the dashboard changed
+    isn't kept.
+    """
+
+    KEY_PREFIX = "public_dashboard:"
+
+    def __init__(self):
+        self._set_payload = redis_connection.register_script(SET_PAYLOAD_SCRIPT)
+
+    @property
+    def enabled(self):
+        return settings.PUBLIC_DASHBOARDS_CACHE_ENABLED
+
+    def _key(self, dashboard_id):
+        return "{}{}".format(self.KEY_PREFIX, dashboard_id)
+
+    def get(self, dashboard_id):
+        """
+        Returns the current generation of the dashboard, and its payload and ETag
+        (None when they aren't cached).
+        """
+        if not self.enabled:
+            return None, None, None
+
+        generation, built_generation, etag, payload = redis_connection.hmget(
+            self._key(dashboard_id), "generation", "built_generation", "etag", "payload"
+        )
+        generation = generation or "0"
+        if payload is None or built_generation != generation:
+            statsd_client.incr("public_dashboard_cache.miss")
+            return generation, None, None
+
+        statsd_client.incr("public_dashboard_cache.hit")
+        return generation, etag, payload
+
+    def set(self, dashboard_id, generation, etag, payload):
+        if not self.enabled:
+            return
+
+        self._set_payload(
+            keys=[self._key(dashboard_id)],
+            args=[generation, etag, payload, settings.PUBLIC_DASHBOARDS_CACHE_TTL],
+        )
+
+    def invalidate(self, dashboard_ids):
+        pipe = redis_connection.pipeline()
+        for dashboard_id in dashboard_ids:
+            key = self._key(dashboard_id)
+            pipe.hincrby(key, "generation", 1)
+            pipe.hdel(key, "built_generation", "etag", "payload")
+            pipe.expire(key, settings.PUBLIC_DASHBOARDS_CACHE_TTL)
+        pipe.execute()
+
+
+public_dashboard_cache = PublicDashboardCache()
@@ -0,0 +1,119 @@
+import time
+
+from redash import redis_connection, settings, statsd_client
+
+
+# Stores an entry unless a newer result (by retrieved_at) is already cached,
+# then evicts the least recently used entries above the size limit.
+SET_ENTRY_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'retrieved_at')
+if current and tonumber(current) > tonumber(ARGV[2]) then
+    return 0
+end
+
+redis.call('DEL', KEYS[1])
+redis.call('HMSET', KEYS[1], 'id', ARGV[1], 'retrieved_at', ARGV[2])
+if ARGV[3] ~= '' then
+    redis.call('HSET', KEYS[1], 'data', ARGV[3])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('ZADD', KEYS[2], ARGV[5], KEYS[1])
+
+local overflow = redis.call('ZCARD', KEYS[2]) - tonumber(ARGV[6])
+if overflow > 0 then
+    local evicted = redis.call('ZRANGE', KEYS[2], 0, overflow - 1)
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, overflow - 1)
+    for _, key in ipairs(evicted) do
+        redis.call('DEL', key)
+    end
+end
+
+return 1
+"""
+
+
+class CachedQueryResult(object):
+    def __init__(self, id, retrieved_at, data=None):
+        self.id = id
+        self.retrieved_at = retrieved_at
+        self.data = data
+
+    def is_fresh(self, max_age):
+        return max_age == -1 or self.retrieved_at + max_age >= time.time()
+
+
+class QueryResultCache(object):
+    """
+    Keeps the id and retrieval time of the latest result of every
+    (data source, query hash) in Redis, and for small results also the
+    stored `data`, so `QueryResult.get_latest` can skip the database lookup.
+
+    Entries expire after QUERY_RESULTS_CACHE_TTL seconds, and above
+    QUERY_RESULTS_CACHE_MAX_ENTRIES the least recently used ones are evicted.
+    """
+
+    KEY_PREFIX = "query_result_cache:"
+    LRU_KEY = "query_result_cache:lru"
+
+    def __init__(self):
+        self._set_entry = redis_connection.register_script(SET_ENTRY_SCRIPT)
+
+    @property
+    def enabled(self):
+        return settings.QUERY_RESULTS_CACHE_ENABLED
+
+    def _key(self, data_source_id, query_hash):
+        return "{}{}:{}".format(self.KEY_PREFIX, data_source_id, query_hash)
+
+    def get(self, data_source_id, query_hash):
+        if not self.enabled:
+            return None
+
+        key = self._key(data_source_id, query_hash)
+        pipe = redis_connection.pipeline()
+        pipe.hgetall(key)
+        pipe.zadd(self.LRU_KEY, {key: time.time()}, xx=True)
+        entry, _ = pipe.execute()
+
+        if not entry:
+            statsd_client.incr("query_result_cache.miss")
+            return None
+
+        statsd_client.incr("query_result_cache.hit")
+        return CachedQueryResult(
+            int(entry["id"]), float(entry["retrieved_at"]), entry.get("data")
+        )
+
+    def set(self, data_source_id, query_hash, query_result_id, retrieved_at, data=None):
+        if not self.enabled:
+            return False
+
+        if data is None or len(data) > settings.QUERY_RESULTS_CACHE_MAX_PAYLOAD_SIZE:
+            data = ""
+
+        key = self._key(data_source_id, query_hash)
+        stored = self._set_entry(
+            keys=[key, self.LRU_KEY],
+            args=[
+                query_result_id,
+                retrieved_at.timestamp(),
+                data,
+                settings.QUERY_RESULTS_CACHE_TTL,
+                time.time(),
+                settings.QUERY_RESULTS_CACHE_MAX_ENTRIES,
+            ],
+        )
+        return bool(stored)
+
+    def invalidate(self, data_source_id, query_hash):
+        if not self.enabled:
+            return
+
+        key = self._key(data_source_id, query_hash)
+        pipe = redis_connection.pipeline()
+        pipe.delete(key)
+        pipe.zrem(self.LRU_KEY, key)
+        pipe.execute()
+
+
+query_result_cache = QueryResultCache()
@@ -407,7 +407,9 @@ class AnonymousUser(AnonymousUserMixin, PermissionsCheckMixin):
 
 
 class ApiUser(UserMixin, PermissionsCheckMixin):
-    def __init__(self, api_key, org, groups, name=None, embed=False):
+    def __init__(
+        self, api_key, org, groups, name=None, embed=False, application_id=None
+    ):
         self.object = None
         if type(api_key) in (str, int):
         #if isinstance(api_key, str):
@@ -420,6 +422,7 @@ class ApiUser(UserMixin, PermissionsCheckMixin):
         self.group_ids = groups
         self.org = org
         self.is_embed = embed
+        self.application_id = application_id
 
     def __repr__(self):
         return "<{}>".format(self.name)
@@ -2,8 +2,19 @@ from __future__ import absolute_import
 import itertools
 from funcy import flatten
 from sqlalchemy import union_all
+from sqlalchemy.orm import load_only
 from redash import redis_connection, rq_redis_connection, __version__, settings
-from redash.models import db, DataSource, Query, QueryResult, Dashboard, Widget
+from redash.concurrency import query_execution_slots
+from redash.query_runner.pool import CONNECTION_POOLS_STATUS_KEY
+from redash.models import (
+    db,
+    COMPRESSION_STATS_KEY,
+    DataSource,
+    Query,
+    QueryResult,
+    Dashboard,
+    Widget,
+)
 from redash.utils import json_loads
 from rq import Queue, Worker
 from rq.job import Job
@@ -49,12 +60,76 @@ def get_db_sizes():
     return database_metrics
 
 
+def get_query_results_compression_status():
+    stats = redis_connection.hgetall(COMPRESSION_STATS_KEY)
+    if not stats:
+        return {}
+
+    compress_count = int(stats.get("compress_count", 0))
+    compress_seconds = float(stats.get("compress_seconds", 0))
+    raw_bytes = int(stats.get("raw_bytes", 0))
+    compressed_bytes = int(stats.get("compressed_bytes", 0))
+
+    return {
+        "query_results_compressed_count": compress_count,
+        "query_results_compression_ratio": round(raw_bytes / compressed_bytes, 2)
+        if compressed_bytes
+        else None,
+        "query_results_compress_avg_ms": round(
+            compress_seconds * 1000 / compress_count, 2
+        )
+        if compress_count
+        else None,
+    }
+
+
+REFRESH_QUERIES_SHARD_STATUS_KEY = "redash:status:refresh_queries:{}"
+
+
+def get_refresh_queries_shards_status():
+    pipe = redis_connection.pipeline()
+    for shard in range(settings.REFRESH_QUERIES_SHARDS):
+        pipe.hgetall(REFRESH_QUERIES_SHARD_STATUS_KEY.format(shard))
+
+    return [
+        dict(status, shard=shard) for shard, status in enumerate(pipe.execute())
+    ]
+
+
+def get_connection_pools_status():
+    """
+    Sums the stats of the connection pools of every (live) warm worker, by data source.
+    """
+    reports = redis_connection.hgetall(CONNECTION_POOLS_STATUS_KEY)
+    if not reports:
+        return {}
+
+    live_workers = {worker.name for worker in Worker.all(connection=rq_redis_connection)}
+    dead_workers = [name for name in reports if name not in live_workers]
+    if dead_workers:
+        redis_connection.hdel(CONNECTION_POOLS_STATUS_KEY, *dead_workers)
+
+    pools = {}
+    for name, report in reports.items():
+        if name in live_workers:
+            for key, stats in json_loads(report)["pools"].items():
+                totals = pools.setdefault(key, dict.fromkeys(stats, 0))
+                for stat, value in stats.items():
+                    totals[stat] += value
+
+    return pools
+
+
 def get_status():
     status = {"version": __version__, "workers": []}
     status.update(get_redis_status())
     status.update(get_object_counts())
+    status.update(get_query_results_compression_status())
     status["manager"] = redis_connection.hgetall("redash:status")
     status["manager"]["queues"] = get_queues_status()
+    status["connection_pools"] = get_connection_pools_status()
+    if settings.REFRESH_QUERIES_SHARDS > 1:
+        status["manager"]["shards"] = get_refresh_queries_shards_status()
     status["database_metrics"] = {}
     status["database_metrics"]["metrics"] = get_db_sizes()
 
@@ -119,5 +194,31 @@ def rq_workers():
     ]
 
 
+def rq_data_sources():
+    data_sources = DataSource.query.options(
+        load_only("id", "name", "org_id", "max_concurrency")
+    ).order_by(DataSource.id)
+    data_sources = {ds.id: ds for ds in data_sources}
+    counts = query_execution_slots.counts(list(data_sources.keys()))
+
+    return [
+        {
+            "id": ds.id,
+            "name": ds.name,
+            "org_id": ds.org_id,
+            "max_concurrency": settings.QUERY_EXECUTION_MAX_CONCURRENCY
+            if ds.max_concurrency is None
+            else ds.max_concurrency,
+            "running": counts[ds.id]["running"],
+            "waiting": counts[ds.id]["waiting"],
+        }
+        for ds in data_sources.values()
+    ]
+
+
 def rq_status():
-    return {"queues": rq_queues(), "workers": rq_workers()}
+    return {
+        "queues": rq_queues(),
+        "workers": rq_workers(),
+        "data_sources": rq_data_sources(),
+    }
@@ -1,6 +1,6 @@
 import logging
 
-from contextlib import ExitStack
+from contextlib import ExitStack, contextmanager
 from dateutil import parser
 from functools import wraps
 import socket
@@ -10,10 +10,11 @@ from urllib.parse import urlparse
 from six import text_type
 from sshtunnel import open_tunnel
 from redash import settings, utils
-from redash.utils import json_loads, query_is_select_no_limit, add_limit_to_query
+from redash.utils import JSONEncoder, json_loads, query_is_select_no_limit, add_limit_to_query
 from rq.timeouts import JobTimeoutException
 
 from redash.utils.requests_session import requests, requests_session
+from redash.query_runner.pool import connection_pools
 
 logger = logging.getLogger(__name__)
 
@@ -62,6 +63,18 @@ class BaseQueryRunner(object):
     deprecated = False
     should_annotate_query = True
     noop_query = None
+    # Query runners implementing `iter_query` should set this to True.
+    supports_iter_query = False
+    iter_query_batch_size = 1000
+    # Encoder used when storing the rows yielded by `iter_query`.
+    json_encoder = JSONEncoder
+    # Query runners implementing `_open_connection` should set this to True to keep
+    # their connections open between queries when connection pools are enabled.
+    supports_connection_pool = False
+    # Set on query runners created for a data source, to key its connection pool.
+    data_source_id = None
+    # Query runners implementing `get_schema_changes` should set this to True.
+    supports_incremental_schema = False
 
     def __init__(self, configuration):
         self.syntax = "sql"
@@ -154,6 +167,70 @@ class BaseQueryRunner(object):
     def run_query(self, query, user, org=None):
         raise NotImplementedError()
 
+    def iter_query(self, query, user, org=None):
+        """Streaming alternative to `run_query`.
+
+        A generator that first yields the list of result columns and then
+        batches (lists) of rows, each row being a sequence of values in column
+        order. Errors are raised instead of being returned.
+        """
+        raise NotImplementedError()
+
+    def _open_connection(self):
+        """Opens a connection to the data source for `pooled_connection`."""
+        raise NotImplementedError()
+
+    def _close_connection(self, connection):
+        connection.close()
+
+    def _connection_is_usable(self, connection):
+        return True
+
+    def _check_connection(self, connection):
+        """Checks that a connection that was idle for a while still works."""
+        return True
+
+    def _reset_connection(self, connection):
+        """Resets the session state a query may have left on a connection."""
+        pass
+
+    @contextmanager
+    def pooled_connection(self):
+        """Yields a connection to the data source.
+
+        When connection pools are enabled (see redash.query_runner.pool) the
+        connection is taken from the pool of the data source and returned to it
+        afterwards (once reset), unless the block raised or left it unusable.
+        Otherwise a new connection is opened and closed afterwards.
+        """
+        if not (self.supports_connection_pool and connection_pools.enabled):
+            connection = self._open_connection()
+            try:
+                yield connection
+            finally:
+                self._close_connection(connection)
+            return
+
+        pool = connection_pools.get(self)
+        connection = pool.acquire()
+        try:
+            yield connection
+        except BaseException:
+            pool.discard(connection)
+            raise
+
+        if not self._connection_is_usable(connection):
+            pool.discard(connection)
+            return
+
+        try:
+            self._reset_connection(connection)
+        except Exception:
+            logger.warning("Failed resetting a pooled connection.", exc_info=True)
+            pool.discard(connection)
+        else:
+            pool.release(connection)
+
     def fetch_columns(self, columns):
         column_names = []
         duplicates_counter = 1
@@ -175,6 +252,13 @@ class BaseQueryRunner(object):
     def get_schema(self, get_stats=False):
         raise NotSupported()
 
+    def get_schema_changes(self, since):
+        """
+        Returns the tables created or altered after `since` (a naive UTC datetime),
+        in the format of `get_schema`, and the set of names of all the tables.
+        """
+        raise NotSupported()
+
     def _run_query_internal(self, query):
         results, error = self.run_query(query, None)
 
@@ -403,43 +487,58 @@ def guess_type_from_string(string_value):
 
 
 def with_ssh_tunnel(query_runner, details):
-    def tunnel(f):
-        @wraps(f)
-        def wrapper(*args, **kwargs):
-            try:
-                remote_host, remote_port = query_runner.host, query_runner.port
-            except NotImplementedError:
-                raise NotImplementedError(
-                    "SSH tunneling is not implemented for this query runner yet."
+    @contextmanager
+    def ssh_tunnel():
+        try:
+            remote_host, remote_port = query_runner.host, query_runner.port
+        except NotImplementedError:
+            raise NotImplementedError(
+                "SSH tunneling is not implemented for this query runner yet."
+            )
+
+        stack = ExitStack()
+        try:
+            bastion_address = (details["ssh_host"], details.get("ssh_port", 22))
+            remote_address = (remote_host, remote_port)
+            auth = {
+                "ssh_username": details["ssh_username"],
+                **settings.dynamic_settings.ssh_tunnel_auth(),
+            }
+            server = stack.enter_context(
+                open_tunnel(
+                    bastion_address, remote_bind_address=remote_address, **auth
                 )
+            )
+        except Exception as error:
+            raise type(error)("SSH tunnel: {}".format(str(error)))
 
-            stack = ExitStack()
+        with stack:
             try:
-                bastion_address = (details["ssh_host"], details.get("ssh_port", 22))
-                remote_address = (remote_host, remote_port)
-                auth = {
-                    "ssh_username": details["ssh_username"],
-                    **settings.dynamic_settings.ssh_tunnel_auth(),
-                }
-                server = stack.enter_context(
-                    open_tunnel(
-                        bastion_address, remote_bind_address=remote_address, **auth
-                    )
-                )
-            except Exception as error:
-                raise type(error)("SSH tunnel: {}".format(str(error)))
+                query_runner.host, query_runner.port = server.local_bind_address
+                yield
+            finally:
+                query_runner.host, query_runner.port = remote_host, remote_port
 
-            with stack:
-                try:
-                    query_runner.host, query_runner.port = server.local_bind_address
-                    result = f(*args, **kwargs)
-                finally:
-                    query_runner.host, query_runner.port = remote_host, remote_port
+    def tunnel(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with ssh_tunnel():
+                return f(*args, **kwargs)
+
+        return wrapper
 
-                return result
+    def tunnel_iter(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with ssh_tunnel():
+                yield from f(*args, **kwargs)
 
         return wrapper
 
+    # the tunnel is closed after every query, and its connections with it
+    query_runner.supports_connection_pool = False
     query_runner.run_query = tunnel(query_runner.run_query)
+    if query_runner.supports_iter_query:
+        query_runner.iter_query = tunnel_iter(query_runner.iter_query)
 
     return query_runner
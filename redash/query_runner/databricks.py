@@ -236,8 +236,9 @@ class Databricks(BaseSQLQueryRunner):
 
         return list(schema.values())
 
-    def get_table_columns(self, database_name, table_name):
-        cursor = self._get_cursor()
+    def get_table_columns(self, database_name, table_name, cursor=None):
+        if cursor is None:
+            cursor = self._get_cursor()
         cursor.columns(schema=database_name, table=table_name)
         return [{"name": column[3], "type": column[5]} for column in cursor]
 
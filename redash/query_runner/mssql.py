@@ -25,9 +25,16 @@ types_map = {
     5: TYPE_FLOAT,
 }
 
+SYSTEM_SCHEMAS = """
+    'guest','INFORMATION_SCHEMA','sys','db_owner','db_accessadmin'
+    ,'db_securityadmin','db_ddladmin','db_backupoperator','db_datareader'
+    ,'db_datawriter','db_denydatareader','db_denydatawriter'
+"""
+
 
 class SqlServer(BaseSQLQueryRunner):
     should_annotate_query = False
+    supports_incremental_schema = True
     noop_query = "SELECT 1"
 
     @classmethod
@@ -71,11 +78,10 @@ class SqlServer(BaseSQLQueryRunner):
         query = """
         SELECT table_schema, table_name, column_name
         FROM INFORMATION_SCHEMA.COLUMNS
-        WHERE table_schema NOT IN ('guest','INFORMATION_SCHEMA','sys','db_owner','db_accessadmin'
-                                  ,'db_securityadmin','db_ddladmin','db_backupoperator','db_datareader'
-                                  ,'db_datawriter','db_denydatareader','db_denydatawriter'
-                                  );
-        """
+        WHERE table_schema NOT IN ({});
+        """.format(
+            SYSTEM_SCHEMAS
+        )
 
         results, error = self.run_query(query, None)
 
@@ -85,10 +91,7 @@ class SqlServer(BaseSQLQueryRunner):
         results = json_loads(results)
 
         for row in results["rows"]:
-            if row["table_schema"] != self.configuration["db"]:
-                table_name = "{}.{}".format(row["table_schema"], row["table_name"])
-            else:
-                table_name = row["table_name"]
+            table_name = self._table_name(row)
 
             if table_name not in schema:
                 schema[table_name] = {"name": table_name, "columns": []}
@@ -97,6 +100,53 @@ class SqlServer(BaseSQLQueryRunner):
 
         return list(schema.values())
 
+    def _table_name(self, row):
+        if row["table_schema"] != self.configuration["db"]:
+            return "{}.{}".format(row["table_schema"], row["table_name"])
+
+        return row["table_name"]
+
+    def get_schema_changes(self, since):
+        tables_query = """
+        SELECT s.name AS table_schema, o.name AS table_name
+        FROM sys.objects o
+        JOIN sys.schemas s ON s.schema_id = o.schema_id
+        WHERE o.type IN ('U', 'V') AND o.is_ms_shipped = 0
+          AND s.name NOT IN ({schemas});
+        """.format(
+            schemas=SYSTEM_SCHEMAS
+        )
+        # modify_date is in the server's local time, and changes on every ALTER
+        columns_query = """
+        SELECT s.name AS table_schema, o.name AS table_name, c.name AS column_name
+        FROM sys.columns c
+        JOIN sys.objects o ON o.object_id = c.object_id
+        JOIN sys.schemas s ON s.schema_id = o.schema_id
+        WHERE o.type IN ('U', 'V') AND o.is_ms_shipped = 0
+          AND s.name NOT IN ({schemas})
+          AND o.modify_date > DATEADD(
+              minute, DATEDIFF(minute, GETUTCDATE(), GETDATE()), '{since}'
+          )
+        ORDER BY c.column_id;
+        """.format(
+            schemas=SYSTEM_SCHEMAS, since=since.strftime("%Y-%m-%dT%H:%M:%S")
+        )
+
+        table_names = set(
+            self._table_name(row) for row in self._run_query_internal(tables_query)
+        )
+
+        schema = {}
+        for row in self._run_query_internal(columns_query):
+            table_name = self._table_name(row)
+
+            if table_name not in schema:
+                schema[table_name] = {"name": table_name, "columns": []}
+
+            schema[table_name]["columns"].append(row["column_name"])
+
+        return list(schema.values()), table_names
+
     def run_query(self, query, user, org=None):
         connection = None
 
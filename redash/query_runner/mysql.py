@@ -51,6 +51,7 @@ class Result(object):
 
 class Mysql(BaseSQLQueryRunner):
     noop_query = "SELECT 1"
+    supports_connection_pool = True
 
     @classmethod
     def configuration_schema(cls):
@@ -122,6 +123,26 @@ class Mysql(BaseSQLQueryRunner):
 
         return connection
 
+    def _open_connection(self):
+        return self._connection()
+
+    def _close_connection(self, connection):
+        if connection.open:
+            connection.close()
+
+    def _connection_is_usable(self, connection):
+        return bool(connection.open) and not getattr(connection, "lost", False)
+
+    def _check_connection(self, connection):
+        connection.ping()
+        return True
+
+    def _reset_connection(self, connection):
+        # end the transaction of the query, so the next one doesn't see its snapshot
+        connection.rollback()
+        # and undo a USE statement of the query
+        connection.select_db(self.configuration["db"])
+
     def _get_tables(self, schema):
         query = """
         SELECT col.table_schema as table_schema,
@@ -154,23 +175,22 @@ class Mysql(BaseSQLQueryRunner):
 
     def run_query(self, query, user, org=None):
         ev = threading.Event()
-        thread_id = ""
         r = Result()
-        t = None
 
-        try:
-            connection = self._connection()
+        with self.pooled_connection() as connection:
             thread_id = connection.thread_id()
             t = threading.Thread(
                 target=self._run_query, args=(query, user, org, connection, r, ev)
             )
-            t.start()
-            while not ev.wait(1):
-                pass
-        except (KeyboardInterrupt, InterruptException, JobTimeoutException):
-            self._cancel(thread_id)
-            t.join()
-            raise
+
+            try:
+                t.start()
+                while not ev.wait(1):
+                    pass
+            except (KeyboardInterrupt, InterruptException, JobTimeoutException):
+                self._cancel(thread_id)
+                t.join()
+                raise
 
         return r.json_data, r.error
 
@@ -215,6 +235,9 @@ class Mysql(BaseSQLQueryRunner):
         except MySQLdb.Error as e:
             if cursor:
                 cursor.close()
+            # the connection may be lost, have the pool discard (and close) it
+            if isinstance(e, MySQLdb.OperationalError):
+                connection.lost = True
             r.json_data = None
             r.error = e.args[1]
         except MaxQueryResultRowsExpection as e:
@@ -224,8 +247,6 @@ class Mysql(BaseSQLQueryRunner):
             r.error = str(e)
         finally:
             ev.set()
-            if connection:
-                connection.close()
 
     def _get_ssl_parameters(self):
         if not self.configuration.get("use_ssl"):
@@ -54,6 +54,10 @@ class PostgreSQLJSONEncoder(JSONEncoder):
         return super(PostgreSQLJSONEncoder, self).default(o)
 
 
+# the server side cursor `PostgreSQL.iter_query` fetches rows from
+STREAM_CURSOR_NAME = "redash_stream"
+
+
 def _wait(conn, timeout=None):
     while 1:
         try:
@@ -139,6 +143,9 @@ def _get_ssl_config(configuration):
 
 class PostgreSQL(BaseSQLQueryRunner):
     noop_query = "SELECT 1"
+    supports_iter_query = True
+    supports_connection_pool = True
+    json_encoder = PostgreSQLJSONEncoder
 
     @classmethod
     def configuration_schema(cls):
@@ -250,10 +257,130 @@ class PostgreSQL(BaseSQLQueryRunner):
 
         return connection
 
+    def _open_connection(self):
+        try:
+            connection = self._get_connection()
+            _wait(connection, timeout=10)
+        finally:
+            # the certificates are only read while connecting
+            _cleanup_ssl_certs(self.ssl_config)
+
+        return connection
+
+    def _connection_is_usable(self, connection):
+        # a connection interrupted in the middle of a query isn't idle
+        return (
+            not connection.closed
+            and connection.get_transaction_status()
+            == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        )
+
+    def _execute_on_connection(self, connection, statement):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(statement)
+            _wait(connection, timeout=10)
+        finally:
+            cursor.close()
+
+    def _check_connection(self, connection):
+        self._execute_on_connection(connection, "SELECT 1")
+        return True
+
+    def _reset_connection(self, connection):
+        # undo the settings (like the search path) changed by the query
+        self._execute_on_connection(connection, "RESET ALL")
+
+    def iter_query(self, query, user, org=None):
+        with self.pooled_connection() as connection:
+            yield from self._iter_query(connection, query)
+
+    def _iter_query(self, connection, query):
+        """
+        Fetches the rows of a single statement query in batches of
+        `iter_query_batch_size` from a server side cursor, so only a batch is in
+        memory at once, and the query stops when the consumer stops iterating.
+        Other queries (multiple statements, or statements a cursor can't be
+        declared for) are run as they are, with the whole result fetched at once.
+        """
+        from redash.query_runner.databricks import split_sql_statements
+
+        cursor = connection.cursor()
+        in_transaction = False
+
+        def execute(statement):
+            cursor.execute(statement)
+            _wait(connection)
+
+        try:
+            statements = split_sql_statements(query)
+            if len(statements) == 1:
+                execute("BEGIN")
+                in_transaction = True
+                try:
+                    execute(
+                        "DECLARE {} NO SCROLL CURSOR FOR {}".format(
+                            STREAM_CURSOR_NAME, statements[0]
+                        )
+                    )
+                except psycopg2.ProgrammingError:
+                    execute("ROLLBACK")
+                    in_transaction = False
+
+            if in_transaction:
+                fetch = "FETCH {} FROM {}".format(
+                    self.iter_query_batch_size, STREAM_CURSOR_NAME
+                )
+                execute(fetch)
+            else:
+                execute(query)
+
+            if cursor.description is None:
+                raise Exception("Query completed but it returned no data.")
+
+            yield self.fetch_columns(
+                [(i[0], types_map.get(i[1], None)) for i in cursor.description]
+            )
+
+            while True:
+                if in_transaction:
+                    rows = cursor.fetchall()
+                else:
+                    rows = cursor.fetchmany(self.iter_query_batch_size)
+                if not rows:
+                    break
+                yield rows
+
+                if in_transaction:
+                    if len(rows) < self.iter_query_batch_size:
+                        break
+                    execute(fetch)
+
+            if in_transaction:
+                execute("COMMIT")
+                in_transaction = False
+        except (select.error, OSError):
+            # the connection is discarded by the pool
+            in_transaction = False
+            raise Exception("Query interrupted. Please retry.")
+        except (KeyboardInterrupt, InterruptException, JobTimeoutException):
+            in_transaction = False
+            connection.cancel()
+            raise
+        finally:
+            # the consumer stopped early (like past the row limit), or the query failed
+            if in_transaction and not connection.closed:
+                try:
+                    execute("ROLLBACK")
+                except psycopg2.Error:
+                    pass
+            cursor.close()
+
     def run_query(self, query, user, org=None):
-        connection = self._get_connection()
-        _wait(connection, timeout=10)
+        with self.pooled_connection() as connection:
+            return self._run_query(connection, query, org)
 
+    def _run_query(self, connection, query, org):
         cursor = connection.cursor()
 
         try:
@@ -265,14 +392,15 @@ class PostgreSQL(BaseSQLQueryRunner):
                     [(i[0], types_map.get(i[1], None)) for i in cursor.description]
                 )
 
-                rows =[]
+                column_names = [column["name"] for column in columns]
+                rows = []
                 query_results_count = 0
                 max_query_result_rows = org.max_query_result_rows if org else sys.maxsize
                 for row in cursor:
                     if query_results_count >= max_query_result_rows:
                         raise MaxQueryResultRowsExpection(max_query_result_rows)
                     else:
-                        rows.append(dict(zip((column["name"] for column in columns), row)))
+                        rows.append(dict(zip(column_names, row)))
                         query_results_count += 1
 
                 data = {"columns": columns, "rows": rows}
@@ -294,8 +422,7 @@ class PostgreSQL(BaseSQLQueryRunner):
             error = str(e)
             json_data = None
         finally:
-            connection.close()
-            _cleanup_ssl_certs(self.ssl_config)
+            cursor.close()
 
         return json_data, error
 
@@ -489,6 +616,7 @@ class RedshiftIAM(Redshift):
         }
 
     def _get_connection(self):
+        self.ssl_config = {}
 
         sslrootcert_path = os.path.join(
             os.path.dirname(__file__), "./files/redshift-ca-bundle.crt"
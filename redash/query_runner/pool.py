@@ -0,0 +1,290 @@
+import hashlib
+import logging
+import threading
+import time
+
+from redash import settings
+from redash.utils import json_dumps
+
+logger = logging.getLogger(__name__)
+
+# the stats of the pools of every warm worker, reported in /status.json
+CONNECTION_POOLS_STATUS_KEY = "redash:status:connection_pools"
+
+
+def configuration_hash(query_runner):
+    configuration = query_runner.configuration
+    if hasattr(configuration, "to_dict"):
+        configuration = configuration.to_dict()
+
+    serialized = json_dumps(configuration, sort_keys=True)
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection(object):
+    __slots__ = ("connection", "opened_at", "released_at")
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.opened_at = self.released_at = time.monotonic()
+
+
+class ConnectionPool(object):
+    """
+    The connections of a data source, kept open between queries.
+
+    A pool holds at most `max_size` connections; callers wait up to `timeout`
+    seconds for one when all of them are in use. Connections idle for longer than
+    `max_idle_time` or open for longer than `max_lifetime` are closed, and
+    connections idle for longer than `check_after` are checked before they're
+    reused.
+    """
+
+    def __init__(
+        self,
+        connect,
+        close,
+        check,
+        max_size=None,
+        max_idle_time=None,
+        max_lifetime=None,
+        check_after=None,
+        timeout=None,
+    ):
+        self._connect = connect
+        self._close = close
+        self._check = check
+        self.max_size = max_size or settings.QUERY_RUNNER_POOL_MAX_SIZE
+        self.max_idle_time = max_idle_time or settings.QUERY_RUNNER_POOL_MAX_IDLE_TIME
+        self.max_lifetime = max_lifetime or settings.QUERY_RUNNER_POOL_MAX_LIFETIME
+        if check_after is None:
+            check_after = settings.QUERY_RUNNER_POOL_CHECK_AFTER
+        self.check_after = check_after
+        if timeout is None:
+            timeout = settings.QUERY_RUNNER_POOL_TIMEOUT
+        self.timeout = timeout
+
+        self._idle = []
+        self._in_use = {}
+        # connections in use, idle and being opened
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._counters = dict.fromkeys(
+            ("opened", "reused", "closed", "evicted", "failed_checks"), 0
+        )
+
+    def _expired(self, pooled, now):
+        return (
+            now - pooled.released_at > self.max_idle_time
+            or now - pooled.opened_at > self.max_lifetime
+        )
+
+    def _pop_expired(self, now):
+        expired = [pooled for pooled in self._idle if self._expired(pooled, now)]
+        if expired:
+            self._idle = [pooled for pooled in self._idle if pooled not in expired]
+            self._size -= len(expired)
+            self._counters["evicted"] += len(expired)
+            self._condition.notify(len(expired))
+
+        return expired
+
+    def _checkout(self):
+        deadline = time.monotonic() + self.timeout
+
+        with self._condition:
+            expired = self._pop_expired(time.monotonic())
+
+            while not self._idle and self._size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        "All {} connections of the pool are in use.".format(
+                            self.max_size
+                        )
+                    )
+                self._condition.wait(remaining)
+
+            if self._idle:
+                pooled = self._idle.pop()
+            else:
+                pooled = None
+                self._size += 1
+
+        return pooled, expired
+
+    def _healthy(self, pooled):
+        if time.monotonic() - pooled.released_at <= self.check_after:
+            return True
+
+        try:
+            return self._check(pooled.connection)
+        except Exception:
+            logger.info("Pooled connection failed its check.", exc_info=True)
+            return False
+
+    def acquire(self):
+        while True:
+            pooled, expired = self._checkout()
+            for expired_connection in expired:
+                self._close_connection(expired_connection.connection)
+
+            if pooled is None:
+                try:
+                    pooled = PooledConnection(self._connect())
+                except BaseException:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+
+                counter = "opened"
+            elif self._healthy(pooled):
+                counter = "reused"
+            else:
+                self._remove(pooled, counter="failed_checks")
+                continue
+
+            with self._condition:
+                self._counters[counter] += 1
+                self._in_use[id(pooled.connection)] = pooled
+
+            return pooled.connection
+
+    def release(self, connection):
+        with self._condition:
+            pooled = self._in_use.pop(id(connection))
+            now = time.monotonic()
+
+            if not self._closed and not self._expired(pooled, now):
+                pooled.released_at = now
+                self._idle.append(pooled)
+                self._condition.notify()
+                return
+
+        self._remove(pooled, counter="evicted")
+
+    def discard(self, connection):
+        with self._condition:
+            pooled = self._in_use.pop(id(connection))
+
+        self._remove(pooled)
+
+    def _remove(self, pooled, counter=None):
+        with self._condition:
+            self._size -= 1
+            if counter:
+                self._counters[counter] += 1
+            self._condition.notify()
+
+        self._close_connection(pooled.connection)
+
+    def _close_connection(self, connection):
+        with self._condition:
+            self._counters["closed"] += 1
+
+        try:
+            self._close(connection)
+        except Exception:
+            logger.warning("Failed closing a pooled connection.", exc_info=True)
+
+    def evict(self):
+        with self._condition:
+            expired = self._pop_expired(time.monotonic())
+
+        for pooled in expired:
+            self._close_connection(pooled.connection)
+
+    def close(self):
+        """Closes the idle connections, and those in use once they're released."""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+
+        for pooled in idle:
+            self._close_connection(pooled.connection)
+
+    def stats(self):
+        with self._condition:
+            return dict(
+                self._counters,
+                max_size=self.max_size,
+                size=self._size,
+                idle=len(self._idle),
+                in_use=len(self._in_use),
+            )
+
+
+class ConnectionPools(object):
+    """
+    The connection pools of the current process, one for every data source (or, for
+    query runners created without one, for every query runner type and
+    configuration). A data source whose configuration changed gets a new pool and
+    its previous pool is closed.
+
+    Pools are only used once enabled, by processes that run many queries (warm
+    workers). Other processes, like forked work horses, connect for every query.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def get(self, query_runner):
+        config_hash = configuration_hash(query_runner)
+        if query_runner.data_source_id is not None:
+            key = "data_source:{}".format(query_runner.data_source_id)
+        else:
+            key = "{}:{}".format(query_runner.type(), config_hash)
+
+        with self._lock:
+            current_hash, pool = self._pools.get(key, (None, None))
+            if current_hash == config_hash:
+                return pool
+
+            previous_pool = pool
+            pool = ConnectionPool(
+                query_runner._open_connection,
+                query_runner._close_connection,
+                query_runner._check_connection,
+            )
+            self._pools[key] = (config_hash, pool)
+
+        if previous_pool is not None:
+            logger.info("Configuration of %s changed, closing its connections.", key)
+            previous_pool.close()
+
+        return pool
+
+    def evict(self):
+        with self._lock:
+            pools = [pool for _, pool in self._pools.values()]
+
+        for pool in pools:
+            pool.evict()
+
+    def close(self):
+        with self._lock:
+            pools, self._pools = self._pools, {}
+
+        for _, pool in pools.values():
+            pool.close()
+
+    def stats(self):
+        with self._lock:
+            pools = list(self._pools.items())
+
+        return {key: pool.stats() for key, (_, pool) in pools}
+
+
+connection_pools = ConnectionPools()
@@ -49,13 +49,10 @@ def _load_query(user, query_id):
 
 
 def get_query_results(user, query_id, bring_from_cache):
-    query = _load_query(user, query_id)
     if bring_from_cache:
-        if query.latest_query_data_id is not None:
-            results = query.latest_query_data.data
-        else:
-            raise Exception("No cached result available for query {}.".format(query.id))
+        results = get_cached_query_result(user, query_id).data
     else:
+        query = _load_query(user, query_id)
         results, error = query.data_source.query_runner.run_query(
             query.query_text, user
         )
@@ -67,11 +64,22 @@ def get_query_results(user, query_id, bring_from_cache):
     return results
 
 
+def get_cached_query_result(user, query_id):
+    query = _load_query(user, query_id)
+    if query.latest_query_data_id is None:
+        raise Exception("No cached result available for query {}.".format(query.id))
+
+    return query.latest_query_data
+
+
 def create_tables_from_query_ids(user, connection, query_ids, cached_query_ids=[]):
     for query_id in set(cached_query_ids):
-        results = get_query_results(user, query_id, True)
+        query_result = get_cached_query_result(user, query_id)
         table_name = "cached_query_{query_id}".format(query_id=query_id)
-        create_table(connection, table_name, results)
+        # Stream the rows from storage instead of materializing the whole result.
+        create_table_from_rows(
+            connection, table_name, query_result.columns, query_result.iter_rows()
+        )
 
     for query_id in set(query_ids):
         results = get_query_results(user, query_id, False)
@@ -91,8 +99,14 @@ def flatten(value):
 
 
 def create_table(connection, table_name, query_results):
+    create_table_from_rows(
+        connection, table_name, query_results["columns"], query_results["rows"]
+    )
+
+
+def create_table_from_rows(connection, table_name, result_columns, rows):
     try:
-        columns = [column["name"] for column in query_results["columns"]]
+        columns = [column["name"] for column in result_columns]
         safe_columns = [fix_column_name(column) for column in columns]
 
         column_list = ", ".join(safe_columns)
@@ -112,9 +126,10 @@ def create_table(connection, table_name, query_results):
         place_holders=",".join(["?"] * len(columns)),
     )
 
-    for row in query_results["rows"]:
-        values = [flatten(row.get(column)) for column in columns]
-        connection.execute(insert_template, values)
+    connection.executemany(
+        insert_template,
+        ([flatten(row.get(column)) for column in columns] for row in rows),
+    )
 
 
 class Results(BaseQueryRunner):
@@ -3,22 +3,30 @@ This will eventually replace all the `to_dict` methods of the different model
 classes we have. This will ensure cleaner code and better
 separation of concerns.
 """
+import hashlib
+
 from funcy import project
 
 from flask_login import current_user
 from rq.job import JobStatus
 from rq.timeouts import JobTimeoutException
+from sqlalchemy.orm import contains_eager, selectinload
 
 from redash import models
 from redash.permissions import has_access, view_only
-from redash.utils import json_loads
+from redash.utils import json_dumps, json_loads
 from redash.models.parameterized_query import ParameterizedQuery
 
+from .dashboard_cache import dashboard_cache
 
 from .query_result import (
     serialize_query_result,
+    serialize_query_result_to_json,
+    serialize_widget_results_to_json,
     serialize_query_result_to_dsv,
     serialize_query_result_to_xlsx,
+    iter_query_result_dsv,
+    iter_query_result_xlsx,
 )
 
 
@@ -62,12 +70,31 @@ def public_dashboard(dashboard):
         models.Widget.query.filter(models.Widget.dashboard_id == dashboard.id)
         .outerjoin(models.Visualization)
         .outerjoin(models.Query)
+        .options(
+            contains_eager(models.Widget.visualization).contains_eager(
+                models.Visualization.query_rel
+            )
+        )
     )
 
     dashboard_dict["widgets"] = [public_widget(w) for w in widget_list]
     return dashboard_dict
 
 
+def public_dashboard_payload(dashboard):
+    """
+    Returns the ETag and JSON of `public_dashboard`, which are only built again
+    after the dashboard changed (see PublicDashboardCache).
+    """
+    generation, etag, payload = models.public_dashboard_cache.get(dashboard.id)
+    if payload is None:
+        payload = json_dumps(public_dashboard(dashboard))
+        etag = hashlib.md5(payload.encode("utf-8")).hexdigest()
+        models.public_dashboard_cache.set(dashboard.id, generation, etag, payload)
+
+    return etag, payload
+
+
 class Serializer(object):
     pass
 
@@ -176,7 +203,7 @@ def serialize_visualization(object, with_query=True):
     return d
 
 
-def serialize_widget(object):
+def serialize_widget(object, with_query_users=True):
     d = {
         "id": object.id,
         "width": object.width,
@@ -188,7 +215,14 @@ def serialize_widget(object):
     }
 
     if object.visualization and object.visualization.id:
-        d["visualization"] = serialize_visualization(object.visualization)
+        d["visualization"] = serialize_visualization(
+            object.visualization, with_query=False
+        )
+        d["visualization"]["query"] = serialize_query(
+            object.visualization.query_rel,
+            with_user=with_query_users,
+            with_last_modified_by=with_query_users,
+        )
 
     return d
 
@@ -232,31 +266,73 @@ class ApplicationSerializer(Serializer):
 
         return result
 
+def serialize_dashboard_widgets(dashboard, user=None):
+    """
+    Serializes the widgets of a dashboard, restricting the ones whose query the
+    user can't view. The widgets are serialized from the dashboard cache when
+    possible, otherwise they're loaded with their visualizations and queries in
+    a fixed number of statements. The queries' users and permissions are always
+    loaded (in bulk), as they change without changing the dashboard.
+    """
+    fingerprint = dashboard_cache.fingerprint(dashboard)
+    widgets = dashboard_cache.get(dashboard, fingerprint)
+    if widgets is None:
+        widget_list = models.Widget.query.filter(
+            models.Widget.dashboard_id == dashboard.id
+        ).options(
+            selectinload(models.Widget.visualization).selectinload(
+                models.Visualization.query_rel
+            )
+        )
+        widgets = [serialize_widget(w, with_query_users=False) for w in widget_list]
+        dashboard_cache.set(dashboard, fingerprint, widgets)
+
+    queries = [w["visualization"]["query"] for w in widgets if "visualization" in w]
+
+    users = {}
+    user_ids = set(q["user_id"] for q in queries)
+    user_ids.update(q["last_modified_by_id"] for q in queries)
+    user_ids.discard(None)
+    if user_ids:
+        users = {
+            u.id: u.to_dict()
+            for u in models.User.query.filter(models.User.id.in_(user_ids))
+        }
+
+    allowed = {}
+    if user and queries:
+        query_list = models.Query.query.filter(
+            models.Query.id.in_(set(q["id"] for q in queries))
+        ).options(
+            selectinload(models.Query.data_source).selectinload(
+                models.DataSource.data_source_groups
+            )
+        )
+        allowed = {q.id: has_access(q, user, view_only) for q in query_list}
+
+    for query in queries:
+        query["user"] = users.get(query.pop("user_id"))
+        query["last_modified_by"] = users.get(query.pop("last_modified_by_id"))
+
+    return [
+        w
+        if "visualization" not in w or allowed.get(w["visualization"]["query"]["id"])
+        else dict(
+            project(
+                w,
+                ("id", "width", "dashboard_id", "options", "created_at", "updated_at"),
+            ),
+            restricted=True,
+        )
+        for w in widgets
+    ]
+
+
 def serialize_dashboard(obj, with_widgets=False, user=None, with_favorite_state=True):
     layout = json_loads(obj.layout)
 
-    widgets = []
-
     if with_widgets:
-        for w in obj.widgets:
-            if w.visualization_id is None:
-                widgets.append(serialize_widget(w))
-            elif user and has_access(w.visualization.query_rel, user, view_only):
-                widgets.append(serialize_widget(w))
-            else:
-                widget = project(
-                    serialize_widget(w),
-                    (
-                        "id",
-                        "width",
-                        "dashboard_id",
-                        "options",
-                        "created_at",
-                        "updated_at",
-                    ),
-                )
-                widget["restricted"] = True
-                widgets.append(widget)
+        widgets = serialize_dashboard_widgets(obj, user)
     else:
         widgets = None
 
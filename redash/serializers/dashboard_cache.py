@@ -0,0 +1,71 @@
+from sqlalchemy import text
+
+from redash import models, redis_connection, settings, statsd_client
+from redash.utils import json_dumps, json_loads
+
+# Everything the serialized widgets of a dashboard depend on, besides the users
+# and permissions of their queries (which aren't cached).
+FINGERPRINT_QUERY = text(
+    """
+    SELECT md5(string_agg(concat_ws(',',
+        w.id, w.updated_at, v.updated_at, q.updated_at, q.version,
+        q.latest_query_data_id, q.data_source_id
+    ), ';' ORDER BY w.id))
+    FROM widgets w
+    LEFT JOIN visualizations v ON v.id = w.visualization_id
+    LEFT JOIN queries q ON q.id = v.query_id
+    WHERE w.dashboard_id = :dashboard_id
+    """
+)
+
+
+class DashboardCache(object):
+    """
+    Caches the serialized widgets of dashboards in Redis.
+
+    Entries are keyed by the dashboard's version and a fingerprint of its widgets,
+    their visualizations and queries (see FINGERPRINT_QUERY), so a dashboard that
+    changed is served from a new entry, and the old one expires after
+    DASHBOARDS_CACHE_TTL seconds.
+    """
+
+    KEY_PREFIX = "dashboard_cache:"
+
+    @property
+    def enabled(self):
+        return settings.DASHBOARDS_CACHE_ENABLED
+
+    def fingerprint(self, dashboard):
+        return models.db.session.execute(
+            FINGERPRINT_QUERY, {"dashboard_id": dashboard.id}
+        ).scalar()
+
+    def _key(self, dashboard, fingerprint):
+        return "{}{}:{}:{}".format(
+            self.KEY_PREFIX, dashboard.id, dashboard.version, fingerprint or "empty"
+        )
+
+    def get(self, dashboard, fingerprint):
+        if not self.enabled:
+            return None
+
+        widgets = redis_connection.get(self._key(dashboard, fingerprint))
+        if widgets is None:
+            statsd_client.incr("dashboard_cache.miss")
+            return None
+
+        statsd_client.incr("dashboard_cache.hit")
+        return json_loads(widgets)
+
+    def set(self, dashboard, fingerprint, widgets):
+        if not self.enabled:
+            return
+
+        redis_connection.set(
+            self._key(dashboard, fingerprint),
+            json_dumps(widgets),
+            ex=settings.DASHBOARDS_CACHE_TTL,
+        )
+
+
+dashboard_cache = DashboardCache()
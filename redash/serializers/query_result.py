@@ -1,10 +1,12 @@
 import io
 import csv
+import datetime
 import json
+import tempfile
 import xlsxwriter
-from funcy import rpartial, project
+from funcy import chunks, project
 from dateutil.parser import isoparse as parse_date
-from redash.utils import json_loads, UnicodeWriter
+from redash.utils import json_dumps, json_loads, UnicodeWriter
 from redash.query_runner import TYPE_BOOLEAN, TYPE_DATE, TYPE_DATETIME, TYPE_JSON
 from redash.authentication.org_resolving import current_org
 
@@ -43,6 +45,57 @@ def _convert_datetime(value, fmt):
     return ret
 
 
+def _convert_datetime_fast(value, fmt):
+    # `datetime.fromisoformat` is much faster than `isoparse` and accepts the
+    # common ISO 8601 shapes; everything else goes through `_convert_datetime`.
+    if not value:
+        return value
+
+    try:
+        parsed = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return _convert_datetime(value, fmt)
+
+    try:
+        return parsed.strftime(fmt)
+    except Exception:
+        return value
+
+
+# Maximum number of distinct values remembered per date/datetime format.
+DATETIME_CACHE_SIZE = 10000
+
+
+def _datetime_column_converter(fmt):
+    """
+    Returns a function converting a list of date/datetime values, with the
+    same output as `_convert_datetime` but memoizing repeated strings.
+    """
+    cache = {}
+
+    def convert(values):
+        converted = []
+        for value in values:
+            if type(value) is not str:
+                converted.append(_convert_datetime(value, fmt))
+                continue
+
+            result = cache.get(value)
+            if result is None:
+                result = _convert_datetime_fast(value, fmt)
+                if len(cache) < DATETIME_CACHE_SIZE:
+                    cache[value] = result
+            converted.append(result)
+
+        return converted
+
+    return convert
+
+
+def _column_converter(convert):
+    return lambda values: [convert(value) for value in values]
+
+
 def _convert_json_or_jsonb(value):
     if not value:
         return value
@@ -58,19 +111,20 @@ def _convert_json_or_jsonb(value):
 
 
 def _get_column_lists(columns):
-    date_format = _convert_format(current_org.get_setting("date_format"))
-    datetime_format = _convert_format(
-        "{} {}".format(
-            current_org.get_setting("date_format"),
-            current_org.get_setting("time_format"),
-        )
-    )
+    """
+    Returns the column names and, for columns whose values need converting,
+    a function converting a list of that column's values.
+    """
+    date_format = current_org.get_setting("date_format")
+    time_format = current_org.get_setting("time_format")
 
     special_types = {
-        TYPE_BOOLEAN: _convert_bool,
-        TYPE_DATE: rpartial(_convert_datetime, date_format),
-        TYPE_DATETIME: rpartial(_convert_datetime, datetime_format),
-        TYPE_JSON: rpartial(_convert_json_or_jsonb),
+        TYPE_BOOLEAN: _column_converter(_convert_bool),
+        TYPE_DATE: _datetime_column_converter(_convert_format(date_format)),
+        TYPE_DATETIME: _datetime_column_converter(
+            _convert_format("{} {}".format(date_format, time_format))
+        ),
+        TYPE_JSON: _column_converter(_convert_json_or_jsonb),
     }
 
     fieldnames = []
@@ -89,53 +143,131 @@ def _get_column_lists(columns):
     return fieldnames, special_columns
 
 
-def serialize_query_result(query_result, is_api_user):
+def serialize_query_result(query_result, is_api_user, as_arrays=False):
     if is_api_user:
         publicly_needed_keys = ["data", "retrieved_at", "id"]
-        return project(query_result.to_dict(), publicly_needed_keys)
+        return project(query_result.to_dict(as_arrays=as_arrays), publicly_needed_keys)
     else:
-        return query_result.to_dict()
+        return query_result.to_dict(as_arrays=as_arrays)
+
+
+def serialize_query_result_to_json(query_result, is_api_user, as_arrays=False):
+    """
+    Renders `{"query_result": ...}` as JSON text. When the stored data can be
+    served as is, it's spliced into the rendered envelope instead of going
+    through `json_loads` and `json_dumps` again.
+    """
+    raw_data = query_result.get_raw_data(as_arrays)
+    if raw_data is None:
+        return json_dumps(
+            {
+                "query_result": serialize_query_result(
+                    query_result, is_api_user, as_arrays
+                )
+            }
+        )
 
+    envelope = {"id": query_result.id, "retrieved_at": query_result.retrieved_at}
+    if not is_api_user:
+        envelope.update(
+            {
+                "query_hash": query_result.query_hash,
+                "query": query_result.query_text,
+                "data_source_id": query_result.data_source_id,
+                "runtime": query_result.runtime,
+            }
+        )
+
+    # `data` goes in as the last key of "query_result", before the closing "}}"
+    rendered = json_dumps({"query_result": envelope})
+    return '{}, "data": {}}}}}'.format(rendered[:-2], raw_data)
+
+
+def serialize_widget_results_to_json(results, is_api_user, as_arrays=False):
+    """
+    Renders `{"widgets": {widget id: ...}}` as JSON text, where each value is
+    the `{"query_result": ...}` of a result (see
+    `serialize_query_result_to_json`) or an already serialized job or error.
+    """
+    parts = []
+    for widget_id, result in results.items():
+        if isinstance(result, dict):
+            rendered = json_dumps(result)
+        else:
+            rendered = serialize_query_result_to_json(result, is_api_user, as_arrays)
+        parts.append('"{}": {}'.format(widget_id, rendered))
+
+    return '{{"widgets": {{{}}}}}'.format(", ".join(parts))
+
+
+# Exports are yielded in pieces of about this many bytes.
+EXPORT_CHUNK_SIZE = 64 * 1024
+# Rows are converted a column at a time, in batches of this many rows.
+EXPORT_BATCH_SIZE = 1000
+
+
+def _get_column_converters(columns):
+    fieldnames, special_columns = _get_column_lists(columns)
+    return fieldnames, [special_columns.get(name) for name in fieldnames]
+
+
+def iter_query_result_dsv(query_result, delimiter):
+    fieldnames, converters = _get_column_converters(query_result.columns)
+    converted_columns = [
+        (index, converter)
+        for index, converter in enumerate(converters)
+        if converter is not None
+    ]
 
-def serialize_query_result_to_dsv(query_result, delimiter):
     s = io.StringIO()
+    writer = csv.writer(s, delimiter=delimiter)
+    writer.writerow(fieldnames)
 
-    query_data = query_result.data
+    for rows in chunks(EXPORT_BATCH_SIZE, query_result.iter_rows(as_arrays=True)):
+        if converted_columns:
+            # Don't modify the rows, they might be shared with the result's cache.
+            rows = [list(row) for row in rows]
+            for index, converter in converted_columns:
+                values = converter([row[index] for row in rows])
+                for row, value in zip(rows, values):
+                    row[index] = value
 
-    fieldnames, special_columns = _get_column_lists(query_data["columns"] or [])
+        writer.writerows(rows)
 
-    writer = csv.DictWriter(s, extrasaction="ignore", fieldnames=fieldnames, delimiter=delimiter)
-    writer.writeheader()
+        if s.tell() >= EXPORT_CHUNK_SIZE:
+            yield s.getvalue()
+            s.seek(0)
+            s.truncate()
 
-    for row in query_data["rows"]:
-        for col_name, converter in special_columns.items():
-            if col_name in row:
-                row[col_name] = converter(row[col_name])
+    yield s.getvalue()
 
-        writer.writerow(row)
 
-    return s.getvalue()
+def serialize_query_result_to_dsv(query_result, delimiter):
+    return "".join(iter_query_result_dsv(query_result, delimiter))
 
 
-def serialize_query_result_to_xlsx(query_result):
-    output = io.BytesIO()
+def iter_query_result_xlsx(query_result):
+    # The workbook is written to a temporary file (and with `constant_memory`
+    # xlsxwriter flushes every row as it goes), then streamed from disk.
+    with tempfile.TemporaryFile() as output:
+        book = xlsxwriter.Workbook(output, {"constant_memory": True})
+        sheet = book.add_worksheet("result")
 
-    query_data = query_result.data
-    book = xlsxwriter.Workbook(output, {"constant_memory": True})
-    sheet = book.add_worksheet("result")
+        for c, col in enumerate(query_result.columns):
+            sheet.write(0, c, col["name"])
 
-    column_names = []
-    for c, col in enumerate(query_data["columns"]):
-        sheet.write(0, c, col["name"])
-        column_names.append(col["name"])
+        for r, row in enumerate(query_result.iter_rows(as_arrays=True)):
+            for c, v in enumerate(row):
+                if isinstance(v, (dict, list)):
+                    v = json.dumps(v, ensure_ascii=False)
+                sheet.write(r + 1, c, v)
 
-    for r, row in enumerate(query_data["rows"]):
-        for c, name in enumerate(column_names):
-            v = row.get(name)
-            if isinstance(v, (dict, list)):
-                v = json.dumps(v, ensure_ascii=False)
-            sheet.write(r + 1, c, v)
+        book.close()
+        output.seek(0)
 
-    book.close()
+        for chunk in iter(lambda: output.read(EXPORT_CHUNK_SIZE), b""):
+            yield chunk
 
-    return output.getvalue()
+
+def serialize_query_result_to_xlsx(query_result):
+    return b"".join(iter_query_result_xlsx(query_result))
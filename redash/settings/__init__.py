@@ -48,14 +48,106 @@ RQ_REDIS_URL = os.environ.get("RQ_REDIS_URL", _REDIS_URL)
 QUERY_RESULTS_CLEANUP_ENABLED = parse_boolean(
     os.environ.get("REDASH_QUERY_RESULTS_CLEANUP_ENABLED", "true")
 )
-QUERY_RESULTS_CLEANUP_COUNT = int(
-    os.environ.get("REDASH_QUERY_RESULTS_CLEANUP_COUNT", "100")
-)
 QUERY_RESULTS_CLEANUP_MAX_AGE = int(
     os.environ.get("REDASH_QUERY_RESULTS_CLEANUP_MAX_AGE", "7")
 )
+# Size of the id ranges cleanup_query_results deletes from in one statement,
+# and for how many seconds a run keeps going before yielding.
+QUERY_RESULTS_CLEANUP_BATCH_SIZE = int(
+    os.environ.get("REDASH_QUERY_RESULTS_CLEANUP_BATCH_SIZE", "10000")
+)
+QUERY_RESULTS_CLEANUP_TIME_BUDGET = int(
+    os.environ.get("REDASH_QUERY_RESULTS_CLEANUP_TIME_BUDGET", "60")
+)
+# Number of rows per chunk when using redash.models.ChunkedPersistence
+QUERY_RESULTS_CHUNK_SIZE = int(
+    os.environ.get("REDASH_QUERY_RESULTS_CHUNK_SIZE", "5000")
+)
+# Redis cache in front of QueryResult.get_latest: maps (data source, query hash)
+# to the latest result id, and keeps the stored data of results up to
+# QUERY_RESULTS_CACHE_MAX_PAYLOAD_SIZE bytes.
+QUERY_RESULTS_CACHE_ENABLED = parse_boolean(
+    os.environ.get("REDASH_QUERY_RESULTS_CACHE_ENABLED", "true")
+)
+QUERY_RESULTS_CACHE_TTL = int(os.environ.get("REDASH_QUERY_RESULTS_CACHE_TTL", "3600"))
+QUERY_RESULTS_CACHE_MAX_ENTRIES = int(
+    os.environ.get("REDASH_QUERY_RESULTS_CACHE_MAX_ENTRIES", "10000")
+)
+QUERY_RESULTS_CACHE_MAX_PAYLOAD_SIZE = int(
+    os.environ.get("REDASH_QUERY_RESULTS_CACHE_MAX_PAYLOAD_SIZE", "65536")
+)
+# Used by redash.models.CompressedPersistence: "zstd" (falls back to gzip when
+# the zstandard package isn't installed) or "gzip".
+QUERY_RESULTS_COMPRESSION = os.environ.get("REDASH_QUERY_RESULTS_COMPRESSION", "zstd")
+QUERY_RESULTS_COMPRESSION_LEVEL = int(
+    os.environ.get("REDASH_QUERY_RESULTS_COMPRESSION_LEVEL", "3")
+)
+# The compress_query_results job compresses results stored before
+# CompressedPersistence was enabled, this many batches of this many results at a time.
+QUERY_RESULTS_COMPRESSION_BATCH_SIZE = int(
+    os.environ.get("REDASH_QUERY_RESULTS_COMPRESSION_BATCH_SIZE", "100")
+)
+QUERY_RESULTS_COMPRESSION_BATCHES = int(
+    os.environ.get("REDASH_QUERY_RESULTS_COMPRESSION_BATCHES", "10")
+)
+
+# Redis cache of the serialized widgets of dashboards, see
+# redash.serializers.dashboard_cache.
+DASHBOARDS_CACHE_ENABLED = parse_boolean(
+    os.environ.get("REDASH_DASHBOARDS_CACHE_ENABLED", "true")
+)
+DASHBOARDS_CACHE_TTL = int(os.environ.get("REDASH_DASHBOARDS_CACHE_TTL", "86400"))
+# Redis cache of the payloads of public and embed dashboards, discarded whenever
+# the dashboard changes, see redash.models.public_dashboard_cache.
+PUBLIC_DASHBOARDS_CACHE_ENABLED = parse_boolean(
+    os.environ.get("REDASH_PUBLIC_DASHBOARDS_CACHE_ENABLED", "true")
+)
+PUBLIC_DASHBOARDS_CACHE_TTL = int(
+    os.environ.get("REDASH_PUBLIC_DASHBOARDS_CACHE_TTL", "86400")
+)
+# Per-process cache of validated embed access tokens and applications, see
+# redash.models.embed_auth_cache.
+EMBED_AUTH_CACHE_ENABLED = parse_boolean(
+    os.environ.get("REDASH_EMBED_AUTH_CACHE_ENABLED", "true")
+)
+EMBED_AUTH_CACHE_TTL = int(os.environ.get("REDASH_EMBED_AUTH_CACHE_TTL", "10"))
+EMBED_AUTH_CACHE_MAX_SIZE = int(
+    os.environ.get("REDASH_EMBED_AUTH_CACHE_MAX_SIZE", "10000")
+)
 
 SCHEMAS_REFRESH_SCHEDULE = int(os.environ.get("REDASH_SCHEMAS_REFRESH_SCHEDULE", 30))
+# Data sources that support it only fetch the tables changed since their previous
+# schema refresh, and the whole schema once this many seconds passed since the
+# last full refresh.
+SCHEMAS_FULL_REFRESH_INTERVAL = int(
+    os.environ.get("REDASH_SCHEMAS_FULL_REFRESH_INTERVAL", "86400")
+)
+# The default and maximum number of tables in a page of the schema API.
+SCHEMA_PAGE_SIZE = int(os.environ.get("REDASH_SCHEMA_PAGE_SIZE", "100"))
+SCHEMA_MAX_PAGE_SIZE = int(os.environ.get("REDASH_SCHEMA_MAX_PAGE_SIZE", "1000"))
+
+# Databricks databases, tables and columns are served from the cache as they are for
+# this many seconds, and then served while a job refreshes them until they expire.
+DATABRICKS_METADATA_FRESH_TIME = int(
+    os.environ.get("REDASH_DATABRICKS_METADATA_FRESH_TIME", "600")
+)
+DATABRICKS_METADATA_EXPIRATION_TIME = int(
+    os.environ.get("REDASH_DATABRICKS_METADATA_EXPIRATION_TIME", "86400")
+)
+# How many tables' columns are fetched at once when refreshing a database.
+DATABRICKS_METADATA_FETCH_THREADS = int(
+    os.environ.get("REDASH_DATABRICKS_METADATA_FETCH_THREADS", "8")
+)
+# How many of the most recently used databases are refreshed before they go stale.
+# 0 disables prefetching.
+DATABRICKS_METADATA_PREFETCH_DATABASES = int(
+    os.environ.get("REDASH_DATABRICKS_METADATA_PREFETCH_DATABASES", "20")
+)
+
+# Splits refresh_queries into one periodic job per shard, each refreshing its own
+# part of the scheduled queries. Shards run concurrently when there are enough
+# workers listening on the periodic queue.
+REFRESH_QUERIES_SHARDS = int(os.environ.get("REDASH_REFRESH_QUERIES_SHARDS", "1"))
 
 AUTH_TYPE = os.environ.get("REDASH_AUTH_TYPE", "api_key")
 INVITATION_TOKEN_MAX_AGE = int(
@@ -250,6 +342,31 @@ SCHEDULED_QUERY_TIME_LIMIT = int(
 ADHOC_QUERY_TIME_LIMIT = int(os.environ.get("REDASH_ADHOC_QUERY_TIME_LIMIT", -1))
 
 JOB_EXPIRY_TIME = int(os.environ.get("REDASH_JOB_EXPIRY_TIME", 3600 * 12))
+# How many queries may run at once on a data source (unless the data source sets its
+# own max_concurrency) and for an organization. 0 means no limit. Queries over the
+# limit are put back at the end of their queue.
+QUERY_EXECUTION_MAX_CONCURRENCY = int(
+    os.environ.get("REDASH_QUERY_EXECUTION_MAX_CONCURRENCY", "0")
+)
+QUERY_EXECUTION_ORG_MAX_CONCURRENCY = int(
+    os.environ.get("REDASH_QUERY_EXECUTION_ORG_MAX_CONCURRENCY", "0")
+)
+# Query jobs are queued in lanes: interactive (users running queries), embed (embeds
+# and other API key requests) and scheduled (refreshes). Workers take their next job
+# from a lane picked at random by these weights, so interactive queries jump ahead of
+# scheduled refreshes without starving them. A lane with a weight of 0 is only served
+# when the others are empty.
+QUEUE_LANE_WEIGHTS = {
+    lane: int(weight)
+    for lane, weight in (
+        lane_weight.split(":")
+        for lane_weight in array_from_string(
+            os.environ.get(
+                "REDASH_QUEUE_LANE_WEIGHTS", "interactive:10,embed:5,scheduled:1"
+            )
+        )
+    )
+}
 JOB_DEFAULT_FAILURE_TTL = int(
     os.environ.get("REDASH_JOB_DEFAULT_FAILURE_TTL", 7 * 24 * 60 * 60)
 )
@@ -270,6 +387,33 @@ RQ_WORKER_JOB_LOG_FORMAT = os.environ.get(
     ),
 )
 
+# Warm workers run jobs in the worker process instead of forking a work horse for every
+# job, and keep the connections of query runners supporting connection pools open
+# between queries. Worth it when workers run many short queries.
+RQ_WARM_WORKERS = parse_boolean(os.environ.get("REDASH_RQ_WARM_WORKERS", "false"))
+# Warm workers exit (to be restarted by their supervisor) after running this many jobs.
+# 0 means never.
+RQ_WARM_WORKER_MAX_JOBS = int(
+    os.environ.get("REDASH_RQ_WARM_WORKER_MAX_JOBS", "1000")
+)
+# Limits of the connection pools warm workers keep for every data source: how many
+# connections a pool holds, how long (in seconds) a connection may stay idle or open,
+# how long a connection may stay idle before it's checked with a query before reuse,
+# and how long to wait for a connection when all of them are in use.
+QUERY_RUNNER_POOL_MAX_SIZE = int(
+    os.environ.get("REDASH_QUERY_RUNNER_POOL_MAX_SIZE", "4")
+)
+QUERY_RUNNER_POOL_MAX_IDLE_TIME = int(
+    os.environ.get("REDASH_QUERY_RUNNER_POOL_MAX_IDLE_TIME", "300")
+)
+QUERY_RUNNER_POOL_MAX_LIFETIME = int(
+    os.environ.get("REDASH_QUERY_RUNNER_POOL_MAX_LIFETIME", "3600")
+)
+QUERY_RUNNER_POOL_CHECK_AFTER = int(
+    os.environ.get("REDASH_QUERY_RUNNER_POOL_CHECK_AFTER", "30")
+)
+QUERY_RUNNER_POOL_TIMEOUT = int(os.environ.get("REDASH_QUERY_RUNNER_POOL_TIMEOUT", "30"))
+
 # Mail settings:
 MAIL_SERVER = os.environ.get("REDASH_MAIL_SERVER", "localhost")
 MAIL_PORT = int(os.environ.get("REDASH_MAIL_PORT", 25))
@@ -421,6 +565,32 @@ EVENT_REPORTING_WEBHOOKS = array_from_string(
     os.environ.get("REDASH_EVENT_REPORTING_WEBHOOKS", "")
 )
 
+# Events are buffered in Redis and stored by the periodic flush_events job, in
+# batches of EVENTS_FLUSH_BATCH_SIZE events (each with a single INSERT), which are
+# also posted together to the EVENT_REPORTING_WEBHOOKS. A run stops taking new
+# batches after EVENTS_FLUSH_TIME_BUDGET seconds.
+EVENTS_FLUSH_INTERVAL = int(os.environ.get("REDASH_EVENTS_FLUSH_INTERVAL", "10"))
+EVENTS_FLUSH_BATCH_SIZE = int(os.environ.get("REDASH_EVENTS_FLUSH_BATCH_SIZE", "500"))
+EVENTS_FLUSH_TIME_BUDGET = int(os.environ.get("REDASH_EVENTS_FLUSH_TIME_BUDGET", "60"))
+# Failed webhook deliveries are retried this many times, first after
+# EVENT_REPORTING_WEBHOOKS_RETRY_DELAY seconds and then twice as late every time.
+EVENT_REPORTING_WEBHOOKS_MAX_RETRIES = int(
+    os.environ.get("REDASH_EVENT_REPORTING_WEBHOOKS_MAX_RETRIES", "5")
+)
+EVENT_REPORTING_WEBHOOKS_RETRY_DELAY = int(
+    os.environ.get("REDASH_EVENT_REPORTING_WEBHOOKS_RETRY_DELAY", "30")
+)
+EVENT_REPORTING_WEBHOOKS_TIMEOUT = int(
+    os.environ.get("REDASH_EVENT_REPORTING_WEBHOOKS_TIMEOUT", "10")
+)
+
+# `events` is partitioned by month: manage_event_partitions creates the partitions
+# of the next EVENTS_PARTITIONS_AHEAD months, and drops the partitions of events
+# older than EVENTS_RETENTION_DAYS (0 keeps all events). The daily event counts
+# are kept regardless.
+EVENTS_PARTITIONS_AHEAD = int(os.environ.get("REDASH_EVENTS_PARTITIONS_AHEAD", "2"))
+EVENTS_RETENTION_DAYS = int(os.environ.get("REDASH_EVENTS_RETENTION_DAYS", "0"))
+
 # Support for Sentry (https://getsentry.com/). Just set your Sentry DSN to enable it:
 SENTRY_DSN = os.environ.get("REDASH_SENTRY_DSN", "")
 SENTRY_ENVIRONMENT = os.environ.get("REDASH_SENTRY_ENVIRONMENT")
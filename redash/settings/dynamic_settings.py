@@ -26,6 +26,9 @@ def periodic_jobs():
 
 # This provides the ability to override the way we store QueryResult's data column.
 # Reference implementation: redash.models.DBPersistence
+# Use "redash.models.ChunkedPersistence" to store results as compressed, columnar
+# chunks, or "redash.models.CompressedPersistence" to store the result JSON
+# compressed. A dotted path string is accepted to avoid importing redash.models here.
 QueryResultPersistence = None
 
 
@@ -11,12 +11,15 @@ from .queries import (
     refresh_queries,
     refresh_schemas,
     cleanup_query_results,
+    compress_query_results,
     empty_schedules,
     remove_ghost_locks,
 )
 from .alerts import check_alerts_for_query
+from .databricks import prefetch_databricks_metadata
+from .events import buffer_event, flush_events, manage_event_partitions
 from .failure_report import send_aggregated_errors
-from .worker import Worker, Queue, Job
+from .worker import Worker, WarmWorker, Queue, Job
 from .schedule import rq_scheduler, schedule_periodic_jobs, periodic_job_definitions
 
 from redash import rq_redis_connection
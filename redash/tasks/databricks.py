@@ -1,38 +1,388 @@
-from rq.registry import FailedJobRegistry
-from redash import models, redis_connection
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from rq.exceptions import NoSuchJobError
+from rq.job import JobStatus
+
+from redash import models, redis_connection, settings
 from redash.worker import job
-from redash.tasks.worker import Queue
-from redash.utils import json_dumps
+from redash.tasks.worker import Job, Queue
+from redash.utils import json_dumps, json_loads
+
+logger = logging.getLogger(__name__)
+
+# refresh jobs are only enqueued again once the previous one is done, or expired
+REFRESH_JOB_TIMEOUT = 300
+# prefetching refreshes entries older than this share of
+# DATABRICKS_METADATA_FRESH_TIME, so they're refreshed before they go stale
+PREFETCH_FRESH_RATIO = 0.8
+# fetched columns are cached in batches of this many tables
+STORE_COLUMNS_BATCH_SIZE = 50
+
+
+def _table_short_name(table_name):
+    # tables are named `database.table`
+    return table_name.split(".", 1)[-1]
+
+
+class DatabricksMetadataCache(object):
+    """
+    Caches the databases, tables and columns of Databricks data sources.
+
+    Entries are served as they are for DATABRICKS_METADATA_FRESH_TIME seconds.
+    After that they're still served, while a job refreshes them, until they
+    expire after DATABRICKS_METADATA_EXPIRATION_TIME seconds. Columns are cached
+    per table, in a hash for every database.
+    """
+
+    KEY_PREFIX = "databricks:metadata:"
+    RECENT_DATABASES_KEY = "databricks:metadata:recent_databases"
+
+    def _key(self, data_source_id, *parts):
+        return "{}{}:{}".format(self.KEY_PREFIX, data_source_id, ":".join(parts))
+
+    def databases_key(self, data_source_id):
+        return self._key(data_source_id, "databases")
+
+    def tables_key(self, data_source_id, database_name):
+        return self._key(data_source_id, "tables", database_name)
+
+    def columns_key(self, data_source_id, database_name):
+        return self._key(data_source_id, "columns", database_name)
+
+    def refresh_key(self, data_source_id, *parts):
+        return self._key(data_source_id, "refresh", *parts)
+
+    def _entry(self, value):
+        return json_dumps({"value": value, "refreshed_at": time.time()})
+
+    def _read(self, entry, fresh_time=None):
+        """
+        Returns an entry's value (None once it expired) and whether it's fresh: at
+        most `fresh_time` (DATABRICKS_METADATA_FRESH_TIME by default) seconds old.
+        """
+        if entry is None:
+            return None, False
+
+        if fresh_time is None:
+            fresh_time = settings.DATABRICKS_METADATA_FRESH_TIME
+
+        entry = json_loads(entry)
+        age = time.time() - entry["refreshed_at"]
+        if age > settings.DATABRICKS_METADATA_EXPIRATION_TIME:
+            return None, False
+
+        return entry["value"], age <= fresh_time
+
+    def get_databases(self, data_source_id):
+        return self._read(redis_connection.get(self.databases_key(data_source_id)))
+
+    def set_databases(self, data_source_id, databases):
+        redis_connection.set(
+            self.databases_key(data_source_id),
+            self._entry(databases),
+            ex=settings.DATABRICKS_METADATA_EXPIRATION_TIME,
+        )
+
+    def get_tables(self, data_source_id, database_name, fresh_time=None):
+        """
+        Returns the tables of a database with their cached columns, whether the
+        columns of all tables are cached and whether all of it is fresh.
+        """
+        pipe = redis_connection.pipeline()
+        pipe.get(self.tables_key(data_source_id, database_name))
+        pipe.hgetall(self.columns_key(data_source_id, database_name))
+        tables_entry, columns_entries = pipe.execute()
+
+        table_names, fresh = self._read(tables_entry, fresh_time)
+        if table_names is None:
+            return None, False, False
+
+        schema = []
+        has_columns = True
+        for table_name in table_names:
+            columns, columns_fresh = self._read(
+                columns_entries.get(_table_short_name(table_name)), fresh_time
+            )
+            if columns is None:
+                has_columns = False
+                columns = []
+
+            fresh = fresh and columns_fresh
+            schema.append({"name": table_name, "columns": columns})
+
+        return schema, has_columns, fresh
+
+    def has_tables(self, data_source_id, database_name):
+        key = self.tables_key(data_source_id, database_name)
+        return bool(redis_connection.exists(key))
+
+    def set_tables(self, data_source_id, database_name, table_names):
+        columns_key = self.columns_key(data_source_id, database_name)
+        short_names = set(_table_short_name(table_name) for table_name in table_names)
+        dropped = [
+            table_name
+            for table_name in redis_connection.hkeys(columns_key)
+            if table_name not in short_names
+        ]
+
+        pipe = redis_connection.pipeline()
+        pipe.set(
+            self.tables_key(data_source_id, database_name),
+            self._entry(table_names),
+            ex=settings.DATABRICKS_METADATA_EXPIRATION_TIME,
+        )
+        if dropped:
+            pipe.hdel(columns_key, *dropped)
+        pipe.execute()
 
+    def stale_tables(self, data_source_id, database_name, table_names, fresh_time=None):
+        """Returns the tables whose columns aren't cached or aren't fresh."""
+        if not table_names:
+            return []
 
-DATABRICKS_REDIS_EXPIRATION_TIME = 3600
+        entries = redis_connection.hmget(
+            self.columns_key(data_source_id, database_name),
+            [_table_short_name(table_name) for table_name in table_names],
+        )
+        return [
+            table_name
+            for table_name, entry in zip(table_names, entries)
+            if not self._read(entry, fresh_time)[1]
+        ]
+
+    def get_table_columns(self, data_source_id, database_name, table_name):
+        return self._read(
+            redis_connection.hget(
+                self.columns_key(data_source_id, database_name), table_name
+            )
+        )
+
+    def set_table_columns(self, data_source_id, database_name, columns):
+        """Takes a dict of the columns of tables, by the tables' short names."""
+        if not columns:
+            return
+
+        key = self.columns_key(data_source_id, database_name)
+        pipe = redis_connection.pipeline()
+        pipe.hmset(
+            key,
+            {table_name: self._entry(value) for table_name, value in columns.items()},
+        )
+        pipe.expire(key, settings.DATABRICKS_METADATA_EXPIRATION_TIME)
+        pipe.execute()
+
+    def record_use(self, data_source_id, database_name):
+        redis_connection.zadd(
+            self.RECENT_DATABASES_KEY,
+            {"{}:{}".format(data_source_id, database_name): time.time()},
+        )
+
+    def recently_used(self, count):
+        """Returns the (data source id, database name) of the last used databases."""
+        redis_connection.zremrangebyscore(
+            self.RECENT_DATABASES_KEY,
+            "-inf",
+            time.time() - settings.DATABRICKS_METADATA_EXPIRATION_TIME,
+        )
+        recent = redis_connection.zrevrange(self.RECENT_DATABASES_KEY, 0, count - 1)
+        return [
+            (int(data_source_id), database_name)
+            for data_source_id, database_name in (
+                member.split(":", 1) for member in recent
+            )
+        ]
+
+    def enqueue_refresh(self, key, func, *args, **kwargs):
+        """
+        Enqueues `func` unless the job enqueued for the same key is still queued or
+        running, and returns the job.
+        """
+        job_id = redis_connection.get(key)
+        if job_id:
+            try:
+                job = Job.fetch(job_id)
+                if job.get_status() not in [JobStatus.FINISHED, JobStatus.FAILED]:
+                    return job
+            except NoSuchJobError:
+                pass
+
+        job = func.delay(*args, **kwargs)
+        redis_connection.set(key, job.id, ex=REFRESH_JOB_TIMEOUT)
+        return job
+
+    def refresh_databases(self, data_source_id):
+        return self.enqueue_refresh(
+            self.refresh_key(data_source_id, "databases"),
+            get_databricks_databases,
+            data_source_id,
+        )
+
+    def refresh_table_names(self, data_source_id, database_name):
+        return self.enqueue_refresh(
+            self.refresh_key(data_source_id, "table_names", database_name),
+            get_databricks_tables,
+            data_source_id,
+            database_name,
+        )
+
+    def refresh_tables(
+        self, data_source_id, database_name, force=False, fresh_time=None
+    ):
+        # a forced refresh doesn't settle for a running refresh of the stale tables
+        parts = ["tables", database_name] + (["force"] if force else [])
+        return self.enqueue_refresh(
+            self.refresh_key(data_source_id, *parts),
+            get_database_tables_with_columns,
+            data_source_id,
+            database_name,
+            force=force,
+            fresh_time=fresh_time,
+        )
+
+    def refresh_table_columns(self, data_source_id, database_name, table_name):
+        return self.enqueue_refresh(
+            self.refresh_key(data_source_id, "columns", database_name, table_name),
+            get_databricks_table_columns,
+            data_source_id,
+            database_name,
+            table_name,
+        )
+
+
+metadata_cache = DatabricksMetadataCache()
+
+
+def fetch_tables_columns(query_runner, database_name, table_names, store=None):
+    """
+    Fetches the columns of the given tables (by their short names), using up to
+    DATABRICKS_METADATA_FETCH_THREADS connections at once. Tables whose columns
+    couldn't be fetched are left out.
+
+    With `store`, the columns are passed to it (as a dict by table) in batches of
+    STORE_COLUMNS_BATCH_SIZE tables as they're fetched, so what was fetched is
+    kept even when the job times out.
+    """
+    local = threading.local()
+    cursors = []
+
+    def fetch(table_name):
+        cursor = getattr(local, "cursor", None)
+        if cursor is None:
+            cursor = local.cursor = query_runner._get_cursor()
+            cursors.append(cursor)
+
+        return query_runner.get_table_columns(database_name, table_name, cursor=cursor)
+
+    columns = {}
+    pending = {}
+    try:
+        with ThreadPoolExecutor(
+            max_workers=settings.DATABRICKS_METADATA_FETCH_THREADS
+        ) as executor:
+            futures = {
+                executor.submit(fetch, table_name): table_name
+                for table_name in table_names
+            }
+            for future in as_completed(futures):
+                try:
+                    pending[futures[future]] = future.result()
+                except Exception:
+                    logger.warning(
+                        "Failed fetching the columns of %s.%s.",
+                        database_name,
+                        futures[future],
+                        exc_info=True,
+                    )
+
+                if len(pending) >= STORE_COLUMNS_BATCH_SIZE:
+                    if store is not None:
+                        store(pending)
+                    columns.update(pending)
+                    pending = {}
+    finally:
+        for cursor in cursors:
+            cursor.connection.close()
+
+    if pending and store is not None:
+        store(pending)
+    columns.update(pending)
+
+    return columns
+
+
+def refresh_database(data_source, database_name, force=False, fresh_time=None):
+    """
+    Refreshes the cached tables of a database and the columns of its tables that
+    aren't fresh (see `DatabricksMetadataCache._read`), or of all its tables when
+    forced. Returns the tables.
+
+    The columns of all tables are listed with a single metadata call. Only when
+    some of the tables are stale, their columns are fetched table by table (see
+    `fetch_tables_columns`).
+    """
+    query_runner = data_source.query_runner
+    if force:
+        tables = query_runner.get_database_tables_with_columns(database_name)
+    else:
+        tables = query_runner.get_database_tables(database_name)
+    # check for tables since it doesn't return an error when the requested database doesn't exist
+    if not tables and not metadata_cache.has_tables(data_source.id, database_name):
+        return []
+
+    table_names = [table["name"] for table in tables]
+    metadata_cache.set_tables(data_source.id, database_name, table_names)
+
+    if not force:
+        stale_table_names = metadata_cache.stale_tables(
+            data_source.id, database_name, table_names, fresh_time
+        )
+        tables = None
+        if stale_table_names and len(stale_table_names) == len(table_names):
+            tables = query_runner.get_database_tables_with_columns(database_name)
+        elif stale_table_names:
+            fetch_tables_columns(
+                query_runner,
+                database_name,
+                [_table_short_name(table_name) for table_name in stale_table_names],
+                store=lambda columns: metadata_cache.set_table_columns(
+                    data_source.id, database_name, columns
+                ),
+            )
+
+    if tables:
+        metadata_cache.set_table_columns(
+            data_source.id,
+            database_name,
+            {_table_short_name(table["name"]): table["columns"] for table in tables},
+        )
+
+    schema, _, _ = metadata_cache.get_tables(data_source.id, database_name)
+    return schema
 
 
 @job("schemas", queue_class=Queue, at_front=True, timeout=300, ttl=90)
-def get_databricks_databases(data_source_id, redis_key):
+def get_databricks_databases(data_source_id):
     try:
         data_source = models.DataSource.get_by_id(data_source_id)
         databases = data_source.query_runner.get_databases()
-        redis_connection.set(redis_key, json_dumps(databases))
-        redis_connection.expire(redis_key, DATABRICKS_REDIS_EXPIRATION_TIME)
+        metadata_cache.set_databases(data_source_id, databases)
         return databases
     except Exception:
         return {"error": {"code": 2, "message": "Error retrieving database list."}}
 
 
 @job("schemas", queue_class=Queue, at_front=True, timeout=300, ttl=90)
-def get_database_tables_with_columns(data_source_id, database_name, redis_key):
+def get_database_tables_with_columns(
+    data_source_id, database_name, force=True, fresh_time=None
+):
     try:
         data_source = models.DataSource.get_by_id(data_source_id)
-        tables = data_source.query_runner.get_database_tables_with_columns(
-            database_name
-        )
-        # check for tables since it doesn't return an error when the requested database doesn't exist
-        if tables or redis_connection.exists(redis_key):
-            redis_connection.set(redis_key, json_dumps(tables))
-            redis_connection.expire(
-                redis_key, DATABRICKS_REDIS_EXPIRATION_TIME,
-            )
+        tables = refresh_database(
+            data_source, database_name, force=force, fresh_time=fresh_time
+        )
         return {"schema": tables, "has_columns": True}
     except Exception:
         return {"error": {"code": 2, "message": "Error retrieving schema."}}
@@ -42,9 +392,13 @@ def get_database_tables_with_columns(data_source_id, database_name, redis_key):
 def get_databricks_tables(data_source_id, database_name):
     try:
         data_source = models.DataSource.get_by_id(data_source_id)
-        tables = data_source.query_runner.get_database_tables_with_columns(
-            database_name
-        )
+        tables = data_source.query_runner.get_database_tables(database_name)
+        if tables:
+            metadata_cache.set_tables(
+                data_source_id, database_name, [table["name"] for table in tables]
+            )
+            metadata_cache.refresh_tables(data_source_id, database_name)
+
         return {"schema": tables, "has_columns": False}
     except Exception:
         return {"error": {"code": 2, "message": "Error retrieving schema."}}
@@ -54,6 +408,29 @@ def get_databricks_tables(data_source_id, database_name):
 def get_databricks_table_columns(data_source_id, database_name, table_name):
     try:
         data_source = models.DataSource.get_by_id(data_source_id)
-        return data_source.query_runner.get_table_columns(database_name, table_name)
+        columns = data_source.query_runner.get_table_columns(database_name, table_name)
+        metadata_cache.set_table_columns(
+            data_source_id, database_name, {table_name: columns}
+        )
+        return columns
     except Exception:
         return {"error": {"code": 2, "message": "Error retrieving table columns."}}
+
+
+def prefetch_databricks_metadata():
+    """
+    Refreshes the tables and columns of the most recently used Databricks databases
+    that are about to go stale (see PREFETCH_FRESH_RATIO), so they're still fresh
+    when they're browsed again.
+    """
+    fresh_time = settings.DATABRICKS_METADATA_FRESH_TIME * PREFETCH_FRESH_RATIO
+    for data_source_id, database_name in metadata_cache.recently_used(
+        settings.DATABRICKS_METADATA_PREFETCH_DATABASES
+    ):
+        _, has_columns, fresh = metadata_cache.get_tables(
+            data_source_id, database_name, fresh_time
+        )
+        if not (has_columns and fresh):
+            metadata_cache.refresh_tables(
+                data_source_id, database_name, fresh_time=fresh_time
+            )
@@ -0,0 +1,248 @@
+import datetime
+import hashlib
+import os
+import socket
+import time
+import uuid
+
+import requests
+
+from redash import models, redis_connection, settings, statsd_client
+from redash.models import event_partitions
+from redash.tasks.queries.maintenance import release_lease
+from redash.utils import json_dumps, json_loads, utcnow
+from redash.worker import get_job_logger
+
+logger = get_job_logger(__name__)
+
+EVENTS_BUFFER_KEY = "events:buffer"
+# the batch flush_events is storing, kept until its events are committed
+EVENTS_FLUSHING_KEY = "events:flushing"
+# webhook deliveries that failed, scored by when they're retried
+WEBHOOK_RETRIES_KEY = "events:webhooks:retries"
+
+FLUSH_EVENTS_LEASE_KEY = "events:flush:lease"
+FLUSH_EVENTS_LEASE_TIMEOUT = 600
+
+# events stored before partitioning are deleted in batches of this size
+DELETE_EVENTS_BATCH_SIZE = 10000
+# how long the ids of stored batches are kept, to tell whether a batch left by a
+# flush that died was stored
+FLUSHED_BATCHES_RETENTION = datetime.timedelta(days=7)
+
+WEBHOOK_SCHEMA = "iglu:io.redash.webhooks/events/jsonschema/1-0-0"
+
+# Moves a batch of events from the buffer to the batch being flushed.
+TAKE_BATCH_SCRIPT = """
+local events = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #events > 0 then
+    redis.call('LTRIM', KEYS[1], #events, -1)
+    redis.call('RPUSH', KEYS[2], unpack(events))
+end
+return events
+"""
+
+take_batch = redis_connection.register_script(TAKE_BATCH_SCRIPT)
+
+
+def buffer_event(event):
+    redis_connection.rpush(
+        EVENTS_BUFFER_KEY, json_dumps({"buffered_at": time.time(), "event": event})
+    )
+
+
+def _store(key, events, flushed=()):
+    """
+    Stores the events, recording `key` as flushed in the same transaction. When
+    that fails, or some of the events were already stored (their keys are in
+    `flushed`), the events are stored one by one as "<key>:<index>", to only drop
+    the ones that can't be stored.
+    """
+    if not flushed:
+        try:
+            stored = models.Event.record_batch(events)
+            models.db.session.add(models.FlushedEventBatch(id=key))
+            models.db.session.commit()
+            return stored
+        except Exception:
+            models.db.session.rollback()
+            if len(events) == 1:
+                logger.exception(
+                    "Dropping an event that can't be stored: %s", events[0]
+                )
+                statsd_client.incr("events.dropped")
+                return []
+
+    stored = []
+    for index, event in enumerate(events):
+        event_key = "{}:{}".format(key, index)
+        if event_key not in flushed:
+            stored.extend(_store(event_key, [event]))
+    return stored
+
+
+def _deliver(hook, events, attempts=0):
+    try:
+        response = requests.post(
+            hook,
+            json={"schema": WEBHOOK_SCHEMA, "data": events},
+            timeout=settings.EVENT_REPORTING_WEBHOOKS_TIMEOUT,
+        )
+        if response.status_code == 200:
+            return
+        logger.error("Failed posting to %s: %s", hook, response.content)
+    except Exception:
+        logger.exception("Failed posting to %s", hook)
+
+    attempts += 1
+    if attempts > settings.EVENT_REPORTING_WEBHOOKS_MAX_RETRIES:
+        logger.error(
+            "Dropping %d events after %d attempts to post them to %s.",
+            len(events),
+            attempts,
+            hook,
+        )
+        statsd_client.incr("events.webhooks.dropped", len(events))
+        return
+
+    delay = settings.EVENT_REPORTING_WEBHOOKS_RETRY_DELAY * 2 ** (attempts - 1)
+    delivery = {
+        "id": uuid.uuid4().hex,
+        "hook": hook,
+        "events": events,
+        "attempts": attempts,
+    }
+    redis_connection.zadd(
+        WEBHOOK_RETRIES_KEY, {json_dumps(delivery): time.time() + delay}
+    )
+
+
+def _retry_webhook_deliveries():
+    for delivery in redis_connection.zrangebyscore(
+        WEBHOOK_RETRIES_KEY, "-inf", time.time()
+    ):
+        redis_connection.zrem(WEBHOOK_RETRIES_KEY, delivery)
+        delivery = json_loads(delivery)
+        _deliver(delivery["hook"], delivery["events"], delivery["attempts"])
+
+
+def _flush_batch(batch, resumed=False):
+    entries = [json_loads(entry) for entry in batch]
+    batch_id = hashlib.md5("\n".join(batch).encode("utf-8")).hexdigest()
+
+    # a batch left by a flush that died may have been stored before it died
+    flushed = models.FlushedEventBatch.flushed(batch_id) if resumed else set()
+    if batch_id in flushed:
+        logger.info("Batch %s was already stored, skipping it.", batch_id)
+        stored = []
+    else:
+        stored = _store(batch_id, [entry["event"] for entry in entries], flushed)
+    redis_connection.delete(EVENTS_FLUSHING_KEY)
+
+    latency = time.time() - min(entry["buffered_at"] for entry in entries)
+    statsd_client.timing("events.flush.latency", latency * 1000)
+    statsd_client.incr("events.flushed", len(stored))
+
+    if stored:
+        events = [event.to_dict() for event in stored]
+        for hook in settings.EVENT_REPORTING_WEBHOOKS:
+            logger.debug("Forwarding %d events to: %s", len(events), hook)
+            _deliver(hook, events)
+
+
+def flush_events():
+    """
+    Stores the buffered events, in batches of settings.EVENTS_FLUSH_BATCH_SIZE each
+    stored with a single INSERT, and posts every batch to the event reporting
+    webhooks, retrying failed deliveries on the next runs.
+
+    A run takes batches until the buffer is empty or settings.EVENTS_FLUSH_TIME_BUDGET
+    seconds passed. Only one run flushes at a time, and a batch whose run died
+    is stored by the next run, unless it was committed already (see
+    FlushedEventBatch), so events are stored and counted once. Webhooks get the
+    events of a batch at most once.
+    """
+    owner = "{}:{}:{}".format(socket.gethostname(), os.getpid(), uuid.uuid4().hex)
+    if not redis_connection.set(
+        FLUSH_EVENTS_LEASE_KEY, owner, nx=True, ex=FLUSH_EVENTS_LEASE_TIMEOUT
+    ):
+        logger.info(
+            "Events are flushed by %s, skipping.",
+            redis_connection.get(FLUSH_EVENTS_LEASE_KEY),
+        )
+        return
+
+    try:
+        started_at = time.time()
+        batch = redis_connection.lrange(EVENTS_FLUSHING_KEY, 0, -1)
+        resumed = bool(batch)
+        while True:
+            if not batch:
+                batch = take_batch(
+                    keys=[EVENTS_BUFFER_KEY, EVENTS_FLUSHING_KEY],
+                    args=[settings.EVENTS_FLUSH_BATCH_SIZE],
+                )
+            if not batch:
+                break
+
+            _flush_batch(batch, resumed)
+            batch = None
+            resumed = False
+
+            if time.time() - started_at > settings.EVENTS_FLUSH_TIME_BUDGET:
+                break
+
+        _retry_webhook_deliveries()
+
+        depth = redis_connection.llen(EVENTS_BUFFER_KEY)
+        statsd_client.gauge("events.buffer.depth", depth)
+        duration = time.time() - started_at
+        statsd_client.timing("events.flush.duration", duration * 1000)
+        redis_connection.hmset(
+            "redash:status",
+            {"events_buffer_depth": depth, "last_events_flush_at": time.time()},
+        )
+    finally:
+        release_lease(keys=[FLUSH_EVENTS_LEASE_KEY], args=[owner])
+
+
+def manage_event_partitions():
+    """
+    Creates the partitions of `events` for this month and the next
+    settings.EVENTS_PARTITIONS_AHEAD months. With settings.EVENTS_RETENTION_DAYS
+    set, drops the partitions of older events, and deletes the older events that
+    were stored before `events` was partitioned. Also forgets the batches flushed
+    more than FLUSHED_BATCHES_RETENTION ago.
+    """
+    models.FlushedEventBatch.delete_older_than(utcnow() - FLUSHED_BATCHES_RETENTION)
+    models.db.session.commit()
+
+    today = utcnow().date()
+    created = event_partitions.create_event_partitions(
+        today, settings.EVENTS_PARTITIONS_AHEAD
+    )
+    models.db.session.commit()
+    if created:
+        logger.info("Created event partitions: %s", ", ".join(created))
+
+    if not settings.EVENTS_RETENTION_DAYS:
+        return
+
+    before = today - datetime.timedelta(days=settings.EVENTS_RETENTION_DAYS)
+    dropped = event_partitions.drop_event_partitions(before)
+    models.db.session.commit()
+    if dropped:
+        logger.info("Dropped event partitions: %s", ", ".join(dropped))
+
+    deleted = 0
+    while True:
+        count = event_partitions.delete_unpartitioned_events(
+            before, DELETE_EVENTS_BATCH_SIZE
+        )
+        models.db.session.commit()
+        deleted += count
+        if count < DELETE_EVENTS_BATCH_SIZE:
+            break
+
+    statsd_client.incr("events.partitions.dropped", len(dropped))
+    statsd_client.incr("events.deleted", deleted)
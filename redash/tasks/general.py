@@ -15,6 +15,8 @@ from redash.query_runner import NotSupported
 logger = get_job_logger(__name__)
 
 
+# Events are buffered and stored by flush_events now, this job only stores the
+# events that were enqueued as jobs before.
 @job("default")
 def record_event(raw_event):
     event = models.Event.record(raw_event)
@@ -2,6 +2,7 @@ from .maintenance import (
     refresh_queries,
     refresh_schemas,
     cleanup_query_results,
+    compress_query_results,
     empty_schedules,
     remove_ghost_locks,
 )
@@ -1,6 +1,8 @@
 import signal
+import sys
 import time
-import redis
+import uuid
+from contextlib import closing
 
 from rq import get_current_job
 from rq.job import JobStatus
@@ -8,126 +10,241 @@ from rq.timeouts import JobTimeoutException
 from rq.exceptions import NoSuchJobError
 
 from redash import models, redis_connection, settings
+from redash.concurrency import query_execution_slots
 from redash.query_runner import InterruptException
-from redash.tasks.worker import Queue, Job
+from redash.tasks.worker import EMBED_LANE, Queue, Job, lane_queue_name
 from redash.tasks.alerts import check_alerts_for_query
 from redash.tasks.failure_report import track_failure
-from redash.utils import gen_query_hash, json_dumps, utcnow
+from redash.utils import (
+    gen_query_hash,
+    json_dumps,
+    utcnow,
+    MaxQueryResultRowsExpection,
+)
 from redash.worker import get_job_logger
 
 logger = get_job_logger(__name__)
 TIMEOUT_MESSAGE = "Query exceeded Redash query execution time limit."
 
 
+# Set of the lock keys of all queries that have a job, so ghost locks can be
+# found without scanning the whole keyspace.
+QUERY_LOCKS_KEY = "query_hash_jobs"
+# Set while the job that just took a lock is being enqueued, so it isn't
+# mistaken for an expired one in the meantime.
+PENDING_JOB_KEY_PREFIX = "query_hash_job_pending:"
+PENDING_JOB_TIMEOUT = 60
+
+# Returns the id of the job holding a query's lock. When there's none, or it's
+# held by the given stale job (and that job isn't being enqueued), takes the
+# lock for the new job instead and returns its id.
+GET_OR_CREATE_JOB_SCRIPT = """
+local job_id = redis.call('GET', KEYS[1])
+if job_id then
+    local pending = redis.call('EXISTS', ARGV[5] .. job_id) == 1
+    if job_id ~= ARGV[2] or pending then
+        return job_id
+    end
+end
+
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+redis.call('SADD', KEYS[2], KEYS[1])
+redis.call('SET', ARGV[5] .. ARGV[1], 1, 'EX', ARGV[4])
+return ARGV[1]
+"""
+
+# Deletes a lock and removes it from the lock registry, unless it was taken by
+# another job or its job is still being enqueued.
+RELEASE_LOCK_SCRIPT = """
+local job_id = redis.call('GET', KEYS[1])
+if job_id and job_id ~= ARGV[1] then
+    return 0
+end
+if ARGV[1] ~= '' and redis.call('EXISTS', ARGV[2] .. ARGV[1]) == 1 then
+    return 0
+end
+
+redis.call('DEL', KEYS[1])
+redis.call('SREM', KEYS[2], KEYS[1])
+return 1
+"""
+
+get_or_create_job = redis_connection.register_script(GET_OR_CREATE_JOB_SCRIPT)
+release_job_lock = redis_connection.register_script(RELEASE_LOCK_SCRIPT)
+
+ENQUEUE_ATTEMPTS = 100
+ENQUEUE_RETRY_DELAY = 0.05
+
+
 def _job_lock_id(query_hash, data_source_id):
     return "query_hash_job:%s:%s" % (data_source_id, query_hash)
 
 
 def _unlock(query_hash, data_source_id):
-    redis_connection.delete(_job_lock_id(query_hash, data_source_id))
+    lock_id = _job_lock_id(query_hash, data_source_id)
+    pipe = redis_connection.pipeline()
+    pipe.delete(lock_id)
+    pipe.srem(QUERY_LOCKS_KEY, lock_id)
+    pipe.execute()
+
+
+def _release_lock(lock_id, job_id, client=None):
+    return release_job_lock(
+        keys=[lock_id, QUERY_LOCKS_KEY],
+        args=[job_id or "", PENDING_JOB_KEY_PREFIX],
+        client=client,
+    )
+
+
+def _fetch_live_job(query_hash, job_id):
+    try:
+        job = Job.fetch(job_id)
+    except NoSuchJobError:
+        logger.info("[%s] job found has expired", query_hash)
+        return None
+
+    status = job.get_status()
+    if status in [JobStatus.FINISHED, JobStatus.FAILED]:
+        logger.info("[%s] job found is complete (%s)", query_hash, status)
+        return None
+
+    if job.is_cancelled:
+        logger.info("[%s] job found has been cancelled", query_hash)
+        return None
+
+    return job
+
+
+def _enqueue_job(
+    job_id, query, data_source, user_id, is_api_key, scheduled_query, metadata
+):
+    if scheduled_query:
+        queue_name = data_source.scheduled_queue_name
+        scheduled_query_id = scheduled_query.id
+    elif is_api_key:
+        # embeds (and other API key requests) queue behind users' interactive queries
+        queue_name = lane_queue_name(data_source.queue_name, EMBED_LANE)
+        scheduled_query_id = None
+    else:
+        queue_name = data_source.queue_name
+        scheduled_query_id = None
+
+    time_limit = settings.dynamic_settings.query_time_limit(
+        scheduled_query, user_id, data_source.org_id
+    )
+    metadata["Queue"] = queue_name
+
+    queue = Queue(queue_name)
+    enqueue_kwargs = {
+        "user_id": user_id,
+        "scheduled_query_id": scheduled_query_id,
+        "is_api_key": is_api_key,
+        "job_timeout": time_limit,
+        "job_id": job_id,
+        "meta": {
+            "data_source_id": data_source.id,
+            "org_id": data_source.org_id,
+            "scheduled": scheduled_query_id is not None,
+            "query_id": metadata.get("Query ID"),
+            "user_id": user_id,
+            "max_concurrency": data_source.max_concurrency,
+        },
+    }
+
+    if not scheduled_query:
+        enqueue_kwargs["result_ttl"] = settings.JOB_EXPIRY_TIME
+
+    # counted as waiting before it's queued, as a worker may take it right away
+    query_execution_slots.enqueued(job_id, data_source.id)
+    try:
+        job = queue.enqueue(
+            execute_query, query, data_source.id, metadata, **enqueue_kwargs
+        )
+    except Exception:
+        query_execution_slots.cancelled(job_id, data_source.id)
+        raise
+
+    return job
 
 
 def enqueue_query(
     query, data_source, user_id, is_api_key=False, scheduled_query=None, metadata={}
 ):
+    """
+    Returns the job running `query` on `data_source`, enqueueing one unless
+    there's already a live one for the same query text.
+
+    Which caller enqueues the job is decided atomically by a script that takes
+    the query's lock, so concurrent identical executions share one job.
+    """
     query_hash = gen_query_hash(query)
+    lock_id = _job_lock_id(query_hash, data_source.id)
     logger.info("Inserting job for %s with metadata=%s", query_hash, metadata)
-    try_count = 0
-    job = None
 
-    while try_count < 5:
-        try_count += 1
+    new_job_id = str(uuid.uuid4())
+    stale_job_id = None
+
+    for _ in range(ENQUEUE_ATTEMPTS):
+        job_id = get_or_create_job(
+            keys=[lock_id, QUERY_LOCKS_KEY],
+            args=[
+                new_job_id,
+                stale_job_id or "",
+                settings.JOB_EXPIRY_TIME,
+                PENDING_JOB_TIMEOUT,
+                PENDING_JOB_KEY_PREFIX,
+            ],
+        )
 
-        pipe = redis_connection.pipeline()
-        try:
-            pipe.watch(_job_lock_id(query_hash, data_source.id))
-            job_id = pipe.get(_job_lock_id(query_hash, data_source.id))
-            if job_id:
-                logger.info("[%s] Found existing job: %s", query_hash, job_id)
-                job_complete = None
-                job_cancelled = None
-
-                try:
-                    job = Job.fetch(job_id)
-                    job_exists = True
-                    status = job.get_status()
-                    job_complete = status in [JobStatus.FINISHED, JobStatus.FAILED]
-                    job_cancelled = job.is_cancelled
-
-                    if job_complete:
-                        message = "job found is complete (%s)" % status
-                    elif job_cancelled:
-                        message = "job found has ben cancelled"
-                except NoSuchJobError:
-                    message = "job found has expired"
-                    job_exists = False
-
-                lock_is_irrelevant = job_complete or job_cancelled or not job_exists
-
-                if lock_is_irrelevant:
-                    logger.info("[%s] %s, removing lock", query_hash, message)
-                    redis_connection.delete(_job_lock_id(query_hash, data_source.id))
-                    job = None
-
-            if not job:
-                pipe.multi()
-
-                if scheduled_query:
-                    queue_name = data_source.scheduled_queue_name
-                    scheduled_query_id = scheduled_query.id
-                else:
-                    queue_name = data_source.queue_name
-                    scheduled_query_id = None
-
-                time_limit = settings.dynamic_settings.query_time_limit(
-                    scheduled_query, user_id, data_source.org_id
-                )
-                metadata["Queue"] = queue_name
-
-                queue = Queue(queue_name)
-                enqueue_kwargs = {
-                    "user_id": user_id,
-                    "scheduled_query_id": scheduled_query_id,
-                    "is_api_key": is_api_key,
-                    "job_timeout": time_limit,
-                    "meta": {
-                        "data_source_id": data_source.id,
-                        "org_id": data_source.org_id,
-                        "scheduled": scheduled_query_id is not None,
-                        "query_id": metadata.get("Query ID"),
-                        "user_id": user_id,
-                    },
-                }
-
-                if not scheduled_query:
-                    enqueue_kwargs["result_ttl"] = settings.JOB_EXPIRY_TIME
-
-                job = queue.enqueue(
-                    execute_query, query, data_source.id, metadata, **enqueue_kwargs
+        if job_id == new_job_id:
+            try:
+                job = _enqueue_job(
+                    new_job_id,
+                    query,
+                    data_source,
+                    user_id,
+                    is_api_key,
+                    scheduled_query,
+                    metadata,
                 )
+            except Exception:
+                redis_connection.delete(PENDING_JOB_KEY_PREFIX + new_job_id)
+                _release_lock(lock_id, new_job_id)
+                raise
 
-                logger.info("[%s] Created new job: %s", query_hash, job.id)
-                pipe.set(
-                    _job_lock_id(query_hash, data_source.id),
-                    job.id,
-                    settings.JOB_EXPIRY_TIME,
-                )
-                pipe.execute()
-            break
+            redis_connection.delete(PENDING_JOB_KEY_PREFIX + new_job_id)
 
-        except redis.WatchError:
-            continue
+            logger.info("[%s] Created new job: %s", query_hash, job.id)
+            return job
 
-    if not job:
-        logger.error("[Manager][%s] Failed adding job for query.", query_hash)
+        if job_id == stale_job_id:
+            # the lock is still held by a job that's being enqueued
+            time.sleep(ENQUEUE_RETRY_DELAY)
 
-    return job
+        job = _fetch_live_job(query_hash, job_id)
+        if job is not None:
+            logger.info("[%s] Found existing job: %s", query_hash, job_id)
+            return job
+
+        stale_job_id = job_id
+
+    logger.error("[Manager][%s] Failed adding job for query.", query_hash)
+    return None
 
 
 def signal_handler(*args):
     raise InterruptException
 
 
+def _limit_row_batches(row_batches, max_rows):
+    row_count = 0
+    for batch in row_batches:
+        row_count += len(batch)
+        if row_count > max_rows:
+            raise MaxQueryResultRowsExpection(max_rows)
+        yield batch
+
+
 class QueryExecutionError(Exception):
     pass
 
@@ -167,6 +284,7 @@ class QueryExecutor(object):
         # Load existing tracker or create a new one if the job was created before code update:
         if scheduled_query:
             models.scheduled_queries_executions.update(scheduled_query.id)
+            models.scheduled_queries_index.executed(scheduled_query, utcnow())
 
     def run(self):
         signal.signal(signal.SIGINT, signal_handler)
@@ -178,8 +296,15 @@ class QueryExecutor(object):
         query_runner = self.data_source.query_runner
         annotated_query = self._annotate_query(query_runner)
 
+        streamed_result = None
         try:
-            data, error = query_runner.run_query(annotated_query, self.user, self.org)
+            if query_runner.supports_iter_query:
+                streamed_result = self._stream_query(query_runner, annotated_query)
+                data, error = None, None
+            else:
+                data, error = query_runner.run_query(
+                    annotated_query, self.user, self.org
+                )
         except Exception as e:
             if isinstance(e, JobTimeoutException):
                 error = TIMEOUT_MESSAGE
@@ -187,6 +312,7 @@ class QueryExecutor(object):
                 error = str(e)
 
             data = None
+            streamed_result = None
             logger.warning("Unexpected error while running query:", exc_info=1)
 
         run_time = time.time() - started_at
@@ -201,7 +327,7 @@ class QueryExecutor(object):
 
         _unlock(self.query_hash, self.data_source.id)
 
-        if error is not None and data is None:
+        if error is not None and data is None and streamed_result is None:
             result = QueryExecutionError(error)
             if self.scheduled_query is not None:
                 self.scheduled_query = models.db.session.merge(
@@ -226,6 +352,7 @@ class QueryExecutor(object):
                 data,
                 run_time,
                 utcnow(),
+                query_result=streamed_result,
             )
 
             updated_query_ids = models.Query.update_latest_result(query_result)
@@ -240,6 +367,26 @@ class QueryExecutor(object):
             models.db.session.commit()
             return result
 
+    def _stream_query(self, query_runner, annotated_query):
+        # Rows are written to the (not yet saved) query result batch by batch,
+        # instead of building the whole result and its JSON in memory.
+        max_rows = self.org.max_query_result_rows if self.org else sys.maxsize
+        stream = query_runner.iter_query(annotated_query, self.user, self.org)
+
+        with closing(stream):
+            columns = next(stream, None)
+            if columns is None:
+                raise QueryExecutionError("Query completed but it returned no data.")
+
+            query_result = models.QueryResult()
+            query_result.store_rows(
+                columns,
+                _limit_row_batches(stream, max_rows),
+                json_encoder=query_runner.json_encoder,
+            )
+
+        return query_result
+
     def _annotate_query(self, query_runner):
         self.metadata["Job ID"] = self.job.id
         self.metadata["Query Hash"] = self.query_hash
@@ -1,18 +1,36 @@
 import logging
+import os
+import socket
 import time
+import uuid
 
+from funcy import chunks
+from rq.job import JobStatus
 from rq.timeouts import JobTimeoutException
-from redash import models, redis_connection, settings, statsd_client
+from rq.utils import as_text
+from sqlalchemy import func
+from sqlalchemy.orm import load_only
+from redash import (
+    models,
+    redis_connection,
+    rq_redis_connection,
+    settings,
+    statsd_client,
+)
 from redash.models.parameterized_query import (
     InvalidParameterError,
     QueryDetachedFromDataSourceError,
 )
 from redash.tasks.failure_report import track_failure
-from redash.utils import json_dumps, sentry
+from redash.utils import json_dumps, json_loads, sentry
+from redash.tasks.worker import Job
 from redash.worker import job, get_job_logger
-from redash.monitor import rq_job_ids
+from redash.monitor import (
+    REFRESH_QUERIES_SHARD_STATUS_KEY,
+    get_refresh_queries_shards_status,
+)
 
-from .execution import enqueue_query
+from .execution import QUERY_LOCKS_KEY, _release_lock, enqueue_query
 
 logger = get_job_logger(__name__)
 
@@ -81,10 +99,9 @@ def _apply_auto_limit(query_text, query):
     return query.data_source.query_runner.apply_auto_limit(query_text, should_apply_auto_limit)
 
 
-def refresh_queries():
-    logger.info("Refreshing queries...")
+def _enqueue_outdated_queries(queries):
     enqueued = []
-    for query in models.Query.outdated_queries():
+    for query in queries:
         if not _should_refresh_query(query):
             continue
 
@@ -105,59 +122,286 @@ def refresh_queries():
             error = RefreshQueriesError(message).with_traceback(e.__traceback__)
             sentry.capture_exception(error)
 
+    return enqueued
+
+
+# Deletes the lease only if it's still held by the given owner.
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+release_lease = redis_connection.register_script(RELEASE_LEASE_SCRIPT)
+
+REFRESH_QUERIES_LEASE_KEY = "refresh_queries:shard:{}:lease"
+# matches the timeout of the refresh_queries periodic job
+REFRESH_QUERIES_LEASE_TIMEOUT = 600
+
+
+def _update_refresh_queries_status():
+    statuses = [
+        s for s in get_refresh_queries_shards_status() if s.get("last_refresh_at")
+    ]
+    if not statuses:
+        return
+
     status = {
-        "outdated_queries_count": len(enqueued),
-        "last_refresh_at": time.time(),
-        "query_ids": json_dumps([q.id for q in enqueued]),
+        "outdated_queries_count": sum(
+            int(s["outdated_queries_count"]) for s in statuses
+        ),
+        "last_refresh_at": max(float(s["last_refresh_at"]) for s in statuses),
+        "query_ids": json_dumps(
+            [query_id for s in statuses for query_id in json_loads(s["query_ids"])]
+        ),
     }
-
     redis_connection.hmset("redash:status", status)
-    logger.info("Done refreshing queries: %s" % status)
 
 
-def cleanup_query_results():
+def refresh_queries(shard=None):
+    """
+    Enqueues the scheduled queries that are due.
+
+    With settings.REFRESH_QUERIES_SHARDS above 1, a refresh_queries job is scheduled
+    for every shard and only refreshes the queries of that shard. Each shard is
+    refreshed by whichever worker holds its lease in Redis, so a slow run isn't
+    overlapped by the next one. Shards write their status to their own hash, and
+    redash:status sums them up.
+    """
+    if shard is None:
+        logger.info("Refreshing queries...")
+        enqueued = _enqueue_outdated_queries(models.Query.outdated_queries())
+        status = {
+            "outdated_queries_count": len(enqueued),
+            "last_refresh_at": time.time(),
+            "query_ids": json_dumps([q.id for q in enqueued]),
+        }
+
+        redis_connection.hmset("redash:status", status)
+        logger.info("Done refreshing queries: %s" % status)
+        return
+
+    shards = settings.REFRESH_QUERIES_SHARDS
+    lease_key = REFRESH_QUERIES_LEASE_KEY.format(shard)
+    owner = "{}:{}:{}".format(socket.gethostname(), os.getpid(), uuid.uuid4().hex)
+    if not redis_connection.set(
+        lease_key, owner, nx=True, ex=REFRESH_QUERIES_LEASE_TIMEOUT
+    ):
+        logger.info(
+            "Shard %d/%d is refreshed by %s, skipping.",
+            shard,
+            shards,
+            redis_connection.get(lease_key),
+        )
+        return
+
+    try:
+        logger.info("Refreshing queries of shard %d/%d...", shard, shards)
+        started_at = time.time()
+        enqueued = _enqueue_outdated_queries(
+            models.Query.outdated_queries(shard=(shard, shards))
+        )
+        status = {
+            "outdated_queries_count": len(enqueued),
+            "last_refresh_at": time.time(),
+            "last_refresh_duration": time.time() - started_at,
+            "query_ids": json_dumps([q.id for q in enqueued]),
+            "owner": owner,
+        }
+
+        redis_connection.hmset(REFRESH_QUERIES_SHARD_STATUS_KEY.format(shard), status)
+        _update_refresh_queries_status()
+        logger.info("Done refreshing queries of shard %d/%d: %s", shard, shards, status)
+    finally:
+        release_lease(keys=[lease_key], args=[owner])
+
+
+CLEANUP_CURSOR_KEY = "query_results:cleanup:cursor"
+
+
+def cleanup_query_results(time_budget=None, batch_size=None):
     """
     Job to cleanup unused query results -- such that no query links to them anymore, and older than
     settings.QUERY_RESULTS_CLEANUP_MAX_AGE (a week by default, so it's less likely to be open in someone's browser and be used).
 
-    Each time the job deletes only settings.QUERY_RESULTS_CLEANUP_COUNT (100 by default) query results so it won't choke
-    the database in case of many such results.
+    The job walks query_results in id ranges of `batch_size` (settings.QUERY_RESULTS_CLEANUP_BATCH_SIZE by default), deleting the unused
+    results of each range in one statement, until `time_budget` seconds (settings.QUERY_RESULTS_CLEANUP_TIME_BUDGET
+    by default, 0 for no limit) have passed. The next run continues from where it stopped, and once the end of
+    the table is reached, the walk starts over from its lowest id.
     """
+    if time_budget is None:
+        time_budget = settings.QUERY_RESULTS_CLEANUP_TIME_BUDGET
+    if not batch_size:
+        batch_size = settings.QUERY_RESULTS_CLEANUP_BATCH_SIZE
+
+    started_at = time.time()
+    cursor = redis_connection.get(CLEANUP_CURSOR_KEY)
+    if cursor is None:
+        cursor = models.db.session.query(func.min(models.QueryResult.id)).scalar()
+    cursor = int(cursor or 0)
+    max_id = models.db.session.query(func.max(models.QueryResult.id)).scalar() or 0
 
     logger.info(
-        "Running query results clean up (removing maximum of %d unused results, that are %d days old or more)",
-        settings.QUERY_RESULTS_CLEANUP_COUNT,
+        "Running query results clean up (from id %d to %d, removing unused results that are %d days old or more)",
+        cursor,
+        max_id,
         settings.QUERY_RESULTS_CLEANUP_MAX_AGE,
     )
 
-    unused_query_results = models.QueryResult.unused(
-        settings.QUERY_RESULTS_CLEANUP_MAX_AGE
+    deleted_count = deleted_bytes = 0
+    while cursor <= max_id:
+        end = cursor + batch_size
+        count, size = models.QueryResult.delete_unused(
+            cursor, end, settings.QUERY_RESULTS_CLEANUP_MAX_AGE
+        )
+        models.db.session.commit()
+
+        cursor = end
+        redis_connection.set(CLEANUP_CURSOR_KEY, cursor)
+        statsd_client.incr("query_results.cleanup.deleted_rows", count)
+        statsd_client.incr("query_results.cleanup.deleted_bytes", size)
+        deleted_count += count
+        deleted_bytes += size
+
+        if time_budget and time.time() - started_at >= time_budget:
+            break
+    else:
+        redis_connection.delete(CLEANUP_CURSOR_KEY)
+
+    logger.info(
+        "Deleted %d unused query results (%d bytes), stopped at id %d.",
+        deleted_count,
+        deleted_bytes,
+        cursor,
+    )
+    return deleted_count, deleted_bytes
+
+
+COMPRESSION_CURSOR_KEY = "query_results:compression:cursor"
+
+
+def compress_query_results():
+    """
+    Job to compress the query results stored before redash.models.CompressedPersistence was enabled.
+
+    Each run compresses up to settings.QUERY_RESULTS_COMPRESSION_BATCHES batches of
+    settings.QUERY_RESULTS_COMPRESSION_BATCH_SIZE results in id order, committing after every batch,
+    and continues from where the previous run stopped.
+    """
+    if not models.QueryResult.compresses_data:
+        return
+
+    cursor = int(redis_connection.get(COMPRESSION_CURSOR_KEY) or 0)
+    compressed_count = 0
+
+    for _ in range(settings.QUERY_RESULTS_COMPRESSION_BATCHES):
+        query_results = (
+            models.QueryResult.query.filter(
+                models.QueryResult.id > cursor, models.QueryResult._data.isnot(None)
+            )
+            .options(load_only("id", "_data"))
+            .order_by(models.QueryResult.id)
+            .limit(settings.QUERY_RESULTS_COMPRESSION_BATCH_SIZE)
+            .all()
+        )
+        if not query_results:
+            break
+
+        for query_result in query_results:
+            # goes through CompressedPersistence, which moves it to compressed_data
+            query_result._text = query_result._data
+
+        cursor = query_results[-1].id
+        models.db.session.commit()
+        redis_connection.set(COMPRESSION_CURSOR_KEY, cursor)
+        compressed_count += len(query_results)
+
+    logger.info("Compressed %d query results (up to id %d).", compressed_count, cursor)
+
+
+QUERY_LOCKS_BACKFILLED_KEY = "query_hash_jobs:backfilled"
+GHOST_LOCKS_BATCH_SIZE = 500
+LIVE_JOB_STATUSES = (JobStatus.QUEUED, JobStatus.STARTED, JobStatus.DEFERRED)
+
+def _backfill_query_locks():
+    # locks taken before the lock registry existed are only found by scanning
+    if not redis_connection.set(QUERY_LOCKS_BACKFILLED_KEY, 1, nx=True):
+        return
+
+    keys = redis_connection.scan_iter(
+        match="query_hash_job:*", count=GHOST_LOCKS_BATCH_SIZE
+    )
+    for batch in chunks(GHOST_LOCKS_BATCH_SIZE, keys):
+        redis_connection.sadd(QUERY_LOCKS_KEY, *batch)
+
+
+def _find_ghost_locks(locks):
+    pipe = redis_connection.pipeline(transaction=False)
+    for lock in locks:
+        pipe.get(lock)
+    job_ids = dict(zip(locks, pipe.execute()))
+
+    pipe = rq_redis_connection.pipeline(transaction=False)
+    for job_id in job_ids.values():
+        if job_id:
+            pipe.hget(Job.key_for(job_id), "status")
+    statuses = dict(
+        zip(filter(None, job_ids.values()), map(as_text, pipe.execute()))
     )
-    deleted_count = models.QueryResult.query.filter(
-        models.QueryResult.id.in_(
-            unused_query_results.limit(settings.QUERY_RESULTS_CLEANUP_COUNT).subquery()
+
+    # cancelled jobs are taken out of their queue but keep the queued status
+    queued = [
+        job_id for job_id, status in statuses.items() if status == JobStatus.QUEUED
+    ]
+    cancelled = set(
+        job_id
+        for job_id, job in zip(
+            queued, Job.fetch_many(queued, connection=rq_redis_connection)
         )
-    ).delete(synchronize_session=False)
-    models.db.session.commit()
-    logger.info("Deleted %d unused query results.", deleted_count)
+        if job is None or job.is_cancelled
+    )
+
+    return [
+        (lock, job_id)
+        for lock, job_id in job_ids.items()
+        if not job_id
+        or statuses[job_id] not in LIVE_JOB_STATUSES
+        or job_id in cancelled
+    ]
 
 
 def remove_ghost_locks():
     """
-    Removes query locks that reference a non existing RQ job.
+    Removes query locks that reference a non existing, finished or cancelled RQ job.
+
+    The locks are read from the lock registry that `enqueue_query` maintains, in
+    pipelined batches of GHOST_LOCKS_BATCH_SIZE.
     """
-    keys = redis_connection.keys("query_hash_job:*")
-    locks = {k: redis_connection.get(k) for k in keys}
-    jobs = list(rq_job_ids())
+    started_at = time.time()
+    _backfill_query_locks()
+
+    found = 0
+    removed = 0
+    locks = redis_connection.sscan_iter(QUERY_LOCKS_KEY, count=GHOST_LOCKS_BATCH_SIZE)
+    for batch in chunks(GHOST_LOCKS_BATCH_SIZE, locks):
+        found += len(batch)
 
-    count = 0
+        pipe = redis_connection.pipeline(transaction=False)
+        for lock, job_id in _find_ghost_locks(batch):
+            _release_lock(lock, job_id, client=pipe)
+        removed += sum(pipe.execute())
 
-    for lock, job_id in locks.items():
-        if job_id not in jobs:
-            redis_connection.delete(lock)
-            count += 1
+    duration = time.time() - started_at
+    statsd_client.gauge("query_locks.count", found - removed)
+    statsd_client.incr("query_locks.ghosts_removed", removed)
+    statsd_client.timing("query_locks.reconcile", duration * 1000)
 
-    logger.info("Locks found: {}, Locks removed: {}".format(len(locks), count))
+    logger.info(
+        "Locks found: {}, Locks removed: {}, took {:.2f}s".format(
+            found, removed, duration
+        )
+    )
 
 
 @job("schemas")
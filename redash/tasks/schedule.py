@@ -8,6 +8,7 @@ from rq.job import Job
 from rq_scheduler import Scheduler
 
 from redash import extensions, settings, rq_redis_connection, statsd_client
+from redash.models import QueryResult
 from redash.tasks import (
     sync_user_details,
     refresh_queries,
@@ -15,9 +16,13 @@ from redash.tasks import (
     empty_schedules,
     refresh_schemas,
     cleanup_query_results,
+    compress_query_results,
     purge_failed_jobs,
     version_check,
     send_aggregated_errors,
+    prefetch_databricks_metadata,
+    flush_events,
+    manage_event_partitions,
     Queue,
 )
 
@@ -60,13 +65,39 @@ def schedule(kwargs):
 
 
 def periodic_job_definitions():
-    jobs = [
-        {"func": refresh_queries, "timeout": 600, "interval": 30, "result_ttl": 600},
+    if settings.REFRESH_QUERIES_SHARDS > 1:
+        refresh_queries_jobs = [
+            {
+                "func": refresh_queries,
+                "kwargs": {"shard": shard},
+                "timeout": 600,
+                "interval": 30,
+                "result_ttl": 600,
+            }
+            for shard in range(settings.REFRESH_QUERIES_SHARDS)
+        ]
+    else:
+        refresh_queries_jobs = [
+            {"func": refresh_queries, "timeout": 600, "interval": 30, "result_ttl": 600}
+        ]
+
+    jobs = refresh_queries_jobs + [
         {
             "func": remove_ghost_locks,
             "interval": timedelta(minutes=1),
             "result_ttl": 600,
         },
+        {
+            "func": flush_events,
+            "timeout": 600,
+            "interval": settings.EVENTS_FLUSH_INTERVAL,
+            "result_ttl": 600,
+        },
+        {
+            "func": manage_event_partitions,
+            "timeout": 3600,
+            "interval": timedelta(days=1),
+        },
         {"func": empty_schedules, "interval": timedelta(minutes=60)},
         {
             "func": refresh_schemas,
@@ -86,6 +117,23 @@ def periodic_job_definitions():
     if settings.QUERY_RESULTS_CLEANUP_ENABLED:
         jobs.append({"func": cleanup_query_results, "interval": timedelta(minutes=5)})
 
+    if settings.DATABRICKS_METADATA_PREFETCH_DATABASES:
+        jobs.append(
+            {
+                "func": prefetch_databricks_metadata,
+                "interval": timedelta(seconds=settings.DATABRICKS_METADATA_FRESH_TIME),
+            }
+        )
+
+    if QueryResult.compresses_data:
+        jobs.append(
+            {
+                "func": compress_query_results,
+                "timeout": 3600,
+                "interval": timedelta(minutes=5),
+            }
+        )
+
     # Add your own custom periodic jobs in your dynamic_settings module.
     jobs.extend(settings.dynamic_settings.periodic_jobs() or [])
 
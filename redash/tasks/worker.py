@@ -1,10 +1,18 @@
 import errno
 import os
+import random
 import signal
+import threading
 import time
-from redash import statsd_client
+from redash import models, redis_connection, settings, statsd_client
+from redash.concurrency import query_execution_slots
+from redash.query_runner import InterruptException
+from redash.query_runner.pool import CONNECTION_POOLS_STATUS_KEY, connection_pools
+from redash.utils import json_dumps
 from rq import Queue as BaseQueue, get_current_job
+from rq.exceptions import NoSuchJobError
 from rq.worker import HerokuWorker # HerokuWorker implements graceful shutdown on SIGTERM
+from rq.worker import SimpleWorker, WorkerStatus
 from rq.utils import utcnow
 from rq.timeouts import UnixSignalDeathPenalty, HorseMonitorTimeoutException
 from rq.job import Job as BaseJob, JobStatus
@@ -15,6 +23,9 @@ class CancellableJob(BaseJob):
         self.meta["cancelled"] = True
         self.save_meta()
 
+        if "data_source_id" in self.meta:
+            query_execution_slots.cancelled(self.id, self.meta["data_source_id"])
+
         super().cancel(pipeline=pipeline)
 
     @property
@@ -22,6 +33,63 @@ class CancellableJob(BaseJob):
         return self.meta.get("cancelled", False)
 
 
+INTERACTIVE_LANE = "interactive"
+EMBED_LANE = "embed"
+SCHEDULED_LANE = "scheduled"
+LANES = (INTERACTIVE_LANE, EMBED_LANE, SCHEDULED_LANE)
+
+# queues of jobs other than query executions, which aren't split in lanes
+NON_QUERY_QUEUES = ("periodic", "emails", "default", "schemas")
+
+
+def lane_queue_name(queue_name, lane):
+    """
+    Returns the name of the queue that holds the jobs of `queue_name` in `lane`:
+    the queue itself for interactive jobs and the queue prefixed by the lane for
+    the others (`embed_queries`, `scheduled_queries`).
+    """
+    if lane == INTERACTIVE_LANE:
+        return queue_name
+
+    return "{}_{}".format(lane, queue_name)
+
+
+def queue_lane(queue_name):
+    lane, _, base_name = queue_name.partition("_")
+    if base_name and lane in LANES:
+        return lane
+
+    return INTERACTIVE_LANE
+
+
+def record_lane_wait(job, queue):
+    """Records how long a job that's starting waited since it was enqueued, per lane."""
+    if job.enqueued_at:
+        statsd_client.timing(
+            "rq.lanes.{}.wait".format(queue_lane(queue.name)),
+            utcnow() - job.enqueued_at,
+        )
+
+
+def with_lane_queues(queues):
+    """
+    Adds the embed lane queue of every query queue that isn't a lane queue itself,
+    so workers started on `queries` also run the embeds of the data sources using it.
+    """
+    queues = list(queues)
+    names = [queue if isinstance(queue, str) else queue.name for queue in queues]
+    expanded = []
+    for queue, name in zip(queues, names):
+        expanded.append(queue)
+
+        if name not in NON_QUERY_QUEUES and queue_lane(name) == INTERACTIVE_LANE:
+            embed_queue_name = lane_queue_name(name, EMBED_LANE)
+            if embed_queue_name not in names:
+                expanded.append(embed_queue_name)
+
+    return expanded
+
+
 class StatsdRecordingQueue(BaseQueue):
     """
     RQ Queue Mixin that overrides `enqueue_call` to increment metrics via Statsd
@@ -33,11 +101,47 @@ class StatsdRecordingQueue(BaseQueue):
         return job
 
 
+class PrioritizedQueue(BaseQueue):
+    """
+    RQ takes the next job from the first non-empty queue in the order the worker
+    lists them. This orders the queues by lane before every dequeue, picking lanes
+    at random weighted by settings.QUEUE_LANE_WEIGHTS: interactive jobs are mostly
+    served first, but embeds and scheduled jobs still get their turn while
+    interactive queues are busy.
+    """
+
+    @classmethod
+    def prioritize(cls, queues):
+        queues_by_lane = {}
+        for queue in queues:
+            queues_by_lane.setdefault(queue_lane(queue.name), []).append(queue)
+
+        weights = {
+            lane: settings.QUEUE_LANE_WEIGHTS.get(lane, 1) for lane in queues_by_lane
+        }
+        lanes = [lane for lane in LANES if lane in queues_by_lane]
+        weighted_lanes = [lane for lane in lanes if weights[lane] > 0]
+        ordered_lanes = []
+        while weighted_lanes:
+            lane = random.choices(
+                weighted_lanes, [weights[lane] for lane in weighted_lanes]
+            )[0]
+            weighted_lanes.remove(lane)
+            ordered_lanes.append(lane)
+
+        ordered_lanes += [lane for lane in lanes if weights[lane] <= 0]
+        return [queue for lane in ordered_lanes for queue in queues_by_lane[lane]]
+
+    @classmethod
+    def dequeue_any(cls, queues, *args, **kwargs):
+        return super().dequeue_any(cls.prioritize(queues), *args, **kwargs)
+
+
 class CancellableQueue(BaseQueue):
     job_class = CancellableJob
 
 
-class RedashQueue(StatsdRecordingQueue, CancellableQueue):
+class RedashQueue(StatsdRecordingQueue, PrioritizedQueue, CancellableQueue):
     pass
 
 
@@ -59,6 +163,55 @@ class StatsdRecordingWorker(HerokuWorker):
                 statsd_client.incr("rq.jobs.failed.{}".format(queue.name))
 
 
+class ConcurrencyLimitingWorker(HerokuWorker):
+    """
+    Takes an execution slot for every query job before running it, so a data source
+    or an organization never runs more queries at once than it's allowed to (see
+    redash.concurrency). A job that doesn't get a slot is put back at the end of
+    its queue, letting the worker move on to the jobs of other data sources and
+    organizations.
+
+    The slot is taken in the worker rather than in the job itself: RQ marks a job
+    finished once it returns, so a job can't requeue itself.
+    """
+
+    requeue_delay = 0.1
+
+    def execute_job(self, job, queue):
+        if "data_source_id" not in job.meta:
+            record_lane_wait(job, queue)
+            return super().execute_job(job, queue)
+
+        data_source_id = job.meta["data_source_id"]
+        org_id = job.meta.get("org_id")
+        acquired = query_execution_slots.acquire(
+            job.id,
+            data_source_id,
+            org_id,
+            job.meta.get("max_concurrency"),
+            job.timeout,
+        )
+
+        if not acquired:
+            self.log.info(
+                "Data source %s is at its concurrency limit, requeueing job %s.",
+                data_source_id,
+                job.id,
+            )
+            queue.push_job_id(job.id)
+            statsd_client.incr("rq.jobs.requeued.{}".format(queue.name))
+            # don't spin on a queue that only holds jobs over the limit
+            time.sleep(self.requeue_delay)
+            return
+
+        # requeued jobs are taken again and again, their wait is recorded once
+        record_lane_wait(job, queue)
+        try:
+            super().execute_job(job, queue)
+        finally:
+            query_execution_slots.release(job.id, data_source_id, org_id)
+
+
 class HardLimitingWorker(HerokuWorker):
     """
     RQ's work horses enforce time limits by setting a timed alarm and stopping jobs
@@ -163,8 +316,151 @@ class HardLimitingWorker(HerokuWorker):
             )
 
 
-class RedashWorker(StatsdRecordingWorker, HardLimitingWorker):
+class LaneWorker(HerokuWorker):
+    """
+    RQ Worker Mixin that also listens on the embed lane queues of its queues
+    """
+
+    def __init__(self, queues, *args, **kwargs):
+        if isinstance(queues, (str, BaseQueue)):
+            queues = [queues]
+
+        super().__init__(with_lane_queues(queues), *args, **kwargs)
+
+
+class RedashWorker(
+    LaneWorker, ConcurrencyLimitingWorker, StatsdRecordingWorker, HardLimitingWorker
+):
+    queue_class = RedashQueue
+
+
+class WarmWorker(
+    LaneWorker, ConcurrencyLimitingWorker, StatsdRecordingWorker, SimpleWorker
+):
+    """
+    Runs jobs in the worker process instead of forking a work horse for every job,
+    so the worker's database connections and the connection pools of query runners
+    (see redash.query_runner.pool) stay warm between jobs. Used when
+    settings.RQ_WARM_WORKERS is enabled.
+
+    Without a work horse to kill, the time limits HardLimitingWorker enforces are
+    enforced on the job itself by a monitoring thread:
+    1. A job that is cancelled is interrupted (jobs running past their time limit
+       are interrupted by RQ's own alarm)
+    2. A job still running `grace_period` seconds after that, like a job blocked in
+       a call that never returns to Python, is failed and the worker exits to be
+       restarted by its supervisor
+
+    With `max_jobs` the worker stops after running that many jobs. Unlike RQ's own
+    `work(max_jobs=...)`, jobs requeued by ConcurrencyLimitingWorker don't count.
+    """
+
+    grace_period = 15
     queue_class = RedashQueue
+    job_class = CancellableJob
+    interrupt_signal = signal.SIGUSR1
+
+    def __init__(self, *args, max_jobs=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._job_running = False
+        self.max_jobs = max_jobs
+        self.performed_jobs = 0
+
+    def execute_job(self, job, queue):
+        self.set_state(WorkerStatus.BUSY)
+        try:
+            super().execute_job(job, queue)
+        finally:
+            self.set_state(WorkerStatus.IDLE)
+
+    def perform_job(self, job, queue, heartbeat_ttl=None):
+        # jobs may replace the worker's signal handlers (execute_query handles SIGINT)
+        sigint_handler = signal.getsignal(signal.SIGINT)
+        interrupt_handler = signal.signal(self.interrupt_signal, self.interrupt_job)
+        job_finished = threading.Event()
+        monitor = threading.Thread(
+            target=self.monitor_job, args=(job, job_finished), daemon=True
+        )
+
+        self._job_running = True
+        monitor.start()
+        try:
+            return super().perform_job(job, queue, heartbeat_ttl=heartbeat_ttl)
+        finally:
+            self._job_running = False
+            job_finished.set()
+            monitor.join()
+            signal.signal(signal.SIGINT, sigint_handler)
+            signal.signal(self.interrupt_signal, interrupt_handler)
+            models.db.session.remove()
+            connection_pools.evict()
+            self.report_connection_pools()
+
+            self.performed_jobs += 1
+            if self.max_jobs and self.performed_jobs >= self.max_jobs:
+                self.log.info(
+                    "Worker %s: performed %d jobs, quitting",
+                    self.key,
+                    self.performed_jobs,
+                )
+                self._stop_requested = True
+
+    def report_connection_pools(self):
+        redis_connection.hset(
+            CONNECTION_POOLS_STATUS_KEY,
+            self.name,
+            json_dumps({"updated_at": time.time(), "pools": connection_pools.stats()}),
+        )
+
+    def register_death(self):
+        redis_connection.hdel(CONNECTION_POOLS_STATUS_KEY, self.name)
+        super().register_death()
+
+    def interrupt_job(self, signum, frame):
+        # the job may have finished since it was interrupted
+        if self._job_running:
+            raise InterruptException
+
+    def is_cancelled(self, job):
+        try:
+            return self.job_class.fetch(job.id, connection=self.connection).is_cancelled
+        except NoSuchJobError:
+            return False
+
+    def monitor_job(self, job, job_finished):
+        started_at = time.monotonic()
+        interrupted_at = None
+
+        while not job_finished.wait(self.job_monitoring_interval):
+            self.heartbeat(self.job_monitoring_interval + 5)
+            now = time.monotonic()
+
+            if interrupted_at is None and self.is_cancelled(job):
+                self.log.warning("Job %s has been cancelled.", job.id)
+                os.kill(os.getpid(), self.interrupt_signal)
+                interrupted_at = now
+
+            deadlines = [] if interrupted_at is None else [interrupted_at]
+            if job.timeout != -1:
+                deadlines.append(started_at + job.timeout)
+
+            if deadlines and now > min(deadlines) + self.grace_period:
+                self.enforce_hard_limit(job)
+
+    def enforce_hard_limit(self, job):
+        self.log.warning(
+            "Job %s didn't stop %ds after its timeout or cancellation. "
+            "Failing it and restarting the worker.",
+            job.id,
+            self.grace_period,
+        )
+        self.handle_job_failure(
+            job,
+            exc_string="Job didn't stop after its timeout or cancellation, "
+            "its worker was restarted.",
+        )
+        self.register_death()
+        os._exit(1)
 
 
 Job = CancellableJob
@@ -0,0 +1,58 @@
+import functools
+import logging
+import zlib
+
+try:
+    import zstandard
+
+    zstd_available = True
+except ImportError:
+    zstd_available = False
+
+logger = logging.getLogger(__name__)
+
+ZSTD = "zstd"
+GZIP = "gzip"
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+@functools.lru_cache(maxsize=None)
+def resolve_codec(codec):
+    if codec not in (ZSTD, GZIP):
+        raise ValueError("Unknown compression codec: {}".format(codec))
+
+    if codec == ZSTD and not zstd_available:
+        logger.warning("zstandard isn't installed, compressing with gzip instead.")
+        return GZIP
+
+    return codec
+
+
+def compress(text, codec=GZIP, level=3):
+    """
+    Compresses `text` (UTF-8 encoded) with zstd or gzip. The codec doesn't
+    need to be remembered: `decompress` tells them apart by their header.
+    """
+    data = text.encode("utf-8")
+
+    if codec == ZSTD:
+        return zstandard.ZstdCompressor(level=level).compress(data)
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(data):
+    data = bytes(data)
+
+    if data.startswith(ZSTD_MAGIC):
+        if not zstd_available:
+            raise RuntimeError("zstandard is needed to read zstd compressed data.")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+
+    if data.startswith(GZIP_MAGIC):
+        return zlib.decompress(data, 16 + zlib.MAX_WBITS).decode("utf-8")
+
+    raise ValueError("Unknown compression format.")
@@ -1,9 +1,11 @@
+from sqlalchemy import event
+
 from tests import BaseTestCase
 
 from redash.models import ApiKey, Dashboard, AccessPermission, db
 from redash.permissions import ACCESS_TYPE_MODIFY
 from redash.serializers import serialize_dashboard, public_dashboard
-from redash.utils import json_loads
+from redash.utils import gen_query_hash, json_loads
 
 
 class TestDashboardListResource(BaseTestCase):
@@ -95,6 +97,59 @@ class TestDashboardResourceGet(BaseTestCase):
         rv = self.make_request("get", "/api/dashboards/-1")
         self.assertEqual(rv.status_code, 404)
 
+    def count_statements(self, path):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            rv = self.make_request("get", path)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+        self.assertEqual(rv.status_code, 200)
+        return len(statements)
+
+    def create_widgets(self, dashboard, count):
+        # every widget with its own data source, query and query author
+        for _ in range(count):
+            data_source = self.factory.create_data_source(
+                group=self.factory.default_group
+            )
+            query = self.factory.create_query(data_source=data_source)
+            self.factory.create_widget(
+                dashboard=dashboard,
+                visualization=self.factory.create_visualization(query_rel=query),
+            )
+
+    def test_loads_dashboards_in_a_fixed_number_of_statements(self):
+        dashboard = self.factory.create_dashboard()
+        self.create_widgets(dashboard, 2)
+        path = "/api/dashboards/{}".format(dashboard.id)
+        statements = self.count_statements(path)
+        self.assertLessEqual(statements, 20)
+
+        self.create_widgets(dashboard, 10)
+        self.assertEqual(self.count_statements(path), statements)
+        # served from the cache
+        self.assertLess(self.count_statements(path), statements)
+
+    def test_serves_changed_widgets(self):
+        widget = self.factory.create_widget()
+        path = "/api/dashboards/{}".format(widget.dashboard_id)
+        self.make_request("get", path)
+
+        widget.visualization.name = "Renamed"
+        widget.visualization.query_rel.user.name = "Renamed User"
+        db.session.commit()
+
+        rv = self.make_request("get", path)
+        visualization = rv.json["widgets"][0]["visualization"]
+        self.assertEqual(visualization["name"], "Renamed")
+        self.assertEqual(visualization["query"]["user"]["name"], "Renamed User")
+
 
 class TestDashboardResourcePost(BaseTestCase):
     def test_update_dashboard(self):
@@ -195,6 +250,161 @@ class TestDashboardEmbedGet(BaseTestCase):
         )
         self.assertEqual(rv.status_code, 401)
 
+class TestDashboardResultsResource(BaseTestCase):
+    def create_widget_with_result(self, dashboard):
+        query_result = self.factory.create_query_result()
+        query = self.factory.create_query(latest_query_data=query_result)
+        visualization = self.factory.create_visualization(query_rel=query)
+        return self.factory.create_widget(
+            dashboard=dashboard, visualization=visualization
+        )
+
+    def count_statements(self, path):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            rv = self.make_request("post", path, data={})
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+        self.assertEqual(rv.status_code, 200)
+        return len(statements)
+
+    def test_returns_latest_results(self):
+        dashboard = self.factory.create_dashboard()
+        widget = self.create_widget_with_result(dashboard)
+        text_widget = self.factory.create_widget(dashboard=dashboard, visualization=None)
+
+        rv = self.make_request(
+            "post", "/api/dashboards/{}/results".format(dashboard.id), data={}
+        )
+
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(
+            rv.json["widgets"][str(widget.id)]["query_result"]["id"],
+            widget.visualization.query_rel.latest_query_data_id,
+        )
+        self.assertNotIn(str(text_widget.id), rv.json["widgets"])
+
+    def test_applies_parameters(self):
+        dashboard = self.factory.create_dashboard()
+        query = self.factory.create_query_with_params(
+            options={"parameters": [{"name": "param1", "type": "number"}]}
+        )
+        visualization = self.factory.create_visualization(query_rel=query)
+        widget = self.factory.create_widget(
+            dashboard=dashboard, visualization=visualization
+        )
+        query_result = self.factory.create_query_result(
+            query_text="SELECT 1", query_hash=gen_query_hash("SELECT 1")
+        )
+
+        rv = self.make_request(
+            "post",
+            "/api/dashboards/{}/results".format(dashboard.id),
+            data={"widget_parameters": {str(widget.id): {"param1": 1}}},
+        )
+        self.assertEqual(
+            rv.json["widgets"][str(widget.id)]["query_result"]["id"], query_result.id
+        )
+
+        rv = self.make_request(
+            "post", "/api/dashboards/{}/results".format(dashboard.id), data={}
+        )
+        self.assertIn("param1", rv.json["widgets"][str(widget.id)]["job"]["error"])
+
+    def test_executes_queries_without_results(self):
+        dashboard = self.factory.create_dashboard()
+        widget = self.factory.create_widget(dashboard=dashboard)
+
+        rv = self.make_request(
+            "post", "/api/dashboards/{}/results".format(dashboard.id), data={}
+        )
+
+        self.assertIn("id", rv.json["widgets"][str(widget.id)]["job"])
+
+    def test_doesnt_return_results_of_restricted_data_sources(self):
+        dashboard = self.factory.create_dashboard()
+        restricted_ds = self.factory.create_data_source(
+            group=self.factory.create_group()
+        )
+        query_result = self.factory.create_query_result(data_source=restricted_ds)
+        query = self.factory.create_query(
+            data_source=restricted_ds, latest_query_data=query_result
+        )
+        widget = self.factory.create_widget(
+            dashboard=dashboard,
+            visualization=self.factory.create_visualization(query_rel=query),
+        )
+
+        rv = self.make_request(
+            "post", "/api/dashboards/{}/results".format(dashboard.id), data={}
+        )
+
+        self.assertNotIn("query_result", rv.json["widgets"][str(widget.id)])
+
+    def test_number_of_statements_doesnt_depend_on_widgets(self):
+        dashboard = self.factory.create_dashboard()
+        self.create_widget_with_result(dashboard)
+        path = "/api/dashboards/{}/results".format(dashboard.id)
+        statements = self.count_statements(path)
+
+        for _ in range(5):
+            self.create_widget_with_result(dashboard)
+
+        self.assertEqual(self.count_statements(path), statements)
+
+    def test_public_dashboard(self):
+        dashboard = self.factory.create_dashboard()
+        widget = self.create_widget_with_result(dashboard)
+        api_key = ApiKey.create_for_object(dashboard, self.factory.user)
+        db.session.commit()
+
+        rv = self.make_request(
+            "post",
+            "/api/dashboards/public/{}/results".format(api_key.api_key),
+            user=False,
+            data={},
+        )
+
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(
+            set(rv.json["widgets"][str(widget.id)]["query_result"].keys()),
+            {"id", "retrieved_at", "data"},
+        )
+
+    def test_embed_dashboard(self):
+        dashboard = self.factory.create_dashboard()
+        widget = self.create_widget_with_result(dashboard)
+        access_token = self.factory.create_access_token()
+
+        rv = self.make_request(
+            "post",
+            "/api/dashboards/{}/results?access_token={}".format(
+                dashboard.id, access_token
+            ),
+            user=False,
+            data={},
+        )
+
+        self.assertEqual(rv.status_code, 200)
+        self.assertIn("query_result", rv.json["widgets"][str(widget.id)])
+
+    def test_get_dashboard_with_results(self):
+        dashboard = self.factory.create_dashboard()
+        widget = self.create_widget_with_result(dashboard)
+
+        rv = self.make_request(
+            "get", "/api/dashboards/{}?with_results".format(dashboard.id)
+        )
+
+        self.assertIn("query_result", rv.json["widget_results"][str(widget.id)])
+
+
 class TestDashboardShareResourcePost(BaseTestCase):
     def test_creates_api_key(self):
         dashboard = self.factory.create_dashboard()
@@ -24,6 +24,45 @@ class TestDataSourceGetSchema(BaseTestCase):
         )
         self.assertEqual(response.status_code, 404)
 
+    def test_returns_pages_of_the_cached_schema(self):
+        data_source = self.factory.data_source
+        with patch.object(PostgreSQL, "get_schema") as get_schema:
+            get_schema.return_value = [
+                {"name": name, "columns": []} for name in ("users", "orders", "events")
+            ]
+            data_source.get_schema()
+
+        response = self.make_request(
+            "get", "/api/data_sources/{}/schema?page_size=2".format(data_source.id)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["count"], 3)
+        self.assertEqual(
+            [table["name"] for table in response.json["results"]], ["events", "orders"]
+        )
+
+        response = self.make_request(
+            "get", "/api/data_sources/{}/schema?q=ERS".format(data_source.id)
+        )
+        self.assertEqual(response.json["count"], 2)
+        self.assertEqual(
+            [table["name"] for table in response.json["results"]], ["orders", "users"]
+        )
+
+        response = self.make_request(
+            "get", "/api/data_sources/{}/schema".format(data_source.id)
+        )
+        self.assertEqual(len(response.json["schema"]), 3)
+
+    def test_rejects_out_of_range_page_sizes(self):
+        response = self.make_request(
+            "get",
+            "/api/data_sources/{}/schema?page_size=0".format(
+                self.factory.data_source.id
+            ),
+        )
+        self.assertEqual(response.status_code, 400)
+
 
 class TestDataSourceListGet(BaseTestCase):
     def test_returns_each_data_source_once(self):
@@ -109,6 +148,41 @@ class TestDataSourceResourcePost(BaseTestCase):
 
         self.assertEqual(rv.status_code, 400)
 
+    def test_updates_max_concurrency(self):
+        admin = self.factory.create_admin()
+        rv = self.make_request(
+            "post",
+            self.path,
+            data={
+                "name": "DS 1",
+                "type": "pg",
+                "options": {"dbname": "newdb"},
+                "max_concurrency": 3,
+            },
+            user=admin,
+        )
+
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.json["max_concurrency"], 3)
+        data_source = DataSource.query.get(self.factory.data_source.id)
+        self.assertEqual(data_source.max_concurrency, 3)
+
+    def test_returns_400_when_max_concurrency_invalid(self):
+        admin = self.factory.create_admin()
+        rv = self.make_request(
+            "post",
+            self.path,
+            data={
+                "name": "DS 1",
+                "type": "pg",
+                "options": {"dbname": "newdb"},
+                "max_concurrency": -1,
+            },
+            user=admin,
+        )
+
+        self.assertEqual(rv.status_code, 400)
+
     def test_updates_data_source(self):
         admin = self.factory.create_admin()
         new_name = "New Name"
@@ -327,6 +327,30 @@ class TestAPIPublicDashboard(BaseTestCase):
         )
         self.assertEqual(res.status_code, 200)
 
+    def test_serves_unchanged_dashboards_by_etag(self):
+        widget = self.factory.create_widget()
+        api_key = self.factory.create_api_key(object=widget.dashboard)
+        path = "/{}/api/dashboards/public/{}".format(
+            self.factory.org.slug, api_key.api_key
+        )
+
+        res = self.client.get(path)
+        self.assertEqual(res.status_code, 200)
+        etag = res.headers["ETag"]
+
+        res = self.client.get(path, headers={"If-None-Match": etag})
+        self.assertEqual(res.status_code, 304)
+
+        widget.visualization.query_rel.name = "Renamed"
+        db.session.commit()
+
+        res = self.client.get(path, headers={"If-None-Match": etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers["ETag"], etag)
+        self.assertEqual(
+            res.json["widgets"][0]["visualization"]["query"]["name"], "Renamed"
+        )
+
     def test_bad_token(self):
         res = self.make_request(
             "get", "/api/dashboards/public/bad-token", user=False, is_json=False
@@ -0,0 +1,48 @@
+import calendar
+import datetime
+
+from tests import BaseTestCase
+
+from redash.models import Event, db
+
+
+class TestEventCountsResource(BaseTestCase):
+    def test_returns_daily_counts(self):
+        day = datetime.date(2020, 1, 1)
+        Event.record_batch(
+            [
+                {
+                    "org_id": self.factory.org.id,
+                    "action": "view",
+                    "object_type": "dashboard",
+                    "object_id": dashboard_id,
+                    "timestamp": calendar.timegm(day.timetuple()),
+                }
+                for dashboard_id in [1, 1, 2]
+            ]
+        )
+        db.session.commit()
+
+        rv = self.make_request(
+            "get",
+            "/api/events/daily_counts?metric=dashboard_views"
+            "&from=2020-01-01&to=2020-01-31&object_id=1",
+            user=self.factory.create_admin(),
+        )
+
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(
+            rv.json["counts"], [{"day": "2020-01-01", "object_id": "1", "count": 2}]
+        )
+
+    def test_requires_a_known_metric(self):
+        rv = self.make_request(
+            "get",
+            "/api/events/daily_counts?metric=unknown",
+            user=self.factory.create_admin(),
+        )
+        self.assertEqual(rv.status_code, 400)
+
+    def test_requires_admin(self):
+        rv = self.make_request("get", "/api/events/daily_counts?metric=dashboard_views")
+        self.assertEqual(rv.status_code, 403)
@@ -43,6 +43,52 @@ class TestQueryResultsContentDispositionHeaders(BaseTestCase):
             self.fail(repr(e))
 
 
+class TestQueryResultsRowFormat(BaseTestCase):
+    def test_returns_array_rows_when_requested(self):
+        data = {
+            "columns": [{"name": "a", "type": None}, {"name": "b", "type": None}],
+            "rows": [{"a": 1, "b": 2}, {"a": 3}],
+        }
+        query_result = self.factory.create_query_result(data=json_dumps(data))
+        query = self.factory.create_query(latest_query_data=query_result)
+
+        rv = self.make_request(
+            "get", "/api/queries/{}/results.json?row_format=array".format(query.id)
+        )
+        self.assertEqual(rv.json["query_result"]["data"]["rows"], [[1, 2], [3, None]])
+        self.assertEqual(rv.json["query_result"]["data"]["row_format"], "array")
+
+        rv = self.make_request("get", "/api/queries/{}/results.json".format(query.id))
+        self.assertEqual(rv.json["query_result"]["data"], data)
+
+
+class TestQueryResultsETag(BaseTestCase):
+    def test_returns_not_modified_for_matching_etag(self):
+        query_result = self.factory.create_query_result()
+        path = "/api/query_results/{}.json".format(query_result.id)
+
+        rv = self.make_request("get", path)
+        self.assertEqual(rv.status_code, 200)
+        etag = rv.headers["ETag"]
+
+        rv = self.get_request(path, org=self.factory.org, headers={"If-None-Match": etag})
+        self.assertEqual(rv.status_code, 304)
+        self.assertEqual(rv.data, b"")
+
+    def test_etag_depends_on_row_format(self):
+        query_result = self.factory.create_query_result()
+        path = "/api/query_results/{}.json".format(query_result.id)
+
+        etag = self.make_request("get", path).headers["ETag"]
+        rv = self.get_request(
+            path + "?row_format=array",
+            org=self.factory.org,
+            headers={"If-None-Match": etag},
+        )
+        self.assertEqual(rv.status_code, 200)
+        self.assertNotEqual(rv.headers["ETag"], etag)
+
+
 class TestQueryResultListAPI(BaseTestCase):
     def test_get_existing_result(self):
         query_result = self.factory.create_query_result()
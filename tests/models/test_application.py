@@ -1,5 +1,17 @@
+import time
+
+from mock import patch
 from tests import BaseTestCase
-from redash.models import Application, ApplicationDashboard
+
+from redash import redis_connection
+from redash.models import (
+    AccessToken,
+    Application,
+    ApplicationDashboard,
+    db,
+    embed_auth_cache,
+)
+from redash.utils import json_dumps
 
 from sqlalchemy.orm.exc import NoResultFound
 
@@ -31,4 +43,63 @@ class TestApplicationDashboard(BaseTestCase):
         rv = ApplicationDashboard.check_dashboard_in_application(application.id, dashboard2.id)
         self.assertTrue(rv)
         rv = ApplicationDashboard.check_dashboard_in_application(application.id, dashboard1.id)
-        self.assertFalse(rv)
\ No newline at end of file
+        self.assertFalse(rv)
+
+class TestApplicationGetCachedBySecretKey(BaseTestCase):
+    def test_caches_applications(self):
+        application = self.factory.create_application()
+
+        with patch.object(
+            Application, "get_by_secret_key", wraps=Application.get_by_secret_key
+        ) as get_by_secret_key:
+            first = Application.get_cached_by_secret_key(application.secret_key)
+            second = Application.get_cached_by_secret_key(application.secret_key)
+
+        self.assertEqual(get_by_secret_key.call_count, 1)
+        self.assertIs(first, second)
+        self.assertEqual(first.secret_token, application.secret_token)
+
+    def test_revokes_changed_applications(self):
+        application = self.factory.create_application()
+        Application.get_cached_by_secret_key(application.secret_key)
+
+        application.regenerate_secret_token()
+        cached = Application.get_cached_by_secret_key(application.secret_key)
+        self.assertEqual(cached.secret_token, application.secret_token)
+
+        application.active = False
+        db.session.commit()
+        cached = Application.get_cached_by_secret_key(application.secret_key)
+        self.assertFalse(cached.is_active)
+
+    def test_revokes_applications_changed_by_other_processes(self):
+        application = self.factory.create_application()
+        Application.get_cached_by_secret_key(application.secret_key)
+
+        embed_auth_cache._handle_revocation(
+            {"data": json_dumps({"secret_keys": [application.secret_key]})}
+        )
+
+        self.assertIsNone(embed_auth_cache.get_application(application.secret_key))
+
+
+class TestEmbedAuthCacheAccessTokens(BaseTestCase):
+    def test_caches_valid_access_tokens(self):
+        access_token = self.factory.create_access_token()
+
+        self.assertTrue(embed_auth_cache.is_valid_access_token(access_token))
+        redis_connection.flushdb()
+        self.assertTrue(embed_auth_cache.is_valid_access_token(access_token))
+
+    def test_doesnt_cache_access_tokens_past_their_expiration(self):
+        access_token = AccessToken().new(1)
+
+        self.assertTrue(embed_auth_cache.is_valid_access_token(access_token))
+        with patch(
+            "redash.models.embed_auth_cache.time.time", return_value=time.time() + 2
+        ):
+            redis_connection.flushdb()
+            self.assertFalse(embed_auth_cache.is_valid_access_token(access_token))
+
+    def test_rejects_unknown_access_tokens(self):
+        self.assertFalse(embed_auth_cache.is_valid_access_token("unknown"))
@@ -1,5 +1,5 @@
 from tests import BaseTestCase
-from redash.models import db, Dashboard
+from redash.models import db, Dashboard, public_dashboard_cache
 
 
 class DashboardTest(BaseTestCase):
@@ -28,3 +28,57 @@ class DashboardTest(BaseTestCase):
             list(Dashboard.all_tags(self.factory.org, self.factory.user)),
             [("tag1", 3), ("tag2", 2), ("tag3", 1)],
         )
+
+
+class TestPublicDashboardCacheInvalidation(BaseTestCase):
+    def cache(self, dashboard):
+        generation, _, _ = public_dashboard_cache.get(dashboard.id)
+        public_dashboard_cache.set(dashboard.id, generation, "etag", "{}")
+
+    def is_cached(self, dashboard):
+        return public_dashboard_cache.get(dashboard.id)[2] is not None
+
+    def test_invalidated_by_changes_of_widgets_visualizations_and_queries(self):
+        widget = self.factory.create_widget()
+        dashboard = widget.dashboard
+
+        for change in [
+            lambda: setattr(widget, "text", "changed"),
+            lambda: setattr(widget.visualization, "name", "changed"),
+            lambda: setattr(widget.visualization.query_rel, "name", "changed"),
+            lambda: setattr(dashboard, "name", "changed"),
+        ]:
+            self.cache(dashboard)
+            change()
+            db.session.commit()
+            self.assertFalse(self.is_cached(dashboard))
+
+    def test_not_invalidated_by_new_query_results(self):
+        widget = self.factory.create_widget()
+        self.cache(widget.dashboard)
+
+        widget.visualization.query_rel.latest_query_data = (
+            self.factory.create_query_result()
+        )
+        db.session.commit()
+
+        self.assertTrue(self.is_cached(widget.dashboard))
+
+    def test_not_invalidated_by_rolled_back_changes(self):
+        widget = self.factory.create_widget()
+        self.cache(widget.dashboard)
+
+        widget.text = "changed"
+        db.session.flush()
+        db.session.rollback()
+
+        self.assertTrue(self.is_cached(widget.dashboard))
+
+    def test_discards_payloads_built_before_a_change(self):
+        dashboard = self.factory.create_dashboard()
+        generation, _, _ = public_dashboard_cache.get(dashboard.id)
+
+        public_dashboard_cache.invalidate([dashboard.id])
+        public_dashboard_cache.set(dashboard.id, generation, "etag", "{}")
+
+        self.assertFalse(self.is_cached(dashboard))
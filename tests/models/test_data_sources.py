@@ -2,7 +2,9 @@ import mock
 from mock import patch
 from tests import BaseTestCase
 
+from redash import redis_connection
 from redash.models import DataSource, Query, QueryResult
+from redash.utils import json_dumps
 from redash.utils.configuration import ConfigurationContainer
 
 
@@ -95,6 +97,126 @@ class DataSourceTest(BaseTestCase):
             self.assertEqual(out_schema, sorted_schema)
 
 
+class TestDataSourceSchemaCache(BaseTestCase):
+    def get_schema(self, schema, refresh=True):
+        with mock.patch(
+            "redash.query_runner.pg.PostgreSQL.get_schema", return_value=schema
+        ):
+            return self.factory.data_source.get_schema(refresh=refresh)
+
+    def test_stores_every_table_in_its_own_field(self):
+        self.get_schema([{"name": "b", "columns": []}, {"name": "a", "columns": []}])
+
+        data_source = self.factory.data_source
+        self.assertEqual(
+            sorted(redis_connection.hkeys(data_source._schema_key)), ["a", "b"]
+        )
+        self.assertEqual(
+            redis_connection.zrange(data_source._schema_names_key, 0, -1), ["a", "b"]
+        )
+
+    def test_only_writes_changed_tables(self):
+        self.get_schema(
+            [{"name": "a", "columns": ["x"]}, {"name": "b", "columns": ["y"]}]
+        )
+
+        with mock.patch("redash.redis_connection.pipeline") as pipeline:
+            pipe = pipeline.return_value
+            self.get_schema(
+                [{"name": "a", "columns": ["x"]}, {"name": "b", "columns": ["z"]}]
+            )
+
+        pipe.hmset.assert_any_call(
+            self.factory.data_source._schema_key,
+            {"b": json_dumps({"name": "b", "columns": ["z"]})},
+        )
+
+    def test_removes_dropped_tables(self):
+        self.get_schema([{"name": "a", "columns": []}, {"name": "b", "columns": []}])
+        schema = self.get_schema([{"name": "b", "columns": []}])
+
+        self.assertEqual(schema, [{"name": "b", "columns": []}])
+        self.assertEqual(
+            self.factory.data_source.get_cached_schema(), [{"name": "b", "columns": []}]
+        )
+        self.assertEqual(
+            redis_connection.zrange(
+                self.factory.data_source._schema_names_key, 0, -1
+            ),
+            ["b"],
+        )
+
+    def test_caches_empty_schemas(self):
+        self.get_schema([])
+
+        self.assertEqual(self.factory.data_source.get_cached_schema(), [])
+
+    def test_refreshes_incrementally_when_supported(self):
+        self.get_schema([{"name": "a", "columns": ["x"]}, {"name": "b", "columns": []}])
+
+        with mock.patch(
+            "redash.query_runner.pg.PostgreSQL.supports_incremental_schema", True
+        ), mock.patch(
+            "redash.query_runner.pg.PostgreSQL.get_schema_changes",
+            return_value=([{"name": "c", "columns": ["y", "x"]}], {"a", "c"}),
+        ) as get_schema_changes, mock.patch(
+            "redash.query_runner.pg.PostgreSQL.get_schema"
+        ) as get_schema:
+            schema = self.factory.data_source.get_schema(refresh=True)
+
+        get_schema.assert_not_called()
+        get_schema_changes.assert_called_once()
+        self.assertEqual(
+            schema,
+            [{"name": "a", "columns": ["x"]}, {"name": "c", "columns": ["x", "y"]}],
+        )
+
+    def test_refreshes_fully_after_the_full_refresh_interval(self):
+        self.get_schema([{"name": "a", "columns": []}])
+
+        with mock.patch(
+            "redash.query_runner.pg.PostgreSQL.supports_incremental_schema", True
+        ), mock.patch(
+            "redash.query_runner.pg.PostgreSQL.get_schema_changes"
+        ) as get_schema_changes, mock.patch(
+            "redash.models.settings.SCHEMAS_FULL_REFRESH_INTERVAL", 0
+        ):
+            self.get_schema([{"name": "b", "columns": []}])
+
+        get_schema_changes.assert_not_called()
+        self.assertEqual(
+            self.factory.data_source.get_cached_schema(), [{"name": "b", "columns": []}]
+        )
+
+    def test_returns_pages_of_tables(self):
+        self.get_schema([{"name": name, "columns": []} for name in "edcba"])
+        data_source = self.factory.data_source
+
+        tables, count = data_source.get_cached_schema_page(2, 2)
+
+        self.assertEqual(count, 5)
+        self.assertEqual([table["name"] for table in tables], ["c", "d"])
+        self.assertIsNone(self.factory.create_data_source().get_cached_schema_page(1, 2))
+
+    def test_filters_pages_by_name(self):
+        self.get_schema(
+            [
+                {"name": name, "columns": []}
+                for name in ("public.Users", "public.orders", "users_*", "events")
+            ]
+        )
+        data_source = self.factory.data_source
+
+        tables, count = data_source.get_cached_schema_page(1, 10, "USERS")
+        self.assertEqual(count, 2)
+        self.assertEqual(
+            [table["name"] for table in tables], ["public.Users", "users_*"]
+        )
+
+        tables, count = data_source.get_cached_schema_page(1, 10, "_*")
+        self.assertEqual([table["name"] for table in tables], ["users_*"])
+
+
 class TestDataSourceCreate(BaseTestCase):
     def test_adds_data_source_to_admin_group(self):
         data_source = DataSource.create_with_group(
@@ -0,0 +1,115 @@
+import calendar
+import datetime
+
+from tests import BaseTestCase
+
+from redash.models import DailyEventCount, Event, db, event_partitions
+
+
+class TestEventPartitions(BaseTestCase):
+    def record(self, created_at, **kwargs):
+        event = dict(
+            {
+                "org_id": self.factory.org.id,
+                "action": "view",
+                "object_type": "dashboard",
+                "object_id": 1,
+                "timestamp": calendar.timegm(created_at.timetuple()),
+            },
+            **kwargs
+        )
+        Event.record_batch([event])
+        db.session.commit()
+
+    def count(self, table):
+        return db.session.execute("SELECT count(*) FROM ONLY {}".format(table)).scalar()
+
+    def test_stores_events_in_the_partition_of_their_month(self):
+        created = event_partitions.create_event_partitions(
+            datetime.date(2020, 1, 15), 1
+        )
+        db.session.commit()
+        self.assertEqual(created, ["events_2020_01", "events_2020_02"])
+
+        self.record(datetime.datetime(2020, 1, 31, 23, 59))
+        self.record(datetime.datetime(2020, 2, 1))
+        self.record(datetime.datetime(2020, 3, 1))
+
+        self.assertEqual(self.count("events_2020_01"), 1)
+        self.assertEqual(self.count("events_2020_02"), 1)
+        # no partition for March
+        self.assertEqual(self.count("events"), 1)
+        self.assertEqual(Event.query.count(), 3)
+
+    def test_drops_partitions_of_old_events(self):
+        event_partitions.create_event_partitions(datetime.date(2020, 1, 1), 2)
+        db.session.commit()
+
+        dropped = event_partitions.drop_event_partitions(datetime.date(2020, 2, 15))
+        db.session.commit()
+
+        self.assertEqual(dropped, ["events_2020_01"])
+        self.assertEqual(
+            sorted(event_partitions.event_partitions()),
+            ["events_2020_02", "events_2020_03"],
+        )
+
+
+class TestDailyEventCount(BaseTestCase):
+    def event(self, action, object_type, object_id, day, **kwargs):
+        return dict(
+            {
+                "org_id": self.factory.org.id,
+                "action": action,
+                "object_type": object_type,
+                "object_id": object_id,
+                "timestamp": calendar.timegm(day.timetuple()),
+            },
+            **kwargs
+        )
+
+    def counts(self, metric):
+        return [
+            (count.day, count.object_id, count.count)
+            for count in DailyEventCount.counts(
+                self.factory.org,
+                metric,
+                datetime.date(2020, 1, 1),
+                datetime.date(2020, 1, 31),
+            )
+        ]
+
+    def test_counts_events_of_every_day(self):
+        first, second = datetime.date(2020, 1, 1), datetime.date(2020, 1, 2)
+        Event.record_batch(
+            [
+                self.event("view", "dashboard", 1, first),
+                self.event("view", "dashboard", 1, first),
+                self.event("view", "dashboard", 2, second),
+                self.event("view", "query", 1, first),
+            ]
+        )
+        Event.record_batch([self.event("view", "dashboard", 1, first)])
+        db.session.commit()
+
+        self.assertEqual(
+            self.counts(DailyEventCount.DASHBOARD_VIEWS),
+            [(first, "1", 3), (second, "2", 1)],
+        )
+
+    def test_counts_executions_per_data_source_and_application(self):
+        day = datetime.date(2020, 1, 1)
+        Event.record_batch(
+            [
+                self.event("execute_query", "data_source", 1, day, application_id=7),
+                self.event("execute_query", "data_source", 1, day),
+            ]
+        )
+        db.session.commit()
+
+        self.assertEqual(
+            self.counts(DailyEventCount.DATA_SOURCE_EXECUTIONS), [(day, "1", 2)]
+        )
+        self.assertEqual(
+            self.counts(DailyEventCount.APPLICATION_EXECUTIONS), [(day, "7", 1)]
+        )
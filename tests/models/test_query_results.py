@@ -4,8 +4,9 @@ from unittest import TestCase
 from tests import BaseTestCase
 from mock import patch
 
-from redash import models
-from redash.models import DBPersistence
+from redash import models, settings
+from redash.models import ChunkedPersistence, CompressedPersistence, DBPersistence
+from redash.models.query_result_cache import query_result_cache
 from redash.utils import utcnow, json_dumps
 
 
@@ -93,6 +94,112 @@ class QueryResultTest(BaseTestCase):
         self.assertEqual(original_updated_at, query.updated_at)
 
 
+class QueryResultCacheTest(BaseTestCase):
+    def store_result(self, query_text="SELECT 1", retrieved_at=None, data=None):
+        query_result = models.QueryResult.store_result(
+            self.factory.org.id,
+            self.factory.data_source,
+            models.gen_query_hash(query_text),
+            query_text,
+            data or json_dumps({"columns": [], "rows": []}),
+            1,
+            retrieved_at or utcnow(),
+        )
+        models.db.session.commit()
+        return query_result
+
+    def test_caches_stored_result_on_commit(self):
+        qr = self.store_result()
+
+        cached = query_result_cache.get(self.factory.data_source.id, qr.query_hash)
+
+        self.assertEqual(cached.id, qr.id)
+        self.assertEqual(cached.data, qr._data)
+
+    def test_doesnt_cache_result_before_commit(self):
+        models.QueryResult.store_result(
+            self.factory.org.id,
+            self.factory.data_source,
+            models.gen_query_hash("SELECT 1"),
+            "SELECT 1",
+            "{}",
+            1,
+            utcnow(),
+        )
+
+        self.assertIsNone(
+            query_result_cache.get(
+                self.factory.data_source.id, models.gen_query_hash("SELECT 1")
+            )
+        )
+
+    def test_get_latest_uses_cached_result(self):
+        qr = self.store_result()
+
+        with patch.object(models.QueryResult, "query") as query:
+            query.get.return_value = qr
+            query.options.return_value.filter.return_value.first.return_value = qr
+            found_query_result = models.QueryResult.get_latest(
+                self.factory.data_source, "SELECT 1", 60
+            )
+
+        self.assertEqual(found_query_result, qr)
+        query.filter.assert_not_called()
+
+    def test_get_latest_returns_newer_stored_result(self):
+        self.store_result(retrieved_at=utcnow() - datetime.timedelta(seconds=30))
+        models.QueryResult.get_latest(self.factory.data_source, "SELECT 1", 60)
+        qr = self.store_result()
+
+        found_query_result = models.QueryResult.get_latest(
+            self.factory.data_source, "SELECT 1", 60
+        )
+
+        self.assertEqual(found_query_result.id, qr.id)
+
+    def test_get_latest_ignores_cached_result_if_ttl_expired(self):
+        self.store_result(retrieved_at=utcnow() - datetime.timedelta(days=1))
+
+        found_query_result = models.QueryResult.get_latest(
+            self.factory.data_source, "SELECT 1", max_age=60
+        )
+
+        self.assertIsNone(found_query_result)
+
+    def test_get_latest_falls_back_to_database_on_miss(self):
+        qr = self.factory.create_query_result()
+
+        found_query_result = models.QueryResult.get_latest(
+            qr.data_source, qr.query_text, 60
+        )
+
+        self.assertEqual(found_query_result, qr)
+        self.assertEqual(
+            query_result_cache.get(qr.data_source.id, qr.query_hash).id, qr.id
+        )
+
+    def test_doesnt_cache_large_payloads(self):
+        data = json_dumps({"columns": [], "rows": [{"a": "x" * 100}]})
+        with patch.object(settings, "QUERY_RESULTS_CACHE_MAX_PAYLOAD_SIZE", 10):
+            qr = self.store_result(data=data)
+
+        cached = query_result_cache.get(self.factory.data_source.id, qr.query_hash)
+
+        self.assertEqual(cached.id, qr.id)
+        self.assertIsNone(cached.data)
+
+    def test_evicts_least_recently_used_entries(self):
+        with patch.object(settings, "QUERY_RESULTS_CACHE_MAX_ENTRIES", 1):
+            first = self.store_result("SELECT 1")
+            second = self.store_result("SELECT 2")
+
+        data_source_id = self.factory.data_source.id
+        self.assertIsNone(query_result_cache.get(data_source_id, first.query_hash))
+        self.assertEqual(
+            query_result_cache.get(data_source_id, second.query_hash).id, second.id
+        )
+
+
 class TestDBPersistence(TestCase):
     def test_updating_data_removes_cached_result(self):
         p = DBPersistence()
@@ -110,3 +217,118 @@ class TestDBPersistence(TestCase):
         a = p.data
         b = p.data
         json_loads_patch.assert_called_once_with(json_data)
+
+    def test_iter_rows_with_columns_and_range(self):
+        p = DBPersistence()
+        p.data = json_dumps(
+            {
+                "columns": [{"name": "a"}, {"name": "b"}],
+                "rows": [{"a": i, "b": i * 2} for i in range(5)],
+            }
+        )
+
+        self.assertEqual(p.row_count, 5)
+        self.assertEqual(
+            list(p.iter_rows(columns=["b"], offset=1, limit=2)), [{"b": 2}, {"b": 4}]
+        )
+
+    def test_stores_rows_as_arrays(self):
+        p = DBPersistence()
+        columns = [{"name": "a"}, {"name": "b"}]
+        p.store_rows(columns, [[(1, "x"), (2, "y")], [(3, "z")]])
+
+        self.assertTrue(p.has_array_rows)
+        self.assertEqual(
+            p.data,
+            {
+                "columns": columns,
+                "rows": [{"a": 1, "b": "x"}, {"a": 2, "b": "y"}, {"a": 3, "b": "z"}],
+            },
+        )
+        self.assertEqual(
+            p.get_data(as_arrays=True),
+            {"columns": columns, "rows": [[1, "x"], [2, "y"], [3, "z"]], "row_format": "array"},
+        )
+        self.assertEqual(list(p.iter_rows(columns=["b"], limit=1)), [{"b": "x"}])
+
+
+class TestChunkedPersistence(BaseTestCase):
+    def setUp(self):
+        super(TestChunkedPersistence, self).setUp()
+        self.result = {
+            "columns": [{"name": "a", "type": None}, {"name": "b", "type": None}],
+            "rows": [{"a": i, "b": "value {}".format(i)} for i in range(5)],
+        }
+
+    def store(self, data):
+        with patch.object(models.QueryResult, "data", ChunkedPersistence.data), patch.object(
+            settings, "QUERY_RESULTS_CHUNK_SIZE", 2
+        ):
+            qr = self.factory.create_query_result(data=json_dumps(data))
+            models.db.session.commit()
+        models.db.session.expire(qr)
+        return qr
+
+    def test_stores_rows_in_chunks(self):
+        qr = self.store(self.result)
+
+        self.assertTrue(qr.is_chunked)
+        self.assertIsNone(qr.get_raw_data())
+        self.assertEqual(qr.chunks.count(), 3)
+        self.assertEqual(qr.row_count, 5)
+        self.assertEqual(qr.columns, self.result["columns"])
+        self.assertEqual(qr.data, self.result)
+
+    def test_reads_columns_and_row_ranges(self):
+        qr = self.store(self.result)
+
+        self.assertEqual(
+            list(qr.iter_rows(columns=["a"], offset=1, limit=3)),
+            [{"a": 1}, {"a": 2}, {"a": 3}],
+        )
+        self.assertEqual(
+            qr.get_data(columns=["b"], offset=4),
+            {"columns": [{"name": "b", "type": None}], "rows": [{"b": "value 4"}]},
+        )
+
+    def test_stores_non_tabular_data_as_is(self):
+        qr = self.store([1, 2])
+
+        self.assertFalse(qr.is_chunked)
+        self.assertEqual(qr.chunks.count(), 0)
+        self.assertEqual(qr.data, [1, 2])
+
+
+class TestCompressedPersistence(BaseTestCase):
+    def setUp(self):
+        super(TestCompressedPersistence, self).setUp()
+        self.result = {
+            "columns": [{"name": "a", "type": None}],
+            "rows": [{"a": "value {}".format(i)} for i in range(100)],
+        }
+
+    def store(self, data):
+        with patch.object(models.QueryResult, "_text", CompressedPersistence._text):
+            qr = self.factory.create_query_result(data=json_dumps(data))
+            models.db.session.commit()
+        models.db.session.expire(qr)
+        return qr
+
+    def test_stores_compressed_data(self):
+        qr = self.store(self.result)
+
+        self.assertIsNone(qr._data)
+        self.assertLess(len(qr._compressed_data), len(json_dumps(self.result)))
+        self.assertEqual(qr.data, self.result)
+
+    def test_reads_uncompressed_results(self):
+        qr = self.factory.create_query_result(data=json_dumps(self.result))
+
+        with patch.object(models.QueryResult, "_text", CompressedPersistence._text):
+            self.assertEqual(qr.data, self.result)
+
+    def test_db_persistence_reads_compressed_results(self):
+        qr = self.store(self.result)
+
+        self.assertEqual(qr.get_raw_data(), json_dumps(self.result))
+        self.assertEqual(list(qr.iter_rows(offset=99)), [{"a": "value 99"}])
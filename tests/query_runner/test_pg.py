@@ -1,5 +1,8 @@
 from unittest import TestCase
-from redash.query_runner.pg import build_schema
+
+from mock import Mock, patch
+
+from redash.query_runner.pg import PostgreSQL, build_schema
 
 
 class TestBuildSchema(TestCase):
@@ -24,3 +27,62 @@ class TestBuildSchema(TestCase):
         self.assertListEqual(schema["main.users"]["columns"], ["id", "name"])
         self.assertIn('public."main.users"', schema.keys())
         self.assertListEqual(schema['public."main.users"']["columns"], ["id"])
+
+
+class FakeStreamingCursor(object):
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+        self.description = None
+        self.fetched = []
+
+    def execute(self, statement):
+        self.statements.append(statement)
+        self.description = None
+        if statement.startswith("FETCH"):
+            size = int(statement.split()[1])
+            self.description = [("a", 23)]
+            self.fetched, self.rows = self.rows[:size], self.rows[size:]
+
+    def fetchall(self):
+        return self.fetched
+
+    def close(self):
+        pass
+
+
+@patch("redash.query_runner.pg._wait")
+@patch.object(PostgreSQL, "iter_query_batch_size", 2)
+class TestIterQuery(TestCase):
+    def connect(self, rows):
+        cursor = FakeStreamingCursor(rows)
+        connection = Mock(closed=False)
+        connection.cursor.return_value = cursor
+        return PostgreSQL({}), connection, cursor
+
+    def test_fetches_rows_in_batches_from_a_server_side_cursor(self, _):
+        runner, connection, cursor = self.connect([(1,), (2,), (3,)])
+        stream = runner._iter_query(connection, "SELECT a FROM t;")
+
+        self.assertEqual([column["name"] for column in next(stream)], ["a"])
+        self.assertEqual(list(stream), [[(1,), (2,)], [(3,)]])
+        self.assertEqual(
+            cursor.statements,
+            [
+                "BEGIN",
+                "DECLARE redash_stream NO SCROLL CURSOR FOR SELECT a FROM t",
+                "FETCH 2 FROM redash_stream",
+                "FETCH 2 FROM redash_stream",
+                "COMMIT",
+            ],
+        )
+
+    def test_stops_fetching_when_the_consumer_stops(self, _):
+        runner, connection, cursor = self.connect([(i,) for i in range(10)])
+        stream = runner._iter_query(connection, "SELECT a FROM t")
+        next(stream)
+        next(stream)
+        stream.close()
+
+        self.assertEqual(cursor.statements.count("FETCH 2 FROM redash_stream"), 1)
+        self.assertEqual(cursor.statements[-1], "ROLLBACK")
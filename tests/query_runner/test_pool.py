@@ -0,0 +1,207 @@
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from redash.query_runner import BaseQueryRunner
+from redash.query_runner.pool import ConnectionPool, ConnectionPools, PoolTimeout
+
+
+class PooledQueryRunner(BaseQueryRunner):
+    supports_connection_pool = True
+
+    def __init__(self, configuration, data_source_id=None):
+        super().__init__(configuration)
+        self.data_source_id = data_source_id
+        self.opened = []
+
+    def _open_connection(self):
+        connection = Mock(closed=False)
+        self.opened.append(connection)
+        return connection
+
+    def _connection_is_usable(self, connection):
+        return not connection.closed
+
+
+class TestPooledConnection(TestCase):
+    def setUp(self):
+        self.pools = ConnectionPools()
+        patcher = patch("redash.query_runner.connection_pools", self.pools)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_opens_and_closes_a_connection_when_pools_are_disabled(self):
+        query_runner = PooledQueryRunner({"host": "db"})
+
+        with query_runner.pooled_connection() as first:
+            pass
+        with query_runner.pooled_connection() as second:
+            pass
+
+        self.assertIsNot(first, second)
+        first.close.assert_called_once_with()
+        second.close.assert_called_once_with()
+
+    def test_reuses_connections_of_the_same_configuration(self):
+        self.pools.enable()
+        query_runner = PooledQueryRunner({"host": "db"})
+
+        with query_runner.pooled_connection() as first:
+            pass
+        with PooledQueryRunner({"host": "db"}).pooled_connection() as second:
+            pass
+        with PooledQueryRunner({"host": "other-db"}).pooled_connection() as other:
+            pass
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+        first.close.assert_not_called()
+
+    def test_discards_connections_left_unusable(self):
+        self.pools.enable()
+        query_runner = PooledQueryRunner({"host": "db"})
+
+        with self.assertRaises(ValueError):
+            with query_runner.pooled_connection() as failed:
+                raise ValueError()
+
+        with query_runner.pooled_connection() as broken:
+            broken.closed = True
+
+        with query_runner.pooled_connection() as connection:
+            pass
+
+        failed.close.assert_called_once_with()
+        broken.close.assert_called_once_with()
+        self.assertEqual(len(query_runner.opened), 3)
+        self.assertNotIn(connection, [failed, broken])
+
+    def test_closing_pools_closes_idle_connections(self):
+        self.pools.enable()
+        query_runner = PooledQueryRunner({"host": "db"})
+        with query_runner.pooled_connection() as connection:
+            pass
+
+        self.pools.close()
+
+        connection.close.assert_called_once_with()
+
+    def test_replaces_the_pool_of_a_data_source_whose_options_changed(self):
+        self.pools.enable()
+
+        with PooledQueryRunner({"host": "db"}, 1).pooled_connection() as previous:
+            pass
+        with PooledQueryRunner({"host": "new-db"}, 1).pooled_connection() as current:
+            pass
+
+        self.assertIsNot(previous, current)
+        previous.close.assert_called_once_with()
+        self.assertEqual(list(self.pools.stats()), ["data_source:1"])
+
+    def test_resets_connections_before_reuse(self):
+        self.pools.enable()
+        query_runner = PooledQueryRunner({"host": "db"})
+
+        with patch.object(query_runner, "_reset_connection") as reset_connection:
+            with query_runner.pooled_connection() as connection:
+                pass
+
+        reset_connection.assert_called_once_with(connection)
+
+
+class TestConnectionPool(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = patch(
+            "redash.query_runner.pool.time.monotonic", side_effect=lambda: self.now
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.check = Mock(return_value=True)
+        self.pool = ConnectionPool(
+            connect=lambda: Mock(),
+            close=lambda connection: connection.close(),
+            check=self.check,
+            max_size=2,
+            max_idle_time=60,
+            max_lifetime=600,
+            check_after=10,
+            timeout=0,
+        )
+
+    def test_is_bounded(self):
+        self.pool.acquire()
+        self.pool.acquire()
+
+        with self.assertRaises(PoolTimeout):
+            self.pool.acquire()
+
+    def test_waits_for_released_connections(self):
+        first = self.pool.acquire()
+        self.pool.acquire()
+        self.pool.release(first)
+
+        self.assertIs(self.pool.acquire(), first)
+
+    def test_evicts_idle_connections(self):
+        connection = self.pool.acquire()
+        self.pool.release(connection)
+
+        self.now += 61
+        self.pool.evict()
+
+        connection.close.assert_called_once_with()
+        self.assertEqual(self.pool.stats()["size"], 0)
+        self.assertEqual(self.pool.stats()["evicted"], 1)
+
+    def test_closes_connections_past_their_lifetime(self):
+        connection = self.pool.acquire()
+
+        self.now += 601
+        self.pool.release(connection)
+
+        connection.close.assert_called_once_with()
+        self.assertIsNot(self.pool.acquire(), connection)
+
+    def test_checks_connections_idle_for_a_while(self):
+        connection = self.pool.acquire()
+        self.pool.release(connection)
+        self.assertIs(self.pool.acquire(), connection)
+        self.check.assert_not_called()
+        self.pool.release(connection)
+
+        self.now += 11
+        self.check.return_value = False
+        replacement = self.pool.acquire()
+
+        self.check.assert_called_once_with(connection)
+        connection.close.assert_called_once_with()
+        self.assertIsNot(replacement, connection)
+        self.assertEqual(self.pool.stats()["failed_checks"], 1)
+
+    def test_closing_the_pool_closes_connections_in_use_once_released(self):
+        idle = self.pool.acquire()
+        in_use = self.pool.acquire()
+        self.pool.release(idle)
+
+        self.pool.close()
+        idle.close.assert_called_once_with()
+        in_use.close.assert_not_called()
+
+        self.pool.release(in_use)
+        in_use.close.assert_called_once_with()
+        self.assertEqual(self.pool.stats()["size"], 0)
+
+    def test_stats(self):
+        connection = self.pool.acquire()
+        self.pool.release(connection)
+        self.pool.acquire()
+
+        stats = self.pool.stats()
+
+        self.assertEqual(stats["opened"], 1)
+        self.assertEqual(stats["reused"], 1)
+        self.assertEqual(stats["in_use"], 1)
+        self.assertEqual(stats["idle"], 0)
+        self.assertEqual(stats["max_size"], 2)
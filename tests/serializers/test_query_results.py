@@ -1,12 +1,25 @@
 import datetime
 import csv
 import io
+from unittest import TestCase
+
+from mock import patch
 
 from tests import BaseTestCase
 
 from redash import models
-from redash.utils import utcnow, json_dumps
-from redash.serializers import serialize_query_result, serialize_query_result_to_dsv
+from redash.utils import utcnow, json_dumps, json_loads
+from redash.serializers import (
+    serialize_query_result,
+    serialize_query_result_to_dsv,
+    serialize_query_result_to_json,
+    iter_query_result_dsv,
+)
+from redash.serializers.query_result import (
+    _convert_datetime,
+    _convert_format,
+    _datetime_column_converter,
+)
 
 
 data = {
@@ -37,6 +50,55 @@ class QueryResultSerializationTest(BaseTestCase):
         self.assertSetEqual(set(["data", "retrieved_at", "id"]), set(serialized.keys()))
 
 
+class JsonSerializationTest(BaseTestCase):
+    def assert_same_as_serialized(self, query_result, is_api_user, as_arrays=False):
+        expected = json_loads(
+            json_dumps(
+                {
+                    "query_result": serialize_query_result(
+                        query_result, is_api_user, as_arrays
+                    )
+                }
+            )
+        )
+        serialized = serialize_query_result_to_json(
+            query_result, is_api_user, as_arrays
+        )
+        self.assertEqual(json_loads(serialized), expected)
+
+    def test_splices_stored_data(self):
+        query_result = self.factory.create_query_result(data=json_dumps(data))
+
+        with patch("redash.serializers.query_result.serialize_query_result") as s:
+            serialize_query_result_to_json(query_result, False)
+        s.assert_not_called()
+
+        self.assert_same_as_serialized(query_result, False)
+        self.assert_same_as_serialized(query_result, True)
+
+    def test_splices_stored_array_rows(self):
+        query_result = models.QueryResult()
+        query_result.store_rows(data["columns"], [[[1, 2, 3]]])
+        self.assertIsNotNone(query_result.get_raw_data(as_arrays=True))
+
+        self.assert_same_as_serialized(query_result, False, as_arrays=True)
+        self.assert_same_as_serialized(query_result, False)
+
+    def test_falls_back_when_rows_need_converting(self):
+        query_result = self.factory.create_query_result(data=json_dumps(data))
+        self.assertIsNone(query_result.get_raw_data(as_arrays=True))
+
+        self.assert_same_as_serialized(query_result, False, as_arrays=True)
+        self.assert_same_as_serialized(query_result, True, as_arrays=True)
+
+    def test_falls_back_when_the_row_format_is_unknown(self):
+        query_result = self.factory.create_query_result(data=json_dumps(data))
+        query_result.row_format = None
+        self.assertIsNone(query_result.get_raw_data())
+
+        self.assert_same_as_serialized(query_result, False)
+
+
 class DsvSerializationTest(BaseTestCase):
     def delimited_content(self, delimiter):
         query_result = self.factory.create_query_result(data=json_dumps(data))
@@ -81,3 +143,83 @@ class DsvSerializationTest(BaseTestCase):
         self.assertEqual(rows[1]["bool"], "false")
         self.assertEqual(rows[2]["date"], "")
         self.assertEqual(rows[3]["datetime"], "459")
+
+    def test_streams_in_chunks(self):
+        query_result = self.factory.create_query_result(data=json_dumps(data))
+        with self.app.test_request_context("/"), patch(
+            "redash.serializers.query_result.EXPORT_CHUNK_SIZE", 10
+        ):
+            chunks = list(iter_query_result_dsv(query_result, ","))
+            expected = serialize_query_result_to_dsv(query_result, ",")
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), expected)
+
+    def test_doesnt_modify_result_rows(self):
+        query_result = self.factory.create_query_result(data=json_dumps(data))
+        with self.app.test_request_context("/"):
+            serialize_query_result_to_dsv(query_result, ",")
+
+        self.assertEqual(query_result.data, data)
+
+
+class DatetimeColumnConversionTest(TestCase):
+    values = [
+        "2019-05-26T12:39:23.026Z",
+        "2019-05-26T12:39:23.026",
+        "2019-05-26T12:39:23.026123",
+        "2019-05-26T12:39:23.0261234Z",
+        "2019-05-26T12:39:23,026",
+        "2019-05-26T12:39:23",
+        "2019-05-26T12:39",
+        "2019-05-26T12",
+        "2019-05-26 12:39:23",
+        "2019-05-26T12:39:23+02:00",
+        "2019-05-26T12:39:23-0530",
+        "2019-05-26T24:00:00",
+        "2019-05-26",
+        "20190526",
+        "20190526T123923",
+        "2019-W21-7",
+        "2019-05",
+        "2019",
+        "2019-02-30",
+        "26/05/2019",
+        "May 26, 2019",
+        "not a date",
+        "459",
+        "",
+        None,
+        459,
+        12.5,
+        True,
+        False,
+        ["2019-05-26"],
+        {"date": "2019-05-26"},
+    ]
+
+    formats = [
+        "DD/MM/YY",
+        "DD/MM/YY HH:mm",
+        "YYYY-MM-DD HH:mm:ss",
+        "YYYY-MM-DD HH:mm:ss.SSS",
+        "MM/DD/YYYY",
+    ]
+
+    def test_matches_scalar_conversion(self):
+        for fmt in map(_convert_format, self.formats):
+            expected = [_convert_datetime(value, fmt) for value in self.values]
+            convert = _datetime_column_converter(fmt)
+
+            self.assertEqual(convert(self.values), expected, fmt)
+            # a second pass is served from the memoized values
+            self.assertEqual(convert(self.values), expected, fmt)
+
+    def test_doesnt_mix_up_equal_values_of_different_types(self):
+        fmt = _convert_format("DD/MM/YY")
+        values = [1, True, 1.0, "1"]
+
+        self.assertEqual(
+            _datetime_column_converter(fmt)(values),
+            [_convert_datetime(value, fmt) for value in values],
+        )
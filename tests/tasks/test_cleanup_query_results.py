@@ -0,0 +1,63 @@
+import datetime
+
+from mock import patch
+from tests import BaseTestCase
+
+from redash import models, redis_connection, settings
+from redash.tasks.queries.maintenance import CLEANUP_CURSOR_KEY, cleanup_query_results
+from redash.utils import utcnow
+
+
+class TestCleanupQueryResults(BaseTestCase):
+    def create_old_query_result(self):
+        return self.factory.create_query_result(
+            retrieved_at=utcnow() - datetime.timedelta(days=30)
+        )
+
+    def ids(self):
+        return set(id for id, in models.db.session.query(models.QueryResult.id))
+
+    def test_deletes_old_unused_results(self):
+        self.create_old_query_result()
+        used = self.create_old_query_result()
+        self.factory.create_query(latest_query_data=used)
+        recent = self.factory.create_query_result()
+        models.db.session.commit()
+
+        deleted_count, deleted_bytes = cleanup_query_results()
+
+        self.assertEqual(deleted_count, 1)
+        self.assertGreater(deleted_bytes, 0)
+        self.assertEqual(self.ids(), {used.id, recent.id})
+        # the whole table was walked, so the next run starts over
+        self.assertIsNone(redis_connection.get(CLEANUP_CURSOR_KEY))
+
+    def test_resumes_from_cursor_after_time_budget(self):
+        first = self.create_old_query_result()
+        second = self.create_old_query_result()
+        models.db.session.commit()
+        first_id, second_id = first.id, second.id
+        redis_connection.set(CLEANUP_CURSOR_KEY, first_id)
+
+        with patch.object(settings, "QUERY_RESULTS_CLEANUP_BATCH_SIZE", 1):
+            self.assertEqual(cleanup_query_results(time_budget=1e-9)[0], 1)
+            self.assertEqual(
+                int(redis_connection.get(CLEANUP_CURSOR_KEY)), first_id + 1
+            )
+            self.assertEqual(self.ids(), {second_id})
+
+            cleanup_query_results(time_budget=0)
+
+        self.assertEqual(self.ids(), set())
+
+    def test_starts_from_lowest_id_without_cursor(self):
+        result = self.create_old_query_result()
+        models.db.session.commit()
+
+        with patch.object(
+            models.QueryResult, "delete_unused", return_value=(0, 0)
+        ) as delete_unused:
+            cleanup_query_results(time_budget=0)
+
+        start, end, _ = delete_unused.call_args_list[0][0]
+        self.assertEqual(start, result.id)
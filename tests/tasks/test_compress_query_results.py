@@ -0,0 +1,50 @@
+from mock import patch
+from tests import BaseTestCase
+
+from redash import models, redis_connection, settings
+from redash.models import CompressedPersistence
+from redash.tasks.queries.maintenance import (
+    COMPRESSION_CURSOR_KEY,
+    compress_query_results,
+)
+from redash.utils import json_dumps
+
+
+class TestCompressQueryResults(BaseTestCase):
+    def compress(self):
+        with patch.object(
+            models.QueryResult, "_text", CompressedPersistence._text
+        ), patch.object(models.QueryResult, "compresses_data", True):
+            compress_query_results()
+        models.db.session.expire_all()
+
+    def test_compresses_results_in_batches(self):
+        data = json_dumps({"columns": [{"name": "a"}], "rows": [{"a": 1}]})
+        query_results = [
+            self.factory.create_query_result(data=data) for _ in range(5)
+        ]
+        models.db.session.commit()
+
+        with patch.object(
+            settings, "QUERY_RESULTS_COMPRESSION_BATCH_SIZE", 2
+        ), patch.object(settings, "QUERY_RESULTS_COMPRESSION_BATCHES", 2):
+            self.compress()
+
+        compressed = [qr for qr in query_results if qr._data is None]
+        self.assertEqual(len(compressed), 4)
+        self.assertEqual(
+            int(redis_connection.get(COMPRESSION_CURSOR_KEY)), query_results[3].id
+        )
+        for qr in query_results:
+            self.assertEqual(qr.get_raw_data(), data)
+
+        self.compress()
+        self.assertTrue(all(qr._data is None for qr in query_results))
+
+    def test_does_nothing_unless_results_are_compressed(self):
+        qr = self.factory.create_query_result()
+        models.db.session.commit()
+
+        compress_query_results()
+
+        self.assertIsNotNone(qr._data)
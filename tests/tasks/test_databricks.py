@@ -0,0 +1,235 @@
+import threading
+import time
+
+import mock
+from mock import patch
+from tests import BaseTestCase
+
+from redash import settings
+from redash.tasks.databricks import (
+    fetch_tables_columns,
+    metadata_cache,
+    prefetch_databricks_metadata,
+    refresh_database,
+)
+
+
+class FakeCursor(object):
+    def __init__(self):
+        self.connection = mock.Mock()
+
+
+class FakeDatabricks(object):
+    def __init__(self, tables):
+        self.tables = tables
+        self.cursors = []
+        self.threads = set()
+        self.bulk_calls = 0
+
+    def _get_cursor(self):
+        cursor = FakeCursor()
+        self.cursors.append(cursor)
+        return cursor
+
+    def get_database_tables(self, database_name):
+        return [
+            {"name": "{}.{}".format(database_name, table_name), "columns": []}
+            for table_name in self.tables
+        ]
+
+    def get_database_tables_with_columns(self, database_name):
+        self.bulk_calls += 1
+        return [
+            {
+                "name": "{}.{}".format(database_name, table_name),
+                "columns": [{"name": column, "type": "string"} for column in columns],
+            }
+            for table_name, columns in self.tables.items()
+        ]
+
+    def get_table_columns(self, database_name, table_name, cursor=None):
+        self.threads.add(threading.current_thread())
+        if self.tables[table_name] is None:
+            raise Exception("Table not found.")
+        return [
+            {"name": column, "type": "string"} for column in self.tables[table_name]
+        ]
+
+
+class TestDatabricksMetadataCache(BaseTestCase):
+    def test_serves_stale_entries_until_they_expire(self):
+        metadata_cache.set_databases(1, ["default"])
+        self.assertEqual(metadata_cache.get_databases(1), (["default"], True))
+
+        with patch(
+            "redash.tasks.databricks.time.time", return_value=time.time() + 700
+        ):
+            self.assertEqual(metadata_cache.get_databases(1), (["default"], False))
+
+        with patch(
+            "redash.tasks.databricks.time.time", return_value=time.time() + 90000
+        ):
+            self.assertEqual(metadata_cache.get_databases(1), (None, False))
+
+    def test_merges_tables_with_their_cached_columns(self):
+        metadata_cache.set_tables(1, "db", ["db.a", "db.b"])
+        metadata_cache.set_table_columns(1, "db", {"a": [{"name": "x"}]})
+
+        schema, has_columns, fresh = metadata_cache.get_tables(1, "db")
+
+        self.assertEqual(
+            schema,
+            [
+                {"name": "db.a", "columns": [{"name": "x"}]},
+                {"name": "db.b", "columns": []},
+            ],
+        )
+        self.assertFalse(has_columns)
+        self.assertFalse(fresh)
+        self.assertEqual(
+            metadata_cache.stale_tables(1, "db", ["db.a", "db.b"]), ["db.b"]
+        )
+
+    def test_removes_the_columns_of_dropped_tables(self):
+        metadata_cache.set_tables(1, "db", ["db.a", "db.b"])
+        metadata_cache.set_table_columns(1, "db", {"a": [], "b": []})
+
+        metadata_cache.set_tables(1, "db", ["db.a"])
+
+        self.assertEqual(metadata_cache.get_table_columns(1, "db", "b"), (None, False))
+        self.assertEqual(
+            metadata_cache.get_tables(1, "db"),
+            ([{"name": "db.a", "columns": []}], True, True),
+        )
+
+    def test_enqueues_a_single_refresh_job(self):
+        func = mock.Mock()
+        func.delay.return_value.id = "job-id"
+
+        with patch("redash.tasks.databricks.Job.fetch") as fetch:
+            fetch.return_value.get_status.return_value = "started"
+            first = metadata_cache.enqueue_refresh("refresh-key", func, 1)
+            second = metadata_cache.enqueue_refresh("refresh-key", func, 1)
+
+            fetch.return_value.get_status.return_value = "finished"
+            metadata_cache.enqueue_refresh("refresh-key", func, 1)
+
+        self.assertEqual(first, func.delay.return_value)
+        self.assertEqual(second, fetch.return_value)
+        self.assertEqual(func.delay.call_count, 2)
+
+    def test_forced_refreshes_dont_share_jobs_with_refreshes_of_stale_tables(self):
+        with patch(
+            "redash.tasks.databricks.get_database_tables_with_columns"
+        ) as func, patch("redash.tasks.databricks.Job.fetch") as fetch:
+            func.delay.return_value.id = "job-id"
+            fetch.return_value.get_status.return_value = "started"
+            metadata_cache.refresh_tables(1, "db")
+            metadata_cache.refresh_tables(1, "db", force=True)
+
+        self.assertEqual(func.delay.call_count, 2)
+
+    def test_lists_recently_used_databases(self):
+        metadata_cache.record_use(1, "old")
+        metadata_cache.record_use(2, "new")
+
+        self.assertEqual(metadata_cache.recently_used(1), [(2, "new")])
+        self.assertEqual(metadata_cache.recently_used(5), [(2, "new"), (1, "old")])
+
+
+class TestFetchTablesColumns(BaseTestCase):
+    def test_fetches_columns_concurrently_and_skips_failures(self):
+        tables = {"t{}".format(i): ["c{}".format(i)] for i in range(20)}
+        tables["missing"] = None
+        query_runner = FakeDatabricks(tables)
+
+        with patch(
+            "redash.tasks.databricks.settings.DATABRICKS_METADATA_FETCH_THREADS", 4
+        ):
+            columns = fetch_tables_columns(query_runner, "db", list(tables))
+
+        self.assertEqual(set(columns), set(tables) - {"missing"})
+        self.assertEqual(columns["t3"], [{"name": "c3", "type": "string"}])
+        self.assertLessEqual(len(query_runner.threads), 4)
+        # a connection for every thread, all closed once done
+        self.assertEqual(len(query_runner.cursors), len(query_runner.threads))
+        for cursor in query_runner.cursors:
+            cursor.connection.close.assert_called_once()
+
+    def test_stores_columns_in_batches_as_they_are_fetched(self):
+        tables = {"t{}".format(i): ["c{}".format(i)] for i in range(5)}
+        stored = []
+
+        with patch("redash.tasks.databricks.STORE_COLUMNS_BATCH_SIZE", 2):
+            fetch_tables_columns(
+                FakeDatabricks(tables), "db", list(tables), store=stored.append
+            )
+
+        self.assertEqual([len(columns) for columns in stored], [2, 2, 1])
+
+
+class TestRefreshDatabase(BaseTestCase):
+    def data_source(self, tables):
+        return mock.Mock(id=1, query_runner=FakeDatabricks(tables))
+
+    def test_only_fetches_stale_columns(self):
+        metadata_cache.set_tables(1, "db", ["db.a"])
+        metadata_cache.set_table_columns(1, "db", {"a": [{"name": "x"}]})
+        data_source = self.data_source({"a": ["y"], "b": ["z"]})
+
+        schema = refresh_database(data_source, "db")
+
+        self.assertEqual(
+            schema,
+            [
+                {"name": "db.a", "columns": [{"name": "x"}]},
+                {"name": "db.b", "columns": [{"name": "z", "type": "string"}]},
+            ],
+        )
+
+        schema = refresh_database(data_source, "db", force=True)
+        self.assertEqual(schema[0]["columns"], [{"name": "y", "type": "string"}])
+        self.assertEqual(data_source.query_runner.bulk_calls, 1)
+        self.assertEqual(len(data_source.query_runner.cursors), 1)
+
+    def test_lists_the_columns_of_all_stale_tables_at_once(self):
+        data_source = self.data_source({"a": ["x"], "b": ["y"]})
+
+        schema = refresh_database(data_source, "db")
+
+        self.assertEqual(schema[1]["columns"], [{"name": "y", "type": "string"}])
+        self.assertEqual(data_source.query_runner.bulk_calls, 1)
+        self.assertEqual(data_source.query_runner.cursors, [])
+
+    def test_doesnt_cache_missing_databases(self):
+        self.assertEqual(refresh_database(self.data_source({}), "db"), [])
+        self.assertFalse(metadata_cache.has_tables(1, "db"))
+
+
+class TestPrefetchDatabricksMetadata(BaseTestCase):
+    def test_refreshes_stale_recently_used_databases(self):
+        metadata_cache.set_tables(1, "fresh", ["fresh.a"])
+        metadata_cache.set_table_columns(1, "fresh", {"a": []})
+        metadata_cache.record_use(1, "fresh")
+        metadata_cache.record_use(1, "stale")
+
+        with patch.object(metadata_cache, "refresh_tables") as refresh_tables:
+            prefetch_databricks_metadata()
+
+        refresh_tables.assert_called_once_with(
+            1, "stale", fresh_time=settings.DATABRICKS_METADATA_FRESH_TIME * 0.8
+        )
+
+    def test_refreshes_recently_used_databases_about_to_go_stale(self):
+        metadata_cache.set_tables(1, "db", ["db.a"])
+        metadata_cache.set_table_columns(1, "db", {"a": []})
+        metadata_cache.record_use(1, "db")
+
+        refreshed_at = time.time() - settings.DATABRICKS_METADATA_FRESH_TIME * 0.9
+        with patch("time.time", return_value=refreshed_at):
+            metadata_cache.set_tables(1, "db", ["db.a"])
+
+        with patch.object(metadata_cache, "refresh_tables") as refresh_tables:
+            prefetch_databricks_metadata()
+
+        refresh_tables.assert_called_once()
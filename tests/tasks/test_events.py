@@ -0,0 +1,219 @@
+import datetime
+import time
+
+from mock import patch
+from tests import BaseTestCase
+
+from redash import models, redis_connection
+from redash.models import event_partitions
+from redash.tasks.events import (
+    EVENTS_BUFFER_KEY,
+    EVENTS_FLUSHING_KEY,
+    FLUSH_EVENTS_LEASE_KEY,
+    WEBHOOK_RETRIES_KEY,
+    buffer_event,
+    flush_events,
+    manage_event_partitions,
+)
+from redash.utils import json_dumps
+
+
+class TestFlushEvents(BaseTestCase):
+    def event(self, action="view", **kwargs):
+        return dict(
+            {
+                "org_id": self.factory.org.id,
+                "user_id": self.factory.user.id,
+                "action": action,
+                "object_type": "dashboard",
+                "object_id": 1,
+                "timestamp": int(time.time()),
+            },
+            **kwargs
+        )
+
+    def test_stores_buffered_events_in_batches(self):
+        for i in range(5):
+            buffer_event(self.event(action="view_{}".format(i)))
+
+        with patch("redash.tasks.events.settings.EVENTS_FLUSH_BATCH_SIZE", 2), patch(
+            "redash.models.Event.record_batch", wraps=models.Event.record_batch
+        ) as record_batch:
+            flush_events()
+
+        self.assertEqual(record_batch.call_count, 3)
+        self.assertEqual(
+            sorted(event.action for event in models.Event.query),
+            ["view_{}".format(i) for i in range(5)],
+        )
+        self.assertEqual(redis_connection.llen(EVENTS_BUFFER_KEY), 0)
+        self.assertEqual(redis_connection.llen(EVENTS_FLUSHING_KEY), 0)
+
+    def test_keeps_additional_properties(self):
+        buffer_event(self.event(user_agent="Mozilla", ip="127.0.0.1"))
+
+        flush_events()
+
+        event = models.Event.query.one()
+        self.assertEqual(
+            event.additional_properties, {"user_agent": "Mozilla", "ip": "127.0.0.1"}
+        )
+
+    def test_drops_events_that_cant_be_stored(self):
+        buffer_event(self.event(action="first"))
+        buffer_event(self.event(action="invalid", org_id=None, user_id=-1))
+        buffer_event(self.event(action="last"))
+
+        flush_events()
+
+        self.assertEqual(
+            sorted(event.action for event in models.Event.query), ["first", "last"]
+        )
+
+    def test_stores_the_batch_of_a_flush_that_died(self):
+        redis_connection.rpush(
+            EVENTS_FLUSHING_KEY,
+            json_dumps({"buffered_at": time.time(), "event": self.event()}),
+        )
+
+        flush_events()
+
+        self.assertEqual(models.Event.query.count(), 1)
+        self.assertEqual(redis_connection.llen(EVENTS_FLUSHING_KEY), 0)
+
+    def test_skips_the_batch_of_a_flush_that_died_after_storing_it(self):
+        redis_connection.rpush(
+            EVENTS_FLUSHING_KEY,
+            json_dumps({"buffered_at": time.time(), "event": self.event()}),
+        )
+        with patch("redash.tasks.events.redis_connection.delete"):
+            flush_events()
+
+        flush_events()
+
+        self.assertEqual(models.Event.query.count(), 1)
+        self.assertEqual(models.DailyEventCount.query.one().count, 1)
+        self.assertEqual(redis_connection.llen(EVENTS_FLUSHING_KEY), 0)
+
+    def test_skips_when_another_flush_is_running(self):
+        buffer_event(self.event())
+        redis_connection.set(FLUSH_EVENTS_LEASE_KEY, "other")
+
+        flush_events()
+
+        self.assertEqual(models.Event.query.count(), 0)
+        self.assertEqual(redis_connection.llen(EVENTS_BUFFER_KEY), 1)
+
+    def test_records_metrics(self):
+        buffer_event(self.event())
+
+        with patch("redash.tasks.events.statsd_client") as statsd:
+            flush_events()
+
+        statsd.gauge.assert_called_once_with("events.buffer.depth", 0)
+        statsd.incr.assert_called_once_with("events.flushed", 1)
+        self.assertEqual(
+            [call[0][0] for call in statsd.timing.call_args_list],
+            ["events.flush.latency", "events.flush.duration"],
+        )
+
+
+@patch(
+    "redash.tasks.events.settings.EVENT_REPORTING_WEBHOOKS", ["https://example.com"]
+)
+class TestEventWebhooks(BaseTestCase):
+    def buffer_events(self, count):
+        for _ in range(count):
+            buffer_event(
+                {
+                    "org_id": self.factory.org.id,
+                    "action": "view",
+                    "object_type": "dashboard",
+                    "timestamp": int(time.time()),
+                }
+            )
+
+    @patch("redash.tasks.events.requests.post")
+    def test_posts_a_batch_of_events(self, post):
+        post.return_value.status_code = 200
+        self.buffer_events(3)
+
+        flush_events()
+
+        post.assert_called_once()
+        self.assertEqual(len(post.call_args[1]["json"]["data"]), 3)
+        self.assertEqual(redis_connection.zcard(WEBHOOK_RETRIES_KEY), 0)
+
+    @patch("redash.tasks.events.requests.post")
+    def test_retries_failed_deliveries(self, post):
+        post.return_value.status_code = 500
+        self.buffer_events(2)
+
+        flush_events()
+        self.assertEqual(redis_connection.zcard(WEBHOOK_RETRIES_KEY), 1)
+
+        # not retried before its delay passed
+        flush_events()
+        self.assertEqual(post.call_count, 1)
+
+        post.return_value.status_code = 200
+        with patch("redash.tasks.events.time.time", return_value=time.time() + 60):
+            flush_events()
+
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(len(post.call_args[1]["json"]["data"]), 2)
+        self.assertEqual(redis_connection.zcard(WEBHOOK_RETRIES_KEY), 0)
+
+    @patch("redash.tasks.events.requests.post", side_effect=Exception("Timeout"))
+    @patch("redash.tasks.events.settings.EVENT_REPORTING_WEBHOOKS_MAX_RETRIES", 1)
+    def test_drops_deliveries_after_the_last_retry(self, post):
+        self.buffer_events(1)
+
+        flush_events()
+        with patch("redash.tasks.events.time.time", return_value=time.time() + 60):
+            flush_events()
+
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(redis_connection.zcard(WEBHOOK_RETRIES_KEY), 0)
+
+
+class TestManageEventPartitions(BaseTestCase):
+    def partitions(self):
+        return sorted(event_partitions.event_partitions())
+
+    @patch("redash.tasks.events.settings.EVENTS_PARTITIONS_AHEAD", 1)
+    @patch(
+        "redash.tasks.events.utcnow", return_value=datetime.datetime(2020, 5, 10)
+    )
+    def test_creates_the_next_partitions(self, _):
+        manage_event_partitions()
+        manage_event_partitions()
+
+        self.assertEqual(self.partitions(), ["events_2020_05", "events_2020_06"])
+
+    @patch("redash.tasks.events.settings.EVENTS_PARTITIONS_AHEAD", 0)
+    @patch("redash.tasks.events.settings.EVENTS_RETENTION_DAYS", 30)
+    @patch(
+        "redash.tasks.events.utcnow", return_value=datetime.datetime(2020, 5, 10)
+    )
+    def test_drops_partitions_and_events_past_retention(self, _):
+        event_partitions.create_event_partitions(datetime.date(2020, 3, 1), 1)
+        models.db.session.commit()
+        # stored in `events` itself, as they have no partition
+        for month in [1, 5]:
+            models.db.session.add(
+                models.Event(
+                    org=self.factory.org,
+                    action="view",
+                    object_type="dashboard",
+                    created_at=datetime.datetime(2020, month, 1),
+                )
+            )
+        models.db.session.commit()
+
+        manage_event_partitions()
+
+        self.assertEqual(self.partitions(), ["events_2020_04", "events_2020_05"])
+        self.assertEqual(
+            [event.created_at.month for event in models.Event.query], [5]
+        )
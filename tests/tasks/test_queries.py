@@ -1,4 +1,5 @@
 from unittest import TestCase
+import threading
 import uuid
 
 from mock import patch, Mock
@@ -15,7 +16,7 @@ from redash.tasks.queries.execution import (
     enqueue_query,
     execute_query,
 )
-from redash.tasks import Job
+from redash.tasks import Job, Queue
 
 
 def fetch_job(*args, **kwargs):
@@ -177,7 +178,41 @@ class TestEnqueueTask(BaseTestCase):
         self.assertEqual(3, enqueue.call_count)
 
 
+class TestConcurrentEnqueue(BaseTestCase):
+    def test_concurrent_identical_executions_share_one_job(self):
+        query = self.factory.create_query()
+        data_source = query.data_source
+        queue = Queue(data_source.queue_name, connection=rq_redis_connection)
+        executions = 500
+        barrier = threading.Barrier(executions)
+        job_ids = []
+        errors = []
+
+        def execute():
+            try:
+                with Connection(rq_redis_connection):
+                    barrier.wait()
+                    job = enqueue_query(
+                        query.query_text, data_source, query.user_id, False, None, {}
+                    )
+                job_ids.append(job.id)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=execute) for _ in range(executions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(job_ids), executions)
+        self.assertEqual(len(set(job_ids)), 1)
+        self.assertEqual(queue.count, 1)
+
+
 @patch("redash.tasks.queries.execution.get_current_job", side_effect=fetch_job)
+@patch.object(PostgreSQL, "supports_iter_query", False)
 class QueryExecutorTests(BaseTestCase):
     def test_success(self, _):
         """
@@ -255,3 +290,26 @@ class QueryExecutorTests(BaseTestCase):
             )
             q = models.Query.get_by_id(q.id)
             self.assertEqual(q.schedule_failures, 0)
+
+
+@patch("redash.tasks.queries.execution.get_current_job", side_effect=fetch_job)
+class StreamingQueryExecutorTests(BaseTestCase):
+    def test_stores_streamed_rows(self, _):
+        columns = [{"name": "a", "friendly_name": "a", "type": "integer"}]
+        with patch.object(PostgreSQL, "iter_query") as iq:
+            iq.return_value = iter([columns, [(1,), (2,)], [(3,)]])
+            result_id = execute_query("SELECT a", self.factory.data_source.id, {})
+            result = models.QueryResult.query.get(result_id)
+            self.assertEqual(
+                result.data, {"columns": columns, "rows": [{"a": 1}, {"a": 2}, {"a": 3}]}
+            )
+
+    def test_enforces_max_query_result_rows(self, _):
+        columns = [{"name": "a", "friendly_name": "a", "type": "integer"}]
+        with patch.object(PostgreSQL, "iter_query") as iq, patch.object(
+            models.Organization, "max_query_result_rows", 2
+        ):
+            iq.return_value = iter([columns, [(1,), (2,)], [(3,)]])
+            result = execute_query("SELECT a", self.factory.data_source.id, {})
+            self.assertTrue(isinstance(result, QueryExecutionError))
+            self.assertEqual(models.QueryResult.query.count(), 0)
@@ -1,7 +1,13 @@
-from mock import patch, call, ANY
+from mock import patch, call, ANY, Mock
 from tests import BaseTestCase
-from redash.tasks.queries.maintenance import refresh_queries
+from redash import redis_connection, settings
+from redash.monitor import REFRESH_QUERIES_SHARD_STATUS_KEY
+from redash.tasks.queries.maintenance import (
+    REFRESH_QUERIES_LEASE_KEY,
+    refresh_queries,
+)
 from redash.models import Query
+from redash.utils import json_loads
 
 ENQUEUE_QUERY = "redash.tasks.queries.maintenance.enqueue_query"
 
@@ -259,3 +265,52 @@ class TestRefreshQuery(BaseTestCase):
         ):
             refresh_queries()
             add_job_mock.assert_not_called()
+
+
+class TestShardedRefreshQueries(BaseTestCase):
+    def test_refreshes_only_the_queries_of_the_shard(self):
+        query = self.factory.create_query()
+        outdated_queries = Mock(return_value=[query])
+
+        with patch(ENQUEUE_QUERY) as add_job_mock, patch.object(
+            Query, "outdated_queries", outdated_queries
+        ), patch.object(settings, "REFRESH_QUERIES_SHARDS", 3):
+            refresh_queries(shard=1)
+
+        outdated_queries.assert_called_once_with(shard=(1, 3))
+        self.assertEqual(add_job_mock.call_count, 1)
+
+        shard_status = redis_connection.hgetall(
+            REFRESH_QUERIES_SHARD_STATUS_KEY.format(1)
+        )
+        self.assertEqual(shard_status["outdated_queries_count"], "1")
+        self.assertEqual(json_loads(shard_status["query_ids"]), [query.id])
+        self.assertIsNone(redis_connection.get(REFRESH_QUERIES_LEASE_KEY.format(1)))
+
+    def test_sums_up_the_status_of_all_shards(self):
+        query1 = self.factory.create_query()
+        query2 = self.factory.create_query()
+
+        with patch(ENQUEUE_QUERY), patch.object(settings, "REFRESH_QUERIES_SHARDS", 2):
+            with patch.object(Query, "outdated_queries", Mock(return_value=[query1])):
+                refresh_queries(shard=0)
+            with patch.object(Query, "outdated_queries", Mock(return_value=[query2])):
+                refresh_queries(shard=1)
+
+        status = redis_connection.hgetall("redash:status")
+        self.assertEqual(status["outdated_queries_count"], "2")
+        self.assertCountEqual(json_loads(status["query_ids"]), [query1.id, query2.id])
+
+    def test_skips_shards_leased_by_another_worker(self):
+        redis_connection.set(REFRESH_QUERIES_LEASE_KEY.format(0), "other-worker")
+        outdated_queries = Mock(return_value=[])
+
+        with patch.object(Query, "outdated_queries", outdated_queries), patch.object(
+            settings, "REFRESH_QUERIES_SHARDS", 2
+        ):
+            refresh_queries(shard=0)
+
+        outdated_queries.assert_not_called()
+        self.assertEqual(
+            redis_connection.get(REFRESH_QUERIES_LEASE_KEY.format(0)), "other-worker"
+        )
@@ -0,0 +1,103 @@
+from mock import patch
+from rq import Connection
+from tests import BaseTestCase
+
+from redash import redis_connection, rq_redis_connection
+from redash.tasks import Queue
+from redash.tasks.queries.execution import (
+    QUERY_LOCKS_KEY,
+    _job_lock_id,
+    _unlock,
+    enqueue_query,
+)
+from redash.tasks.queries.maintenance import remove_ghost_locks
+
+
+class TestQueryLocksRegistry(BaseTestCase):
+    def test_enqueue_and_unlock_maintain_the_registry(self):
+        query = self.factory.create_query()
+
+        with Connection(rq_redis_connection), patch(
+            "redash.tasks.queries.execution.Queue.enqueue"
+        ) as enqueue:
+            enqueue.return_value.id = "job-id"
+            enqueue_query(query.query_text, query.data_source, query.user_id)
+
+        lock = _job_lock_id(query.query_hash, query.data_source.id)
+        self.assertEqual(redis_connection.smembers(QUERY_LOCKS_KEY), {lock})
+
+        _unlock(query.query_hash, query.data_source.id)
+
+        self.assertEqual(redis_connection.smembers(QUERY_LOCKS_KEY), set())
+        self.assertIsNone(redis_connection.get(lock))
+
+
+class TestRemoveGhostLocks(BaseTestCase):
+    def lock(self, name, job_id, registered=True):
+        lock = "query_hash_job:1:{}".format(name)
+        redis_connection.set(lock, job_id)
+        if registered:
+            redis_connection.sadd(QUERY_LOCKS_KEY, lock)
+        return lock
+
+    def enqueue_job(self):
+        queue = Queue("queries", connection=rq_redis_connection)
+        return queue.enqueue("time.sleep", 1)
+
+    def test_removes_locks_of_missing_and_cancelled_jobs(self):
+        queued = self.lock("queued", self.enqueue_job().id)
+        missing = self.lock("missing", "missing-job-id")
+        cancelled_job = self.enqueue_job()
+        cancelled_job.cancel()
+        cancelled = self.lock("cancelled", cancelled_job.id)
+        expired = "query_hash_job:1:expired"
+        redis_connection.sadd(QUERY_LOCKS_KEY, expired)
+
+        remove_ghost_locks()
+
+        self.assertEqual(redis_connection.smembers(QUERY_LOCKS_KEY), {queued})
+        self.assertIsNotNone(redis_connection.get(queued))
+        self.assertIsNone(redis_connection.get(missing))
+        self.assertIsNone(redis_connection.get(cancelled))
+
+    def test_backfills_locks_taken_before_the_registry_existed(self):
+        queued = self.lock("queued", self.enqueue_job().id, registered=False)
+        ghost = self.lock("ghost", "missing-job-id", registered=False)
+
+        remove_ghost_locks()
+
+        self.assertEqual(redis_connection.smembers(QUERY_LOCKS_KEY), {queued})
+        self.assertIsNone(redis_connection.get(ghost))
+
+        # the keyspace is only scanned once
+        self.lock("unregistered", "missing-job-id", registered=False)
+        with patch.object(redis_connection, "scan_iter") as scan_iter:
+            remove_ghost_locks()
+        scan_iter.assert_not_called()
+
+    def test_keeps_locks_taken_by_a_new_job(self):
+        ghost = self.lock("ghost", "missing-job-id")
+        job_id = self.enqueue_job().id
+
+        def find_ghost_locks(locks):
+            redis_connection.set(ghost, job_id)
+            return [(ghost, "missing-job-id")]
+
+        with patch(
+            "redash.tasks.queries.maintenance._find_ghost_locks",
+            side_effect=find_ghost_locks,
+        ):
+            remove_ghost_locks()
+
+        self.assertEqual(redis_connection.get(ghost), job_id)
+        self.assertEqual(redis_connection.smembers(QUERY_LOCKS_KEY), {ghost})
+
+    def test_records_metrics(self):
+        self.lock("ghost", "missing-job-id")
+
+        with patch("redash.tasks.queries.maintenance.statsd_client") as statsd:
+            remove_ghost_locks()
+
+        statsd.incr.assert_called_once_with("query_locks.ghosts_removed", 1)
+        statsd.gauge.assert_called_once_with("query_locks.count", 0)
+        statsd.timing.assert_called_once()
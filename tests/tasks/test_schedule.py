@@ -1,7 +1,13 @@
 from unittest import TestCase
 from mock import patch, ANY
 
-from redash.tasks.schedule import rq_scheduler, schedule_periodic_jobs
+from redash import settings
+from redash.tasks import refresh_queries
+from redash.tasks.schedule import (
+    rq_scheduler,
+    schedule_periodic_jobs,
+    periodic_job_definitions,
+)
 
 
 class TestSchedule(TestCase):
@@ -63,6 +69,27 @@ class TestSchedule(TestCase):
         self.assertEqual(jobs[0].meta["interval"], 60)
 
 
+class TestPeriodicJobDefinitions(TestCase):
+    def refresh_queries_jobs(self):
+        return [
+            job for job in periodic_job_definitions() if job["func"] == refresh_queries
+        ]
+
+    def test_schedules_a_single_refresh_queries_job(self):
+        jobs = self.refresh_queries_jobs()
+
+        self.assertEqual(len(jobs), 1)
+        self.assertNotIn("kwargs", jobs[0])
+
+    def test_schedules_a_refresh_queries_job_per_shard(self):
+        with patch.object(settings, "REFRESH_QUERIES_SHARDS", 3):
+            jobs = self.refresh_queries_jobs()
+
+        self.assertEqual(
+            [job["kwargs"] for job in jobs], [{"shard": i} for i in range(3)]
+        )
+
+
 class TestSchedulerMetrics(TestCase):
     def setUp(self):
         for job in rq_scheduler.get_jobs():
@@ -1,11 +1,23 @@
+import os
+import signal
+import threading
+
 from mock import patch, call
 from rq import Connection
 from rq.job import JobStatus
-from redash.tasks import Worker
+from redash.tasks import Worker, WarmWorker
 
 from tests import BaseTestCase
-from redash import rq_redis_connection
-from redash.tasks.worker import Queue
+from redash import rq_redis_connection, settings
+from redash.concurrency import query_execution_slots
+from redash.tasks.worker import (
+    EMBED_LANE,
+    INTERACTIVE_LANE,
+    SCHEDULED_LANE,
+    Queue,
+    lane_queue_name,
+    queue_lane,
+)
 from redash.tasks.queries.execution import (
     enqueue_query,
 )
@@ -100,3 +112,246 @@ class TestQueueMetrics(BaseTestCase):
 
         foo.delay()
         incr.assert_called_with("rq.jobs.created.default")
+
+
+class TestConcurrencyLimits(BaseTestCase):
+    def tearDown(self):
+        with Connection(rq_redis_connection):
+            for queue_name in default_queues:
+                Queue(queue_name).empty()
+        super().tearDown()
+
+    def test_requeues_jobs_of_data_sources_at_their_limit(self):
+        data_source = self.factory.create_data_source(max_concurrency=1)
+        query = self.factory.create_query(data_source=data_source)
+        query_execution_slots.acquire(
+            "running-job", data_source.id, query.org_id, 1, 60
+        )
+
+        with Connection(rq_redis_connection):
+            job = enqueue_query(
+                query.query_text, data_source, query.user_id, False, None, {}
+            )
+            with patch("rq.Worker.execute_job") as execute_job, patch.object(
+                Worker, "requeue_delay", 0
+            ), patch("statsd.StatsClient.timing") as timing:
+                Worker(["queries"]).work(max_jobs=1)
+
+            execute_job.assert_not_called()
+            # the wait is only recorded once the job runs
+            self.assertNotIn(
+                "rq.lanes.interactive.wait",
+                [args[0] for args, _ in timing.call_args_list],
+            )
+            self.assertEqual(Queue("queries").job_ids, [job.id])
+            self.assertEqual(job.get_status(), JobStatus.QUEUED)
+
+    def test_runs_jobs_under_the_limit_and_releases_their_slot(self):
+        data_source = self.factory.create_data_source(max_concurrency=1)
+        query = self.factory.create_query(data_source=data_source)
+
+        with Connection(rq_redis_connection):
+            enqueue_query(query.query_text, data_source, query.user_id, False, None, {})
+            self.assertEqual(
+                query_execution_slots.counts([data_source.id])[data_source.id],
+                {"running": 0, "waiting": 1},
+            )
+
+            with patch("rq.Worker.execute_job") as execute_job:
+                Worker(["queries"]).work(max_jobs=1)
+
+        execute_job.assert_called_once()
+        self.assertEqual(
+            query_execution_slots.counts([data_source.id])[data_source.id],
+            {"running": 0, "waiting": 0},
+        )
+
+
+    def test_jobs_taken_as_soon_as_they_are_queued_dont_stay_waiting(self):
+        data_source = self.factory.create_data_source()
+        query = self.factory.create_query(data_source=data_source)
+        enqueue = Queue.enqueue
+
+        def enqueue_and_acquire(queue, *args, **kwargs):
+            job = enqueue(queue, *args, **kwargs)
+            # an idle worker takes the job before enqueue returns
+            query_execution_slots.acquire(job.id, data_source.id, query.org_id, 0, 60)
+            return job
+
+        with Connection(rq_redis_connection), patch.object(
+            Queue, "enqueue", autospec=True, side_effect=enqueue_and_acquire
+        ):
+            enqueue_query(query.query_text, data_source, query.user_id, False, None, {})
+
+        self.assertEqual(
+            query_execution_slots.counts([data_source.id])[data_source.id],
+            {"running": 1, "waiting": 0},
+        )
+
+class TestQueueLanes(BaseTestCase):
+    def tearDown(self):
+        with Connection(rq_redis_connection):
+            for queue_name in default_queues:
+                Queue(queue_name).empty()
+        super().tearDown()
+
+    def test_lane_queue_names(self):
+        self.assertEqual(lane_queue_name("queries", INTERACTIVE_LANE), "queries")
+        self.assertEqual(lane_queue_name("queries", EMBED_LANE), "embed_queries")
+        self.assertEqual(queue_lane("embed_queries"), EMBED_LANE)
+        self.assertEqual(queue_lane("scheduled_queries"), SCHEDULED_LANE)
+        self.assertEqual(queue_lane("queries"), INTERACTIVE_LANE)
+        self.assertEqual(queue_lane("my_queries"), INTERACTIVE_LANE)
+
+    def test_workers_listen_on_embed_lanes(self):
+        worker = Worker(
+            ["queries", "scheduled_queries"], connection=rq_redis_connection
+        )
+
+        self.assertEqual(
+            worker.queue_names(), ["queries", "embed_queries", "scheduled_queries"]
+        )
+
+    def test_workers_dont_listen_on_lanes_of_non_query_queues(self):
+        worker = Worker(["periodic", "schemas"], connection=rq_redis_connection)
+
+        self.assertEqual(worker.queue_names(), ["periodic", "schemas"])
+
+    def test_api_key_queries_are_queued_in_the_embed_lane(self):
+        query = self.factory.create_query()
+
+        with Connection(rq_redis_connection):
+            job = enqueue_query(
+                query.query_text, query.data_source, query.user_id, True, None, {}
+            )
+
+        self.assertEqual(job.origin, "embed_queries")
+
+    def test_prioritizes_queues_by_lane_weight(self):
+        queues = [
+            Queue(name, connection=rq_redis_connection)
+            for name in ["scheduled_queries", "embed_queries", "queries", "schemas"]
+        ]
+
+        with patch.object(
+            settings,
+            "QUEUE_LANE_WEIGHTS",
+            {INTERACTIVE_LANE: 1, EMBED_LANE: 0, SCHEDULED_LANE: 0},
+        ):
+            prioritized = Queue.prioritize(queues)
+
+        self.assertEqual(
+            [queue.name for queue in prioritized],
+            ["queries", "schemas", "embed_queries", "scheduled_queries"],
+        )
+
+    def test_weights_decide_how_often_a_lane_goes_first(self):
+        queues = [
+            Queue(name, connection=rq_redis_connection)
+            for name in ["scheduled_queries", "queries"]
+        ]
+
+        with patch.object(
+            settings, "QUEUE_LANE_WEIGHTS", {INTERACTIVE_LANE: 3, SCHEDULED_LANE: 1}
+        ), patch("random.choices", side_effect=lambda lanes, weights: [lanes[-1]]):
+            prioritized = Queue.prioritize(queues)
+
+        self.assertEqual(
+            [queue.name for queue in prioritized], ["scheduled_queries", "queries"]
+        )
+
+    @patch("statsd.StatsClient.timing")
+    def test_records_wait_time_per_lane(self, timing):
+        query = self.factory.create_query()
+
+        with Connection(rq_redis_connection):
+            enqueue_query(
+                query.query_text, query.data_source, query.user_id, True, None, {}
+            )
+            with patch("rq.Worker.execute_job"):
+                Worker(["queries"]).work(max_jobs=1)
+
+        self.assertIn(
+            "rq.lanes.embed.wait", [args[0] for args, _ in timing.call_args_list]
+        )
+
+
+class TestWarmWorker(BaseTestCase):
+    def tearDown(self):
+        with Connection(rq_redis_connection):
+            for queue_name in default_queues:
+                Queue(queue_name).empty()
+        super().tearDown()
+
+    def work(self, queue_name):
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            self.addCleanup(signal.signal, signum, signal.getsignal(signum))
+        worker = WarmWorker([queue_name], connection=rq_redis_connection)
+        worker.work(max_jobs=1)
+        return worker
+
+    def test_runs_jobs_in_the_worker_process(self):
+        queue = Queue("default", connection=rq_redis_connection)
+        job = queue.enqueue("os.getpid")
+
+        self.work("default")
+
+        self.assertEqual(job.get_status(), JobStatus.FINISHED)
+        self.assertEqual(job.result, os.getpid())
+
+    def test_stops_after_performing_max_jobs(self):
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            self.addCleanup(signal.signal, signum, signal.getsignal(signum))
+        queue = Queue("default", connection=rq_redis_connection)
+        jobs = [queue.enqueue("os.getpid") for _ in range(2)]
+
+        worker = WarmWorker(["default"], connection=rq_redis_connection, max_jobs=1)
+        worker.work()
+
+        self.assertEqual(worker.performed_jobs, 1)
+        self.assertEqual(queue.job_ids, [jobs[1].id])
+
+    def test_restores_the_signal_handlers_jobs_replace(self):
+        queue = Queue("default", connection=rq_redis_connection)
+        queue.enqueue("signal.signal", signal.SIGINT, signal.SIG_IGN)
+
+        worker = self.work("default")
+
+        self.assertEqual(signal.getsignal(signal.SIGINT), worker.request_stop)
+
+    def monitor(self, worker, job):
+        job_finished = threading.Event()
+
+        with patch.object(worker, "heartbeat"), patch(
+            "os.kill", side_effect=lambda *args: job_finished.set()
+        ) as kill, patch.object(
+            worker, "enforce_hard_limit", side_effect=lambda job: job_finished.set()
+        ) as enforce_hard_limit:
+            worker.monitor_job(job, job_finished)
+
+        return kill, enforce_hard_limit
+
+    def test_interrupts_cancelled_jobs(self):
+        job = Queue("queries", connection=rq_redis_connection).enqueue("time.sleep", 1)
+        job.cancel()
+        worker = WarmWorker(
+            ["queries"], connection=rq_redis_connection, job_monitoring_interval=0.01
+        )
+
+        kill, enforce_hard_limit = self.monitor(worker, job)
+
+        kill.assert_called_once_with(os.getpid(), signal.SIGUSR1)
+        enforce_hard_limit.assert_not_called()
+
+    def test_enforces_hard_limit_on_jobs_past_their_timeout(self):
+        job = Queue("queries", connection=rq_redis_connection).enqueue("time.sleep", 1)
+        job.timeout = 0
+        worker = WarmWorker(
+            ["queries"], connection=rq_redis_connection, job_monitoring_interval=0.01
+        )
+        worker.grace_period = 0
+
+        kill, enforce_hard_limit = self.monitor(worker, job)
+
+        kill.assert_not_called()
+        enforce_hard_limit.assert_called_once_with(job)
@@ -1,3 +1,4 @@
+import datetime
 import mock
 import textwrap
 from click.testing import CliRunner
@@ -6,7 +7,8 @@ from tests import BaseTestCase
 from redash.utils.configuration import ConfigurationContainer
 from redash.query_runner import query_runners
 from redash.cli import manager
-from redash.models import DataSource, Group, Organization, User, db
+from redash.models import DataSource, Group, Organization, QueryResult, User, db
+from redash.utils import utcnow
 
 
 class DataSourceCommandTests(BaseTestCase):
@@ -602,3 +604,21 @@ class UserCommandTests(BaseTestCase):
         self.assertEqual(result.exit_code, 0)
         db.session.add(u)
         self.assertEqual(u.group_ids, [u.org.default_group.id, u.org.admin_group.id])
+
+
+class QueryCommandTests(BaseTestCase):
+    def test_cleanup_results(self):
+        self.factory.create_query_result(
+            retrieved_at=utcnow() - datetime.timedelta(days=30)
+        )
+        db.session.commit()
+
+        runner = CliRunner()
+        result = runner.invoke(
+            manager, ["queries", "cleanup_results", "--restart", "--batch-size", "1"]
+        )
+
+        self.assertFalse(result.exception)
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Deleted 1 unused query results", result.output)
+        self.assertEqual(QueryResult.query.count(), 0)
@@ -0,0 +1,69 @@
+import time
+
+from mock import patch
+from tests import BaseTestCase
+
+from redash import redis_connection, settings
+from redash.concurrency import query_execution_slots
+
+
+class TestQueryExecutionSlots(BaseTestCase):
+    def test_limits_running_jobs_per_data_source(self):
+        self.assertTrue(query_execution_slots.acquire("job-1", 1, 1, 2, 60))
+        self.assertTrue(query_execution_slots.acquire("job-2", 1, 1, 2, 60))
+        self.assertFalse(query_execution_slots.acquire("job-3", 1, 1, 2, 60))
+        self.assertTrue(query_execution_slots.acquire("job-3", 2, 1, 2, 60))
+
+        query_execution_slots.release("job-1", 1, 1)
+        self.assertTrue(query_execution_slots.acquire("job-3", 1, 1, 2, 60))
+
+    def test_reacquiring_a_held_slot_succeeds(self):
+        self.assertTrue(query_execution_slots.acquire("job-1", 1, 1, 1, 60))
+        self.assertTrue(query_execution_slots.acquire("job-1", 1, 1, 1, 60))
+
+    def test_falls_back_to_the_default_limit(self):
+        with patch.object(settings, "QUERY_EXECUTION_MAX_CONCURRENCY", 1):
+            self.assertTrue(query_execution_slots.acquire("job-1", 1, 1, None, 60))
+            self.assertFalse(query_execution_slots.acquire("job-2", 1, 1, None, 60))
+
+        # 0 means no limit
+        self.assertTrue(query_execution_slots.acquire("job-2", 1, 1, 0, 60))
+
+    def test_limits_running_jobs_per_org(self):
+        with patch.object(settings, "QUERY_EXECUTION_ORG_MAX_CONCURRENCY", 1):
+            self.assertTrue(query_execution_slots.acquire("job-1", 1, 1, 0, 60))
+            self.assertFalse(query_execution_slots.acquire("job-2", 2, 1, 0, 60))
+            self.assertTrue(query_execution_slots.acquire("job-3", 3, 2, 0, 60))
+
+    def test_reclaims_expired_slots(self):
+        self.assertTrue(query_execution_slots.acquire("job-1", 1, 1, 1, 60))
+        redis_connection.zadd(
+            query_execution_slots.running_key(1), {"job-1": time.time() - 1}
+        )
+
+        self.assertTrue(query_execution_slots.acquire("job-2", 1, 1, 1, 60))
+
+    def test_counts_running_and_waiting_jobs(self):
+        query_execution_slots.enqueued("job-1", 1)
+        query_execution_slots.enqueued("job-2", 1)
+        query_execution_slots.enqueued("job-3", 1)
+        query_execution_slots.acquire("job-1", 1, 1, 0, 60)
+        query_execution_slots.cancelled("job-2", 1)
+
+        self.assertEqual(
+            query_execution_slots.counts([1, 2]),
+            {1: {"running": 1, "waiting": 1}, 2: {"running": 0, "waiting": 0}},
+        )
+
+    def test_trims_jobs_waiting_longer_than_they_are_kept(self):
+        redis_connection.zadd(
+            query_execution_slots.waiting_key(1),
+            {"job-1": time.time() - settings.JOB_EXPIRY_TIME - 1},
+        )
+        self.assertEqual(query_execution_slots.counts([1])[1]["waiting"], 0)
+
+        query_execution_slots.enqueued("job-2", 1)
+        self.assertEqual(
+            redis_connection.zrange(query_execution_slots.waiting_key(1), 0, -1),
+            ["job-2"],
+        )
@@ -1,7 +1,10 @@
 import calendar
 import datetime
+import time
 from unittest import TestCase
 
+from mock import patch
+
 import pytz
 from dateutil.parser import parse as date_parse
 
@@ -158,6 +161,17 @@ class ShouldScheduleNextTest(TestCase):
             models.should_schedule_next(two_hours_ago, now, "3600", failures=32)
         )
 
+    def test_next_schedule_time(self):
+        now = utcnow()
+        self.assertEqual(
+            models.next_schedule_time(now, "3600"), now + datetime.timedelta(hours=1)
+        )
+        self.assertEqual(
+            models.next_schedule_time(now, "3600", failures=2),
+            now + datetime.timedelta(hours=1, minutes=4),
+        )
+        self.assertIsNone(models.next_schedule_time(now, "3600", failures=32))
+
 
 class QueryOutdatedQueriesTest(BaseTestCase):
     def schedule(self, **kwargs):
@@ -336,6 +350,118 @@ class QueryOutdatedQueriesTest(BaseTestCase):
         self.assertNotIn(query, queries)
 
 
+class ScheduledQueriesIndexTest(BaseTestCase):
+    def schedule(self, **kwargs):
+        schedule = {"interval": None, "time": None, "until": None, "day_of_week": None}
+        schedule.update(**kwargs)
+        return schedule
+
+    def create_scheduled_query(self, minutes_ago, **kwargs):
+        query = self.factory.create_query(schedule=self.schedule(**kwargs))
+        query.latest_query_data = self.factory.create_query_result(
+            retrieved_at=utcnow() - datetime.timedelta(minutes=minutes_ago),
+            query_text=query.query_text,
+            query_hash=query.query_hash,
+        )
+        return query
+
+    def next_run_at(self, query):
+        return redis_connection.zscore(
+            models.ScheduledQueriesIndex.KEY_NAME, query.id
+        )
+
+    def test_backfills_and_reschedules_queries_that_are_not_due(self):
+        fresh_query = self.create_scheduled_query(10, interval="3600")
+        outdated_query = self.create_scheduled_query(120, interval="3600")
+        unscheduled_query = self.factory.create_query(schedule=None)
+
+        self.assertEqual(models.Query.outdated_queries(), [outdated_query])
+
+        retrieved_at = fresh_query.latest_query_data.retrieved_at
+        self.assertEqual(
+            self.next_run_at(fresh_query),
+            (retrieved_at + datetime.timedelta(hours=1)).timestamp(),
+        )
+        self.assertLessEqual(self.next_run_at(outdated_query), time.time())
+        self.assertIsNone(self.next_run_at(unscheduled_query))
+
+    def test_backfills_again_after_a_failed_backfill(self):
+        query = self.create_scheduled_query(120, interval="3600")
+        models.db.session.flush()
+        # as if the query was scheduled before the index existed
+        redis_connection.delete(models.ScheduledQueriesIndex.KEY_NAME)
+
+        with patch.object(
+            models.scheduled_queries_index, "mark", side_effect=Exception
+        ), self.assertRaises(Exception):
+            models.Query.outdated_queries()
+
+        self.assertEqual(models.Query.outdated_queries(), [query])
+
+    def test_only_loads_due_queries(self):
+        fresh_query = self.create_scheduled_query(10, interval="3600")
+        outdated_query = self.create_scheduled_query(120, interval="3600")
+        models.Query.outdated_queries()
+
+        with patch.object(
+            models.ScheduledQueriesExecutions, "refresh"
+        ) as refresh_executions:
+            self.assertEqual(
+                [q.id for q in models.Query.outdated_queries()], [outdated_query.id]
+            )
+
+        refresh_executions.assert_called_once()
+        loaded_ids = list(refresh_executions.call_args[0][0])
+        self.assertEqual(loaded_ids, [outdated_query.id])
+        self.assertNotIn(fresh_query.id, loaded_ids)
+
+    def test_limits_due_queries_to_shard(self):
+        queries = [self.create_scheduled_query(120, interval="3600") for _ in range(4)]
+
+        for index in range(2):
+            self.assertEqual(
+                models.Query.outdated_queries(shard=(index, 2)),
+                [q for q in queries if q.id % 2 == index],
+            )
+
+    def test_schedule_changes_mark_query_due(self):
+        query = self.create_scheduled_query(10, interval="3600")
+        models.Query.outdated_queries()
+        self.assertGreater(self.next_run_at(query), time.time())
+
+        query.schedule = self.schedule(interval="60")
+        db.session.flush()
+
+        self.assertLessEqual(self.next_run_at(query), time.time())
+        self.assertEqual(models.Query.outdated_queries(), [query])
+
+    def test_execution_reschedules_query(self):
+        query = self.create_scheduled_query(120, interval="3600")
+        models.Query.outdated_queries()
+
+        executed_at = utcnow()
+        models.scheduled_queries_executions.update(query.id)
+        models.scheduled_queries_index.executed(query, executed_at)
+
+        self.assertEqual(
+            self.next_run_at(query),
+            (executed_at + datetime.timedelta(hours=1)).timestamp(),
+        )
+        self.assertEqual(models.Query.outdated_queries(), [])
+
+    def test_removes_unscheduled_and_disabled_queries(self):
+        unscheduled_query = self.create_scheduled_query(120, interval="3600")
+        disabled_query = self.create_scheduled_query(120, interval="3600")
+        models.Query.outdated_queries()
+
+        unscheduled_query.schedule = None
+        disabled_query.schedule = self.schedule(interval="3600", disabled=True)
+
+        self.assertEqual(models.Query.outdated_queries(), [])
+        self.assertIsNone(self.next_run_at(unscheduled_query))
+        self.assertIsNone(self.next_run_at(disabled_query))
+
+
 class QueryArchiveTest(BaseTestCase):
     def test_archive_query_sets_flag(self):
         query = self.factory.create_query()
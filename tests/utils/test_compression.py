@@ -0,0 +1,32 @@
+from unittest import TestCase, skipUnless
+
+from redash.utils import compression
+
+
+class TestCompression(TestCase):
+    text = '{"columns": [{"name": "a"}], "rows": [%s]}' % ", ".join(
+        '{"a": "café %d"}' % i for i in range(100)
+    )
+
+    def test_gzip_round_trip(self):
+        compressed = compression.compress(self.text, compression.GZIP)
+
+        self.assertTrue(compressed.startswith(compression.GZIP_MAGIC))
+        self.assertLess(len(compressed), len(self.text))
+        self.assertEqual(compression.decompress(compressed), self.text)
+
+    @skipUnless(compression.zstd_available, "zstandard isn't installed")
+    def test_zstd_round_trip(self):
+        compressed = compression.compress(self.text, compression.ZSTD)
+
+        self.assertTrue(compressed.startswith(compression.ZSTD_MAGIC))
+        self.assertEqual(compression.decompress(compressed), self.text)
+
+    def test_decompresses_memoryview(self):
+        compressed = compression.compress(self.text, compression.GZIP)
+
+        self.assertEqual(compression.decompress(memoryview(compressed)), self.text)
+
+    def test_rejects_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            compression.resolve_codec("lz4")